@@ -4,11 +4,22 @@ import pydantic
 from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings, CliApp, CliSubCommand
 
-from abertpy import __version__
-from abertpy.models import CleanupArgs, PingArgs, ProxyArgs, SetupArgs
-
-
-class App(BaseSettings, cli_parse_args=True, cli_implicit_flags=True, case_sensitive=True):
+from abertpy import __version__, zaptime
+from abertpy.models import (
+    CaptureArgs,
+    CleanupArgs,
+    LoadtestArgs,
+    MptsArgs,
+    PingArgs,
+    ProxyArgs,
+    ReplayArgs,
+    SetupArgs,
+)
+
+
+class App(
+    BaseSettings, cli_parse_args=True, cli_implicit_flags=True, case_sensitive=True
+):
     version: bool = Field(
         default=False,
         validation_alias=AliasChoices("V", "version"),
@@ -17,7 +28,11 @@ class App(BaseSettings, cli_parse_args=True, cli_implicit_flags=True, case_sensi
 
     ping: CliSubCommand[PingArgs]
     proxy: CliSubCommand[ProxyArgs]
+    mpts: CliSubCommand[MptsArgs]
+    replay: CliSubCommand[ReplayArgs]
+    loadtest: CliSubCommand[LoadtestArgs]
     setup: CliSubCommand[SetupArgs]
+    capture: CliSubCommand[CaptureArgs]
     cleanup: CliSubCommand[CleanupArgs]
 
     def cli_cmd(self) -> None:
@@ -28,6 +43,7 @@ class App(BaseSettings, cli_parse_args=True, cli_implicit_flags=True, case_sensi
 
 
 def main() -> None:
+    zaptime.mark("interpreter")
     try:
         CliApp.run(App)
     except pydantic.ValidationError as e:
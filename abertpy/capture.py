@@ -0,0 +1,112 @@
+import asyncio
+import json
+import re
+import time
+
+import aiohttp
+from loguru import logger
+
+from abertpy.models import CaptureArgs
+from abertpy.setup import (
+    _MAX_SCAN_ATTEMPTS,
+    capture_mux_data,
+    get_muxes,
+    select_muxes_to_scan,
+)
+from abertpy.ts import pat_tsid
+
+_UNSAFE_FILENAME_RE = re.compile(r"[^\w.-]")
+
+
+async def capture_mux_verified(
+    session: aiohttp.ClientSession, arg: CaptureArgs, mux: dict
+) -> bytearray | None:
+    """Raw TS of a mux, only once the PAT says the tuner locked onto it.
+
+    The tsid check setup does on tsanalyze output, done here on the PAT alone
+    so a wrong lock is retried while the tuner is still ours to retune.
+    """
+    mux_name = mux.get("name", "")
+    expected_tsid = mux.get("tsid")
+    url = f"{arg.get_base_url()}/play/ticket/stream/mux/{mux['uuid']}"
+
+    for attempt in range(1, _MAX_SCAN_ATTEMPTS + 1):
+        buffer = await capture_mux_data(session, arg, url)
+        actual_tsid = pat_tsid(buffer)
+
+        if actual_tsid is None:
+            logger.warning(
+                "MUX {} capture {}/{}: no transport stream locked, retrying",
+                mux_name,
+                attempt,
+                _MAX_SCAN_ATTEMPTS,
+            )
+        elif not expected_tsid or actual_tsid == expected_tsid:
+            return buffer
+        else:
+            logger.warning(
+                "MUX {} capture {}/{}: tuned to wrong transponder "
+                "(got tsid {}, expected {}), retrying",
+                mux_name,
+                attempt,
+                _MAX_SCAN_ATTEMPTS,
+                actual_tsid,
+                expected_tsid,
+            )
+
+        await asyncio.sleep(2)
+
+    logger.error("MUX {} could not be captured reliably, skipping", mux_name)
+    return None
+
+
+async def capture_async(arg: CaptureArgs) -> None:
+    failed_muxes: list[str] = []
+    arg.output_dir.mkdir(parents=True, exist_ok=True)
+
+    async with aiohttp.ClientSession(
+        raise_for_status=True,
+        headers={"User-Agent": "curl/aiohttp"},
+    ) as session:
+        list_muxes = select_muxes_to_scan(arg, await get_muxes(session, arg))
+
+        for mux in list_muxes:
+            mux_name: str = mux.get("name", "")
+            logger.debug(f"Capturing mux: {mux['uuid']} - {mux_name}")
+
+            buffer = await capture_mux_verified(session, arg, mux)
+            if buffer is None:
+                failed_muxes.append(mux_name)
+                continue
+
+            stem = _UNSAFE_FILENAME_RE.sub("_", mux_name) or mux["uuid"]
+            (arg.output_dir / f"{stem}.ts").write_bytes(buffer)
+            # Written last: setup only picks up captures that have their metadata
+            (arg.output_dir / f"{stem}.json").write_text(
+                json.dumps(
+                    {
+                        "uuid": mux["uuid"],
+                        "name": mux_name,
+                        "tsid": mux.get("tsid"),
+                        "captured_at": int(time.time()),
+                        "bytes": len(buffer),
+                    },
+                    indent=2,
+                )
+            )
+            logger.info("MUX {} captured: {} bytes", mux_name, len(buffer))
+
+    if failed_muxes:
+        retry = " ".join(f"--mux {name}" for name in failed_muxes)
+        logger.warning(
+            "{} mux(es) could not be captured reliably: {}. Retry only these with: {}",
+            len(failed_muxes),
+            ", ".join(failed_muxes),
+            retry,
+        )
+
+
+def capture(arg: CaptureArgs) -> None:
+    logger.info("Capture arguments:\n{}", arg.model_dump_json(indent=2))
+
+    return asyncio.run(capture_async(arg))
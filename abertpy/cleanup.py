@@ -6,40 +6,23 @@ import aiohttp
 from loguru import logger
 
 from abertpy import _HARDCODED_KEY
-from abertpy.helpers import (
-    is_abertpy_svc,
-    tvh_delete_svcs,
-    tvh_get_muxes,
-    tvh_get_svc_grid,
-    tvh_set_mux_iptv_url,
-)
 from abertpy.models import CleanupArgs
+from abertpy.plan import Change, Plan, Snapshot, rank_overrides
+from abertpy.schedule import GONE_AFTER_SCANS, ScanHistory
 
 # "abertpy: MUX 11222H pPID 2060" -> transponder name + pPID
 _MUXNAME_RE = re.compile(rf"^{re.escape(_HARDCODED_KEY)}: MUX (\S+) pPID (\d+)$")
 
 
-def _best_first(overrides: list[dict]) -> list[dict]:
-    """Same ranking as tvh_find_overrides: usable first, then newest."""
-    return sorted(
-        overrides,
-        key=lambda svc: (bool(svc.get("enabled")), svc.get("created", 0)),
-        reverse=True,
-    )
-
-
 async def cleanup_async(arg: CleanupArgs) -> None:
     async with aiohttp.ClientSession(
         raise_for_status=True,
         headers={"User-Agent": "curl/aiohttp"},
     ) as session:
         base_url = arg.get_base_url()
+        snapshot = await Snapshot.fetch(session, base_url)
 
-        overrides = [
-            svc
-            for svc in await tvh_get_svc_grid(session, base_url, svcname=_HARDCODED_KEY)
-            if is_abertpy_svc(svc)
-        ]
+        overrides = snapshot.overrides()
 
         # An override is identified by the transponder it lives on plus its pPID,
         # which it stores as its sid. Anything else in a group is a duplicate.
@@ -47,24 +30,42 @@ async def cleanup_async(arg: CleanupArgs) -> None:
         for svc in overrides:
             groups[(svc.get("multiplex_uuid", ""), svc.get("sid", -1))].append(svc)
 
-        ranked_groups = {key: _best_first(svcs) for key, svcs in groups.items()}
+        ranked_groups = {key: rank_overrides(svcs) for key, svcs in groups.items()}
         keep: dict[tuple[str, int], dict] = {
             key: ranked[0] for key, ranked in ranked_groups.items()
         }
 
         svc_by_uuid: dict[str, dict] = {svc["uuid"]: svc for svc in overrides}
 
-        muxes: list = (await tvh_get_muxes(session, base_url)).get("entries", [])
+        muxes: list = snapshot.muxes
+        dvb_muxes: dict[str, dict] = {
+            mux.get("name", ""): mux for mux in muxes if not mux.get("iptv_muxname", "")
+        }
         dvb_uuid_by_name: dict[str, str] = {
-            mux.get("name", ""): mux["uuid"]
-            for mux in muxes
-            if not mux.get("iptv_muxname", "")
+            name: mux["uuid"] for name, mux in dvb_muxes.items()
         }
 
+        live_svc_uuids: set[str] = {svc["uuid"] for svc in snapshot.services}
+
+        # Setup's scan history is kept per DVB-S network
+        histories: dict[str, ScanHistory] = {}
+
+        def ppid_gone(mux_freq: str, private_pid: int) -> bool:
+            network_uuid = dvb_muxes.get(mux_freq, {}).get("network_uuid", "")
+            if not network_uuid:
+                return False
+            if network_uuid not in histories:
+                histories[network_uuid] = ScanHistory(
+                    arg.scan_history.expanduser(), network_uuid
+                )
+            return histories[network_uuid].gone(mux_freq, private_pid)
+
         # A mux we are about to strip of its service has to be repointed at the
         # survivor first, or playback breaks until the next scan.
         repoint: list[tuple[dict, str]] = []
         protected: set[str] = set()
+        # Muxes that can no longer play, with why, for --gc
+        orphans: list[tuple[dict, str]] = []
         for mux in muxes:
             muxname: str = mux.get("iptv_muxname", "")
             match = _MUXNAME_RE.match(muxname)
@@ -86,9 +87,28 @@ async def cleanup_async(arg: CleanupArgs) -> None:
                 else (dvb_uuid_by_name.get(mux_freq, ""), private_pid)
             )
 
+            # A pPID its transponder no longer carries will never play again,
+            # whatever its service. Only good scans say so, never a failed one,
+            # and more than one, as a short scan can miss a slow pPID. The
+            # service knows that transponder better than the name. A mux whose
+            # service alone is gone is self-heal's to recover, not ours to
+            # delete along with the channel mapped to it.
+            transponder = (current or {}).get("multiplex", "") or mux_freq
+            if arg.gc and target_uuid and ppid_gone(transponder, private_pid):
+                reason = (
+                    f"pPID not found on {transponder} by the last "
+                    f"{GONE_AFTER_SCANS} scans"
+                )
+                if target_uuid not in live_svc_uuids:
+                    reason = f"service gone, {reason}"
+                orphans.append((mux, reason))
+                continue
+
             survivor = keep.get(key)
             if survivor is None or not target_uuid:
-                logger.warning("Mux {} has no surviving service, leaving alone", muxname)
+                logger.warning(
+                    "Mux {} has no surviving service, leaving alone", muxname
+                )
                 # Whatever it still streams from has to outlive this cleanup
                 protected.add(target_uuid)
                 continue
@@ -112,24 +132,48 @@ async def cleanup_async(arg: CleanupArgs) -> None:
             len(stale),
             len(repoint),
         )
+        if arg.gc:
+            logger.info("{} orphaned IPTV mux(es)", len(orphans))
+
+        plan = Plan()
+        for mux, reason in orphans:
+            plan.add(
+                Change(
+                    "delete_mux",
+                    f"{mux['iptv_muxname']} ({reason})",
+                    mux["uuid"],
+                )
+            )
+        for mux, new_iptv_url in repoint:
+            plan.add(
+                Change(
+                    "set_iptv_url",
+                    mux["iptv_muxname"],
+                    mux["uuid"],
+                    iptv_url=new_iptv_url,
+                )
+            )
+        for svc in stale:
+            plan.add(
+                Change(
+                    "delete_service",
+                    f"{svc.get('svcname', '')} {svc['uuid']}",
+                    svc["uuid"],
+                )
+            )
 
+        plan.show()
         if not arg.apply:
-            for mux, new_iptv_url in repoint:
-                logger.info("would repoint {}: {}", mux["iptv_muxname"], new_iptv_url)
             logger.warning(
-                "Dry run: would delete {} service(s) and repoint {} mux(es). "
-                "Re-run with --apply to do it.",
+                "Dry run: would delete {} service(s) and {} orphaned mux(es), "
+                "and repoint {} mux(es). Re-run with --apply to do it.",
                 len(stale),
+                len(orphans),
                 len(repoint),
             )
             return
 
-        for mux, new_iptv_url in repoint:
-            await tvh_set_mux_iptv_url(session, base_url, mux["uuid"], new_iptv_url)
-            logger.info("Repointed {}", mux["iptv_muxname"])
-
-        deleted = await tvh_delete_svcs(session, base_url, [svc["uuid"] for svc in stale])
-        logger.info("Deleted {} stale service(s)", deleted)
+        await plan.apply(session, base_url)
 
 
 def cleanup(arg: CleanupArgs):
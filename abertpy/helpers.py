@@ -39,18 +39,103 @@ async def tvh_find_abertpy_network(
     )
 
 
-async def tvh_get_muxes(session: aiohttp.ClientSession, base_url: str):
+async def tvh_get_muxes(
+    session: aiohttp.ClientSession,
+    base_url: str,
+    *,
+    iptv_url: str | None = None,
+    iptv_muxname: str | None = None,
+):
+    """Query the mux grid, optionally narrowed server-side.
+
+    TVheadend matches string filters as regexes, i.e. loosely: callers still
+    check the rows they get back for an exact match.
+    """
+    filters: list[dict] = []
+    if iptv_url is not None:
+        filters.append({"type": "string", "field": "iptv_url", "value": iptv_url})
+    if iptv_muxname is not None:
+        filters.append(
+            {"type": "string", "field": "iptv_muxname", "value": iptv_muxname}
+        )
+
+    data: dict = {"limit": _GRID_LIMIT}
+    if filters:
+        data["filter"] = json.dumps(filters)
+
     networks_url = base_url + "/api/mpegts/mux/grid"
-    async with session.post(
-        networks_url,
-        data={
-            "limit": _GRID_LIMIT,
-        },
-    ) as response:
+    async with session.post(networks_url, data=data) as response:
         muxes: dict = await response.json()
         return muxes
 
 
+async def tvh_load_node(
+    session: aiohttp.ClientSession, base_url: str, uuid: str
+) -> dict | None:
+    """One idnode (service, mux, ...) by uuid as {param: value}, None if missing.
+
+    A point lookup: unlike the grids, its cost does not grow with the install.
+    """
+    try:
+        async with session.post(
+            f"{base_url}/api/idnode/load",
+            data={
+                "uuid": uuid,
+            },
+        ) as response:
+            resp = await response.json()
+    except aiohttp.ClientResponseError as e:
+        if e.status in (400, 404):
+            return None
+        raise
+
+    entries: list = resp.get("entries", [])
+    if not entries:
+        return None
+
+    node = {param["id"]: param.get("value") for param in entries[0].get("params", [])}
+    node["uuid"] = entries[0].get("uuid", uuid)
+    return node
+
+
+async def tvh_get_inputs(session: aiohttp.ClientSession, base_url: str) -> list[dict]:
+    """Every tuner/input TVheadend reports, busy or idle."""
+    async with session.get(base_url + "/api/status/inputs") as response:
+        inputs: dict = await response.json()
+    return inputs.get("entries", [])
+
+
+async def tvh_get_subscriptions(
+    session: aiohttp.ClientSession, base_url: str
+) -> list[dict]:
+    async with session.get(base_url + "/api/status/subscriptions") as response:
+        subscriptions: dict = await response.json()
+    return subscriptions.get("entries", [])
+
+
+def dvbs_tuner_can_serve(
+    inputs: list[dict], subscriptions: list[dict], dvb_mux: str
+) -> bool:
+    """Whether TVheadend has a satellite tuner that could take a subscription
+    to this transponder right now.
+
+    An idle tuner can tune anywhere. A busy one serves us only if it is already
+    on our transponder, since TVheadend shares one tuner between subscriptions
+    to the same mux.
+    """
+    for entry in inputs:
+        if "DVB-S" not in entry.get("input", ""):
+            continue
+        if not entry.get("subs", 0):
+            return True
+        if dvb_mux and dvb_mux in entry.get("stream", ""):
+            return True
+
+    return bool(dvb_mux) and any(
+        dvb_mux in sub.get("service", "") for sub in subscriptions
+    )
+
+
 async def tvh_get_svc_grid(
     session: aiohttp.ClientSession,
     base_url: str,
@@ -178,6 +263,7 @@ async def tvh_svc_mux_name(
 async def tvh_delete_svcs(
     session: aiohttp.ClientSession, base_url: str, uuids: list[str]
 ) -> int:
+    """Delete idnodes, services or muxes alike; how many were still there."""
     deleted = 0
     for uuid in uuids:
         try:
@@ -192,7 +278,7 @@ async def tvh_delete_svcs(
             # 404 means someone already removed it, which is the outcome we want
             if e.status != 404:
                 raise
-            logger.debug(f"Service {uuid} was already gone")
+            logger.debug(f"Node {uuid} was already gone")
             continue
 
         deleted += 1
@@ -200,28 +286,21 @@ async def tvh_delete_svcs(
     return deleted
 
 
-async def tvh_set_mux_iptv_url(
-    session: aiohttp.ClientSession, base_url: str, mux_uuid: str, iptv_url: str
+async def tvh_update_node(
+    session: aiohttp.ClientSession, base_url: str, uuid: str, params: dict
 ) -> None:
-    """Point a mux at a different service, leaving the rest of its config alone."""
-    async with session.post(
-        f"{base_url}/api/idnode/load",
-        data={
-            "uuid": mux_uuid,
-        },
-    ) as response:
-        resp = await response.json()
-
-    entries: list = resp.get("entries", [])
-    if not entries:
-        raise ValueError(f"Cannot load mux {mux_uuid}")
+    """Change some params of an idnode (mux, network, ...), leaving the rest of
+    its config alone."""
+    node = await tvh_load_node(session, base_url, uuid)
+    if node is None:
+        raise ValueError(f"Cannot load node {uuid}")
 
-    node = {param["id"]: param.get("value") for param in entries[0].get("params", [])}
-    if "iptv_url" not in node:
-        raise ValueError(f"Cannot find iptv_url param in mux {mux_uuid}")
+    for param in params:
+        if param not in node:
+            raise ValueError(f"Cannot find {param} param in node {uuid}")
 
-    node["iptv_url"] = iptv_url
-    node["uuid"] = mux_uuid
+    node.update(params)
+    node["uuid"] = uuid
 
     async with session.post(
         f"{base_url}/api/idnode/save",
@@ -232,6 +311,20 @@ async def tvh_set_mux_iptv_url(
         pass
 
 
+async def tvh_update_mux(
+    session: aiohttp.ClientSession, base_url: str, mux_uuid: str, params: dict
+) -> None:
+    """Change some params of a mux, leaving the rest of its config alone."""
+    await tvh_update_node(session, base_url, mux_uuid, params)
+
+
+async def tvh_set_mux_iptv_url(
+    session: aiohttp.ClientSession, base_url: str, mux_uuid: str, iptv_url: str
+) -> None:
+    """Point a mux at a different service, leaving the rest of its config alone."""
+    await tvh_update_mux(session, base_url, mux_uuid, {"iptv_url": iptv_url})
+
+
 def patch_original_SID_svc(sid_original: dict, private_pid: int, service_sid: str):
 
     logger.debug(f"Original SID data: {sid_original}")
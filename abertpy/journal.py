@@ -0,0 +1,90 @@
+"""Setup's journal of finished scans, so that an interrupted run can resume.
+
+Each mux scanned, or analysed from its capture, is written down with the
+pPIDs it carried as soon as it is done. `setup --resume` takes those results
+from the journal instead of tuning the muxes again, and scans only the rest.
+Planning needs no journal: a plan holds only what TVheadend does not match
+yet, so whatever an interrupted apply already did is not planned again. A run
+that applies its plan in full removes the journal.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from loguru import logger
+
+
+class SetupJournal:
+    """The muxes one setup run has finished scanning, kept in a JSON file.
+
+    A journal belongs to one network and one source of scans (live, or a
+    --from-captures directory); resuming from any other starts over.
+    """
+
+    def __init__(self, path: Path, network_uuid: str, source: str) -> None:
+        self.path = path
+        self.network_uuid = network_uuid
+        self.source = source
+        # mux uuid -> (mux name, pPID -> SID)
+        self.scanned: dict[str, tuple[str, dict[int, int]]] = {}
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            logger.info("No setup journal at {}; nothing to resume", self.path)
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable setup journal {}: {}", self.path, e)
+            return
+
+        if (data.get("network_uuid"), data.get("source")) != (
+            self.network_uuid,
+            self.source,
+        ):
+            logger.warning(
+                "Setup journal {} is for another network or scan source; starting over",
+                self.path,
+            )
+            return
+
+        self.scanned = {
+            mux_uuid: (
+                entry["name"],
+                {int(p): sid for p, sid in entry["ppids"].items()},
+            )
+            for mux_uuid, entry in data.get("scanned", {}).items()
+        }
+
+    def record(self, mux: dict, ppids: dict[int, int]) -> None:
+        """A mux finished scanning with these pPIDs; saved at once."""
+        self.scanned[mux["uuid"]] = (mux.get("name", ""), dict(ppids))
+        self.save()
+
+    def save(self) -> None:
+        """Write the journal out, atomically so a killed run leaves it intact."""
+        data = {
+            "network_uuid": self.network_uuid,
+            "source": self.source,
+            "scanned": {
+                mux_uuid: {"name": name, "ppids": ppids}
+                for mux_uuid, (name, ppids) in sorted(self.scanned.items())
+            },
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Cannot save setup journal {}: {}", self.path, e)
+
+    def clear(self) -> None:
+        """The run finished: nothing is left to resume."""
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning("Cannot remove setup journal {}: {}", self.path, e)
@@ -0,0 +1,543 @@
+"""How many channels one host can proxy at once.
+
+loadtest serves synthetic pPIDs from a stand-in TVheadend of its own, then
+runs real `abertpy proxy` processes against it, one per channel, at growing
+channel counts. Each level runs for a while past a warm-up; meanwhile every
+proxy's /proc/<pid>/{stat,io,status} is sampled, and the gaps between the
+flushes reaching its stdout are timed. A level is sustained while the p99 gap
+stays within the latency bound, every proxy keeps up with its bitrate and the
+host's CPUs stay below the ceiling. The first level that fails ends the run.
+
+The stand-in server runs in a process of its own, so its CPU is not the
+proxies'. It is still on the same host: a level that leaves it short of a core
+is reported as limited by the harness rather than by the proxies.
+"""
+
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from aiohttp import web
+from loguru import logger
+
+from abertpy import _HARDCODED_KEY
+from abertpy.models import LoadtestArgs
+from abertpy.ts import AFC_PAYLOAD_ONLY, FRAME_SIZE, MPEG_TS_START_BYTE
+
+# What the stand-in TVheadend calls its one transponder
+_MUX_NAME = "LOADTEST"
+_MUX_UUID = "10ad7e57" * 4
+
+_FIRST_PPID = 100
+
+# The stand-in server writes out whatever each stream is due this often
+_SEND_INTERVAL_S = 0.02
+
+# /proc is read this often while a level is measured, for peak RSS
+_SAMPLE_INTERVAL_S = 1.0
+
+# Reads of one proxy's stdout this close together are one flush, split by
+# the pipe's buffer
+_SAME_FLUSH_S = 0.01
+
+# A proxy delivering less than this share of its pPID's payload fell behind
+_MIN_DELIVERED = 0.95
+
+# Past this share of one core, the single-threaded stand-in server is what
+# holds the streams back
+_SERVER_CORE_LIMIT = 0.9
+
+
+@dataclass
+class _Channel:
+    """One synthetic pPID, and the proxy streaming it at the current level."""
+
+    ppid: int
+    bps: int
+    uuid: str
+    process: asyncio.subprocess.Process | None = None
+    # (monotonic time, bytes) of every read of the proxy's stdout
+    reads: list[tuple[float, int]] = field(default_factory=list)
+
+    def payload_bytes_per_s(self) -> float:
+        # Every packet carries payload only: 184 of each 188 bytes come out
+        return self.bps / 8 * (FRAME_SIZE - 4) / FRAME_SIZE
+
+
+def _channels(arg: LoadtestArgs) -> list[_Channel]:
+    """As many channels as the largest level, bitrates drawn log-uniformly,
+    so low-bitrate pPIDs are as well represented as HD ones."""
+    rng = random.Random(arg.seed)
+    low, high = math.log(arg.min_kbps * 1000), math.log(arg.max_kbps * 1000)
+    return [
+        _Channel(
+            ppid=ppid,
+            bps=round(math.exp(rng.uniform(low, high))),
+            uuid=f"{ppid:08x}".rjust(32, "0"),
+        )
+        for ppid in range(_FIRST_PPID, _FIRST_PPID + max(arg.channels))
+    ]
+
+
+def _packets(ppid: int) -> bytes:
+    """One continuity counter cycle of payload-only packets on ppid."""
+    payload = bytes(range(FRAME_SIZE - 4))
+    return b"".join(
+        bytes(
+            (
+                MPEG_TS_START_BYTE,
+                ppid >> 8,
+                ppid & 0xFF,
+                AFC_PAYLOAD_ONLY | cc,
+            )
+        )
+        + payload
+        for cc in range(16)
+    )
+
+
+def _filters(raw: object) -> list[dict]:
+    return json.loads(raw) if isinstance(raw, str) else []
+
+
+def _serve(port: int, channels: list[_Channel]) -> None:
+    """The stand-in TVheadend: just what a proxy asks of the real one."""
+    by_uuid = {channel.uuid: channel for channel in channels}
+    by_ppid = {channel.ppid: channel for channel in channels}
+
+    def service(channel: _Channel) -> dict:
+        return {
+            "uuid": channel.uuid,
+            "sid": channel.ppid,
+            "svcname": f"{_HARDCODED_KEY}: pPID {channel.ppid} (SID: 1)",
+            "enabled": True,
+            "multiplex": _MUX_NAME,
+            "multiplex_uuid": _MUX_UUID,
+        }
+
+    async def empty_grid(request: web.Request) -> web.Response:
+        return web.json_response({"entries": [], "total": 0})
+
+    async def inputs(request: web.Request) -> web.Response:
+        # The one tuner every channel shares, as they all live on _MUX_NAME
+        tuner = {"input": "DVB-S #0 (stand-in)", "subs": 1, "stream": _MUX_NAME}
+        return web.json_response({"entries": [tuner], "total": 1})
+
+    async def service_grid(request: web.Request) -> web.Response:
+        data = await request.post()
+        entries = [service(channel) for channel in channels]
+        for condition in _filters(data.get("filter")):
+            if condition.get("field") == "sid":
+                channel = by_ppid.get(int(condition["value"]))
+                entries = [service(channel)] if channel else []
+        return web.json_response({"entries": entries, "total": len(entries)})
+
+    async def load(request: web.Request) -> web.Response:
+        uuid = (await request.post()).get("uuid")
+        if uuid == _MUX_UUID:
+            params = {"name": _MUX_NAME}
+        elif uuid in by_uuid:
+            params = service(by_uuid[uuid])
+        else:
+            return web.json_response({"entries": []})
+        return web.json_response(
+            {
+                "entries": [
+                    {
+                        "uuid": uuid,
+                        "params": [{"id": k, "value": v} for k, v in params.items()],
+                    }
+                ]
+            }
+        )
+
+    async def export(request: web.Request) -> web.Response:
+        channel = by_uuid.get(request.query.get("uuid", ""))
+        return web.json_response([service(channel)] if channel else [])
+
+    async def stream(request: web.Request) -> web.StreamResponse:
+        channel = by_uuid.get(request.match_info["uuid"])
+        if channel is None:
+            raise web.HTTPNotFound()
+
+        response = web.StreamResponse(headers={"Content-Type": "video/mp2t"})
+        await response.prepare(request)
+
+        cycle = _packets(channel.ppid) * 64
+        packets_per_s = channel.bps / (FRAME_SIZE * 8)
+        start = time.monotonic()
+        sent = offset = 0
+        try:
+            while True:
+                due = int((time.monotonic() - start) * packets_per_s) - sent
+                sent += due
+                while due:
+                    take = min(due, len(cycle) // FRAME_SIZE - offset)
+                    await response.write(
+                        cycle[offset * FRAME_SIZE : (offset + take) * FRAME_SIZE]
+                    )
+                    offset = (offset + take) % (len(cycle) // FRAME_SIZE)
+                    due -= take
+                await asyncio.sleep(_SEND_INTERVAL_S)
+        except ConnectionError:
+            # The proxy went away: the level is over
+            return response
+
+    app = web.Application()
+    app.router.add_route("*", "/api/mpegts/mux/grid", empty_grid)
+    app.router.add_get("/api/status/inputs", inputs)
+    app.router.add_get("/api/status/subscriptions", empty_grid)
+    app.router.add_post("/api/mpegts/service/grid", service_grid)
+    app.router.add_post("/api/idnode/load", load)
+    app.router.add_get("/api/raw/export", export)
+    app.router.add_get("/stream/service/{uuid}", stream)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+@dataclass
+class _ProcSample:
+    cpu_s: float
+    rss: int
+    # Bytes and calls written, from /proc/<pid>/io: the proxy's flushes. Its
+    # reads are recv()s off a socket, which rchar and syscr do not count.
+    wchar: int
+    syscw: int
+
+
+def _read_proc(pid: int) -> _ProcSample | None:
+    """pid's CPU time, RSS and writes so far; None once it is gone."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+
+    # The command name, in parentheses, may hold spaces: count from after it
+    fields = stat.rsplit(")", 1)[1].split()
+    cpu_s = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    rss = next(
+        (
+            int(line.split()[1]) * 1024
+            for line in status.splitlines()
+            if line.startswith("VmRSS:")
+        ),
+        0,
+    )
+
+    io: dict[str, int] = {}
+    try:
+        for line in Path(f"/proc/{pid}/io").read_text().splitlines():
+            key, _, value = line.partition(":")
+            io[key] = int(value)
+    except OSError:
+        # Needs ptrace access to pid, which a hardened kernel may deny
+        pass
+    return _ProcSample(cpu_s, rss, io.get("wchar", 0), io.get("syscw", 0))
+
+
+def _host_jiffies() -> tuple[int, int]:
+    """(busy, total) CPU time of the whole host since boot."""
+    with open("/proc/stat") as f:
+        values = [int(value) for value in f.readline().split()[1:9]]
+    idle = values[3] + values[4]  # idle, iowait
+    return sum(values) - idle, sum(values)
+
+
+def _percentile(values: list[float], percent: int) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) * percent // 100, len(ordered) - 1)]
+
+
+def _flush_gaps(
+    reads: list[tuple[float, int]], start: float, end: float
+) -> list[float]:
+    """Seconds between consecutive flushes that reached stdout in the window."""
+    flushes: list[float] = []
+    last = -math.inf
+    for at, _ in reads:
+        if at - last >= _SAME_FLUSH_S and start <= at <= end:
+            flushes.append(at)
+        last = at
+    return [b - a for a, b in itertools.pairwise(flushes)]
+
+
+def _delivered_rate(reads: list[tuple[float, int]], start: float, end: float) -> float:
+    """Bytes/s that reached stdout between the first and last read in the
+    window. The window's edges would cut a slow pPID's flushes in half."""
+    window = [(at, n) for at, n in reads if start <= at <= end]
+    if len(window) < 2 or window[-1][0] == window[0][0]:
+        return 0.0
+    # What the first read brought in had arrived before it
+    return sum(n for _, n in window[1:]) / (window[-1][0] - window[0][0])
+
+
+@dataclass
+class _Level:
+    """What one channel count measured, per stream where it is a list."""
+
+    channels: int
+    mbps: float
+    cpu: list[float]  # share of one core
+    rss: list[int]
+    wchar_bps: list[float]
+    syscw_per_s: list[float]
+    delivered: list[float]  # share of the pPID's payload that came out
+    gaps: list[float]
+    host_cpu: float  # share of all cores
+    server_cpu: float  # share of one core
+    exited: list[str]
+
+    def failures(self, arg: LoadtestArgs) -> list[str]:
+        failures = list(self.exited)
+        if not self.gaps:
+            failures.append("no flushes reached stdout")
+        elif (p99 := _percentile(self.gaps, 99)) > arg.latency_bound:
+            failures.append(
+                f"p99 flush gap {p99 * 1000:.0f} ms over the "
+                f"{arg.latency_bound * 1000:.0f} ms bound"
+            )
+        behind = [share for share in self.delivered if share < _MIN_DELIVERED]
+        if behind:
+            failures.append(
+                f"{len(behind)} stream(s) fell behind, down to {min(behind):.0%} "
+                "of their bitrate"
+            )
+        if self.host_cpu > arg.cpu_ceiling:
+            failures.append(
+                f"host CPU at {self.host_cpu:.0%}, over {arg.cpu_ceiling:.0%}"
+            )
+        return failures
+
+    def log(self) -> None:
+        mib = 1024 * 1024
+        logger.info(
+            "{} channel(s), {:.1f} Mbps: CPU/stream {:.1%} mean, {:.1%} max of a "
+            "core; RSS/stream {:.1f} MiB mean, {:.1f} MiB max; flush gaps p50 "
+            "{:.0f} ms, p99 {:.0f} ms, max {:.0f} ms; {:.1f} write(s)/s and "
+            "{:.2f} Mbps written per stream; host CPU {:.0%}, server {:.0%} of "
+            "a core",
+            self.channels,
+            self.mbps,
+            sum(self.cpu) / len(self.cpu),
+            max(self.cpu),
+            sum(self.rss) / len(self.rss) / mib,
+            max(self.rss) / mib,
+            _percentile(self.gaps, 50) * 1000 if self.gaps else math.nan,
+            _percentile(self.gaps, 99) * 1000 if self.gaps else math.nan,
+            max(self.gaps, default=math.nan) * 1000,
+            sum(self.syscw_per_s) / len(self.syscw_per_s),
+            sum(self.wchar_bps) / len(self.wchar_bps) / 1e6,
+            self.host_cpu,
+            self.server_cpu,
+        )
+
+
+async def _drain(channel: _Channel) -> None:
+    assert channel.process is not None and channel.process.stdout is not None
+    while chunk := await channel.process.stdout.read(1 << 20):
+        channel.reads.append((time.monotonic(), len(chunk)))
+
+
+def _last_line(path: Path) -> str:
+    try:
+        lines = path.read_text(errors="replace").strip().splitlines()
+    except OSError:
+        return ""
+    return lines[-1] if lines else ""
+
+
+async def _run_level(
+    arg: LoadtestArgs, url: str, channels: list[_Channel], workdir: Path, server: int
+) -> _Level:
+    for channel in channels:
+        channel.reads = []
+        log_path = workdir / f"pPID{channel.ppid}.log"
+        with await asyncio.to_thread(open, log_path, "ab") as log:
+            channel.process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "abertpy",
+                "proxy",
+                "-t",
+                url,
+                "-s",
+                channel.uuid,
+                "-a",
+                str(channel.ppid),
+                "--dvb-mux",
+                _MUX_NAME,
+                "--usage-db",
+                str(workdir / "usage.sqlite3"),
+                "--read-chunk-log2",
+                str(arg.read_chunk_log2),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=log,
+            )
+    drains = [asyncio.create_task(_drain(channel)) for channel in channels]
+
+    # Interpreter start-up and resolving are no part of the steady state
+    deadline = time.monotonic() + arg.start_timeout
+    while time.monotonic() < deadline and not all(
+        channel.reads for channel in channels
+    ):
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(arg.warmup_seconds)
+
+    pids = {channel.ppid: channel.process.pid for channel in channels}  # type: ignore
+    start = time.monotonic()
+    host_before = _host_jiffies()
+    server_before = _read_proc(server)
+    before = {ppid: _read_proc(pid) for ppid, pid in pids.items()}
+    peak_rss = {ppid: 0 for ppid in pids}
+    after = dict(before)
+    while time.monotonic() - start < arg.seconds:
+        await asyncio.sleep(_SAMPLE_INTERVAL_S)
+        for ppid, pid in pids.items():
+            sample = _read_proc(pid)
+            if sample is not None:
+                after[ppid] = sample
+                peak_rss[ppid] = max(peak_rss[ppid], sample.rss)
+    end = time.monotonic()
+    host_after = _host_jiffies()
+    server_after = _read_proc(server)
+
+    exited = [
+        f"proxy for pPID {channel.ppid} exited: "
+        f"{_last_line(workdir / f'pPID{channel.ppid}.log')}"
+        for channel in channels
+        if channel.process is not None and channel.process.returncode is not None
+    ]
+
+    for channel in channels:
+        if channel.process is not None and channel.process.returncode is None:
+            channel.process.terminate()
+    for channel in channels:
+        if channel.process is None:
+            continue
+        try:
+            await asyncio.wait_for(channel.process.wait(), timeout=5)
+        except TimeoutError:
+            channel.process.kill()
+            await channel.process.wait()
+    await asyncio.gather(*drains, return_exceptions=True)
+
+    seconds = end - start
+    cpu, wchar_bps, syscw_per_s = [], [], []
+    for ppid in pids:
+        first, last = before[ppid], after[ppid]
+        if first is None or last is None:
+            continue
+        cpu.append((last.cpu_s - first.cpu_s) / seconds)
+        wchar_bps.append((last.wchar - first.wchar) * 8 / seconds)
+        syscw_per_s.append((last.syscw - first.syscw) / seconds)
+
+    busy = host_after[0] - host_before[0]
+    total = host_after[1] - host_before[1]
+    return _Level(
+        channels=len(channels),
+        mbps=sum(channel.bps for channel in channels) / 1e6,
+        cpu=cpu or [math.nan],
+        rss=[rss for rss in peak_rss.values() if rss] or [0],
+        wchar_bps=wchar_bps or [math.nan],
+        syscw_per_s=syscw_per_s or [math.nan],
+        delivered=[
+            _delivered_rate(channel.reads, start, end) / channel.payload_bytes_per_s()
+            for channel in channels
+        ],
+        gaps=[
+            gap
+            for channel in channels
+            for gap in _flush_gaps(channel.reads, start, end)
+        ],
+        host_cpu=busy / total if total else 0.0,
+        server_cpu=(
+            (server_after.cpu_s - server_before.cpu_s) / seconds
+            if server_before and server_after
+            else 0.0
+        ),
+        exited=exited,
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_listening(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+        else:
+            writer.close()
+            await writer.wait_closed()
+            return
+
+
+async def _loadtest(arg: LoadtestArgs, port: int, server: int) -> None:
+    channels = _channels(arg)
+    url = f"http://127.0.0.1:{port}/"
+    await _wait_listening(port, arg.start_timeout)
+
+    sustained: _Level | None = None
+    with tempfile.TemporaryDirectory(prefix="abertpy-loadtest-") as workdir:
+        for count in sorted(set(arg.channels)):
+            level = await _run_level(arg, url, channels[:count], Path(workdir), server)
+            level.log()
+            failures = level.failures(arg)
+            if not failures:
+                sustained = level
+                continue
+
+            for failure in failures:
+                logger.warning("{} channel(s): {}", count, failure)
+            if level.server_cpu >= _SERVER_CORE_LIMIT:
+                logger.warning(
+                    "The stand-in server used {:.0%} of a core at {} channel(s): "
+                    "it, not the proxies, may be what fell short",
+                    level.server_cpu,
+                    count,
+                )
+            break
+
+    if sustained is None:
+        logger.error("Not even {} channel(s) were sustained", min(arg.channels))
+        return
+    logger.info(
+        "Sustained {} channel(s), {:.1f} Mbps in all, at {:.1%} of a core and "
+        "{:.1f} MiB RSS per stream; p99 flush gap {:.0f} ms",
+        sustained.channels,
+        sustained.mbps,
+        sum(sustained.cpu) / len(sustained.cpu),
+        sum(sustained.rss) / len(sustained.rss) / (1024 * 1024),
+        _percentile(sustained.gaps, 99) * 1000,
+    )
+
+
+def loadtest(arg: LoadtestArgs) -> None:
+    port = _free_port()
+    server = multiprocessing.Process(
+        target=_serve, args=(port, _channels(arg)), name="abertpy-loadtest-server"
+    )
+    server.start()
+    try:
+        asyncio.run(_loadtest(arg, port, server.pid))  # type: ignore
+    finally:
+        server.terminate()
+        server.join()
@@ -1,30 +1,44 @@
 import asyncio
+import os
 import shutil
 import subprocess
 import sys
 from datetime import timedelta
 from pathlib import Path
-from typing import Self
+from typing import Literal, Self
 
 import aiohttp
 import pydantic
 from loguru import logger
 from pydantic import AliasChoices, ByteSize, Field
 
-from abertpy import _HARDCODED_KEY
+from abertpy import _HARDCODED_KEY, zaptime
 from abertpy.helpers import (
     extract_ppid_from_svcname,
     tvh_find_abertpy_network,
     tvh_get_muxes,
     tvh_get_networks,
+    tvh_get_svc_grid,
+    tvh_load_node,
     tvh_set_mux_iptv_url,
 )
+from abertpy.standby import Standby, attach_standby
+
+# Validation context for args built in-process from ones already validated:
+# skips the checks that call TVheadend or run binaries, which would repeat
+# work and cannot run inside the caller's event loop anyway.
+TRUSTED = {"trusted": True}
+
+
+def _trusted(info: pydantic.ValidationInfo) -> bool:
+    return bool(info.context and info.context.get("trusted"))
+
 
 _REFERENCE_PING = "ping"
 _REFERENCE_PROXY = "proxy"
 
 
-class CommonArgs(pydantic.BaseModel):
+class LoggingArgs(pydantic.BaseModel):
     model_config = pydantic.ConfigDict(validate_default=True)
 
     debug: bool = Field(
@@ -33,26 +47,37 @@ class CommonArgs(pydantic.BaseModel):
         description="Debug info",
     )
 
-    tvheadend_url: pydantic.HttpUrl = Field(
-        validation_alias=AliasChoices("t", "tvhurl"),
-        description=(
-            "Base URL of the TVheadend server. Ex: "
-            "http://tvheadend.lan:9981/doesnt_matter_the_path"
-        ),
-    )
-
     @pydantic.field_validator("debug")
     @classmethod
-    def set_debug(cls, debug):
+    def set_debug(cls, debug, info: pydantic.ValidationInfo):
+        if _trusted(info):
+            # Logging belongs to the command line this process was started with
+            return debug
+
         logger.remove()
 
         logger.add(sys.stderr, level="DEBUG" if debug else "INFO")
 
         return debug
 
+
+class CommonArgs(LoggingArgs):
+    model_config = pydantic.ConfigDict(validate_default=True)
+
+    tvheadend_url: pydantic.HttpUrl = Field(
+        validation_alias=AliasChoices("t", "tvhurl"),
+        description=(
+            "Base URL of the TVheadend server. Ex: "
+            "http://tvheadend.lan:9981/doesnt_matter_the_path"
+        ),
+    )
+
     @pydantic.field_validator("tvheadend_url")
     @classmethod
-    def validate_url(cls, tvheadend_url):
+    def validate_url(cls, tvheadend_url, info: pydantic.ValidationInfo):
+        if _trusted(info):
+            return tvheadend_url
+
         async def validate_tvheadend_url(tvheadend_url):
             base_url = str(tvheadend_url).removesuffix(tvheadend_url.path or "/")
             serverinfo_url = base_url + "/api/mpegts/mux/grid"
@@ -65,24 +90,18 @@ class CommonArgs(pydantic.BaseModel):
                         )
             return tvheadend_url
 
-        return asyncio.run(validate_tvheadend_url(tvheadend_url))
+        tvheadend_url = asyncio.run(validate_tvheadend_url(tvheadend_url))
+        zaptime.mark("validate_url")
+        return tvheadend_url
 
     def get_base_url(self) -> str:
         return str(self.tvheadend_url).removesuffix(self.tvheadend_url.path or "/")
 
 
-class ProxyArgs(CommonArgs):
-    model_config = pydantic.ConfigDict(validate_default=True)
-
-    service_uuid: str = Field(
-        validation_alias=AliasChoices("s", "service"),
-        description="UUID of the Abertis service to proxy",
-    )
+class StreamArgs(CommonArgs):
+    """Tuning shared by every command TVheadend runs as a pipe:// input."""
 
-    allowed_pid: int = Field(
-        validation_alias=AliasChoices("a", "allowed-pids"),
-        description="Allowed MPEG TS PID for decapsulation",
-    )
+    model_config = pydantic.ConfigDict(validate_default=True)
 
     read_chunk_log2: int = Field(
         default=16,
@@ -90,7 +109,8 @@ class ProxyArgs(CommonArgs):
         le=24,
         validation_alias=AliasChoices("read-chunk-log2"),
         description=(
-            "log2 of the read/write batch size in bytes (16 = 64KB). Reading "
+            "log2 of the largest read/write batch size in bytes (16 = 64KB); "
+            "below it, reads and batches follow the measured bitrate. Reading "
             "and writing one 188-byte TS frame at a time (as this used to do) "
             "measured ~5x more CPU than batching against a real captured "
             "channel; 14-20 all perform well, with returns past that "
@@ -114,6 +134,66 @@ class ProxyArgs(CommonArgs):
         ),
     )
 
+    read_timeout: float = Field(
+        default=10.0,
+        gt=0,
+        validation_alias=AliasChoices("read-timeout"),
+        description=(
+            "Seconds to wait for TVheadend to accept the connection, and then "
+            "for each read, before treating the stream as stalled. TVheadend "
+            "keeps the socket open through descrambler hiccups and tuner "
+            "re-locks, so without this a silent stream hangs the channel "
+            "until someone restarts it."
+        ),
+    )
+
+    stall_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        validation_alias=AliasChoices("stall-seconds"),
+        description=(
+            "Seconds the stream may keep delivering bytes without any of our "
+            "payload before it is reconnected. Stretched automatically for a "
+            "pPID whose observed bitrate is too low to deliver a batch within "
+            "it, up to 4x this value."
+        ),
+    )
+
+    zap_log: Path | None = Field(
+        default=None,
+        validation_alias=AliasChoices("zap-log"),
+        description=(
+            "JSON-lines file to append each start's zap time to, broken down "
+            "by phase (validation, service resolution, self-heal, connect, "
+            "first byte, first payload). It is always logged either way."
+        ),
+    )
+
+    profile: Path | None = Field(
+        default_factory=lambda: os.environ.get("ABERTPY_PROFILE") or None,
+        validation_alias=AliasChoices("profile"),
+        description=(
+            "Directory to write a sampling profile of this process to, as "
+            "collapsed stacks named after the transponder and pPID, refreshed "
+            "every minute and on exit. Defaults to $ABERTPY_PROFILE, which "
+            "reaches pipe commands TVheadend runs without editing them."
+        ),
+    )
+
+
+class ProxyArgs(StreamArgs):
+    model_config = pydantic.ConfigDict(validate_default=True)
+
+    service_uuid: str = Field(
+        validation_alias=AliasChoices("s", "service"),
+        description="UUID of the Abertis service to proxy",
+    )
+
+    allowed_pid: int = Field(
+        validation_alias=AliasChoices("a", "allowed-pids"),
+        description="Allowed MPEG TS PID for decapsulation",
+    )
+
     dvb_mux: str = Field(
         default="",
         validation_alias=AliasChoices("dvb-mux"),
@@ -130,20 +210,116 @@ class ProxyArgs(CommonArgs):
         ),
     )
 
+    rap_start: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("rap-start"),
+        description=(
+            "Hold each video stream back until its first random access point "
+            "(keyframe) instead of starting mid-GOP, so TVheadend and the "
+            "player are not fed data they can only discard."
+        ),
+    )
+
+    rap_wait_seconds: float = Field(
+        default=2.0,
+        gt=0,
+        validation_alias=AliasChoices("rap-wait"),
+        description=(
+            "Longest --rap-start waits for random access points before "
+            "passing everything through as it comes."
+        ),
+    )
+
+    backends: list[pydantic.HttpUrl] = Field(
+        default_factory=list,
+        validation_alias=AliasChoices("backend"),
+        description=(
+            "Other TVheadend servers, set up with the same abertpy "
+            "configuration and watching the same satellite, that this pPID "
+            "may be streamed from instead (repeatable). The proxy starts on "
+            "whichever has a satellite tuner free for the transponder, this "
+            "one preferred, and fails over between them on retry."
+        ),
+    )
+
+    usage_db: Path = Field(
+        default=Path("~/.local/state/abertpy/usage.sqlite3"),
+        validation_alias=AliasChoices("usage-db"),
+        description=(
+            "SQLite store to record this session's duration and pPID bitrate "
+            "in, for setup --usage-db to prioritise by."
+        ),
+    )
+
+    standby: int = Field(
+        default=0,
+        ge=0,
+        validation_alias=AliasChoices("standby"),
+        description=(
+            "Keep this many sibling pPIDs of the same transponder streaming "
+            "while this one plays: the one watched last, then the most watched "
+            "in --usage-db. A proxy started for one of them takes the warm "
+            "stream over instead of resolving, connecting and waiting for a "
+            "keyframe. Costs no tuner, but one more TVheadend subscription and "
+            "descrambling each."
+        ),
+    )
+
+    standby_linger: float = Field(
+        default=0.0,
+        ge=0,
+        le=10,
+        validation_alias=AliasChoices("standby-linger"),
+        description=(
+            "Seconds to keep the --standby streams up once TVheadend stops this "
+            "proxy, for a zap to one of them: TVheadend stops the old channel "
+            "before it starts the new. Holds the tuner as long, delaying a zap "
+            "to another transponder if no tuner is spare."
+        ),
+    )
+
+    # Every backend the pPID resolved on, this one first, with its service
+    # uuid there. Filled in by resolve_service.
+    _pool: list[tuple[pydantic.HttpUrl, str]] = pydantic.PrivateAttr(
+        default_factory=list
+    )
+    # A sibling's warm stream of this pPID, taken over instead of resolving
+    _standby: Standby | None = pydantic.PrivateAttr(default=None)
+    _resolved: bool = pydantic.PrivateAttr(default=False)
+
     @pydantic.model_validator(mode="after")
     def validate_service_uuid(self):
-        async def fetch_svcs(base_url: str) -> list[dict]:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    base_url + "/api/mpegts/service/grid",
-                    data={"hidemode": "none", "limit": 10000},
-                ) as response:
-                    if response.status != 200:
-                        raise ValueError(
-                            f"TVheadend error {response.status}. Check user credentials and access permissions."
-                        )
-                    resp = await response.json()
-            return resp.get("entries", [])
+        # Whoever kept this pPID warm had it resolved already. Should its
+        # stream fail, the proxy resolves it then, before reconnecting.
+        if self.dvb_mux:
+            self._standby = attach_standby(self.dvb_mux, self.allowed_pid)
+            if self._standby is not None:
+                zaptime.mark("attach_standby")
+                return self
+
+        self.resolve_service()
+        return self
+
+    def resolve_service(self) -> None:
+        """Find this pPID's override on every backend, self-healing the
+        pipe command and rescanning the transponder if need be."""
+
+        async def fetch_candidates(
+            session: aiohttp.ClientSession, base_url: str
+        ) -> list[dict]:
+            # Overrides carry their pPID as sid, so a sid-filtered grid holds
+            # every candidate. The whole grid is only the fallback, for an
+            # override whose sid no longer says which pPID its name does.
+            candidates = find_candidates(
+                await tvh_get_svc_grid(session, base_url, sid=self.allowed_pid)
+            )
+            if not candidates:
+                logger.debug(
+                    "No override with sid {}; scanning every service",
+                    self.allowed_pid,
+                )
+                candidates = find_candidates(await tvh_get_svc_grid(session, base_url))
+            return candidates
 
         def find_candidates(svcs: list[dict]) -> list[dict]:
             # Only an enabled override can actually stream, and (when known)
@@ -164,7 +340,11 @@ class ProxyArgs(CommonArgs):
             ]
 
         async def migrate_pipe_command(
-            base_url: str, original_uuid: str, resolved_uuid: str, transponder: str
+            session: aiohttp.ClientSession,
+            base_url: str,
+            original_uuid: str,
+            resolved_uuid: str,
+            transponder: str,
         ) -> None:
             # Reached only when this pipe command predates --dvb-mux, e.g. a
             # mux installed by an older abertpy version whose config TVheadend
@@ -176,46 +356,96 @@ class ProxyArgs(CommonArgs):
             if not transponder:
                 return
 
-            async with aiohttp.ClientSession() as session:
-                muxes = (await tvh_get_muxes(session, base_url)).get("entries", [])
+            mux = None
+            # Narrowed to the one mux holding this uuid first; the whole
+            # grid only if the filter came back empty
+            for filtered in (original_uuid, None):
+                muxes = (await tvh_get_muxes(session, base_url, iptv_url=filtered)).get(
+                    "entries", []
+                )
                 mux = next(
                     (m for m in muxes if original_uuid in m.get("iptv_url", "")),
                     None,
                 )
-                if mux is None:
-                    logger.debug(
-                        "Could not find the mux this pipe command belongs to; "
-                        "not migrating"
-                    )
-                    return
-
-                new_url = mux["iptv_url"]
-                if original_uuid != resolved_uuid:
-                    new_url = new_url.replace(original_uuid, resolved_uuid)
-                new_url = f"{new_url} --dvb-mux {transponder}"
-
-                await tvh_set_mux_iptv_url(session, base_url, mux["uuid"], new_url)
-                logger.info(
-                    "Migrated {} to carry --dvb-mux {}",
-                    mux.get("iptv_muxname", mux["uuid"]),
-                    transponder,
+                if mux is not None:
+                    break
+            if mux is None:
+                logger.debug(
+                    "Could not find the mux this pipe command belongs to; not migrating"
                 )
+                return
+
+            new_url = mux["iptv_url"]
+            if original_uuid != resolved_uuid:
+                new_url = new_url.replace(original_uuid, resolved_uuid)
+            new_url = f"{new_url} --dvb-mux {transponder}"
+
+            await tvh_set_mux_iptv_url(session, base_url, mux["uuid"], new_url)
+            logger.info(
+                "Migrated {} to carry --dvb-mux {}",
+                mux.get("iptv_muxname", mux["uuid"]),
+                transponder,
+            )
 
         async def resolve(tvheadend_url, service_uuid: str) -> str:
             base_url = str(tvheadend_url).removesuffix(tvheadend_url.path or "/")
 
-            svcs = await fetch_svcs(base_url)
+            # One session for every lookup, and for the rescan below: that
+            # streams a mux, hence the curl User-Agent
+            async with aiohttp.ClientSession(
+                raise_for_status=True, headers={"User-Agent": "curl/aiohttp"}
+            ) as session:
+                # The rest of the pool resolves alongside this backend, so a
+                # pool costs no more zap time than its slowest member
+                resolved_uuid, *others = await asyncio.gather(
+                    resolve_with(session, base_url, service_uuid),
+                    *(resolve_backend(session, url) for url in self.backends),
+                    return_exceptions=True,
+                )
+            if isinstance(resolved_uuid, BaseException):
+                raise resolved_uuid
+
+            self._pool = [(tvheadend_url, resolved_uuid)]
+            for url, other in zip(self.backends, others):
+                if isinstance(other, BaseException):
+                    logger.warning(
+                        "Backend {} left out of the pool: {}", url.host, other
+                    )
+                else:
+                    self._pool.append((url, other))
+            return resolved_uuid
+
+        async def resolve_backend(
+            session: aiohttp.ClientSession, url: pydantic.HttpUrl
+        ) -> str:
+            # Another server knows nothing of this uuid, only of its own
+            # override for the pPID. No rescan there: the pool simply goes
+            # without a backend that has to be set up first.
+            base_url = str(url).removesuffix(url.path or "/")
+            try:
+                candidates = await fetch_candidates(session, base_url)
+            except aiohttp.ClientError as e:
+                raise ValueError(f"cannot reach it ({e})") from e
+            if len(candidates) != 1:
+                raise ValueError(
+                    f"{len(candidates)} override(s) for pPID {self.allowed_pid}"
+                    f"{f' on {self.dvb_mux}' if self.dvb_mux else ''} instead "
+                    "of exactly one"
+                )
+            return candidates[0]["uuid"]
+
+        async def resolve_with(
+            session: aiohttp.ClientSession, base_url: str, service_uuid: str
+        ) -> str:
             resolved_uuid: str | None = None
             transponder = ""
 
-            exact = next(
-                (svc for svc in svcs if svc.get("uuid", "") == service_uuid), None
-            )
+            exact = await tvh_load_node(session, base_url, service_uuid)
             if exact is not None:
                 resolved_uuid = service_uuid
                 transponder = exact.get("multiplex", "")
             else:
-                candidates = find_candidates(svcs)
+                candidates = await fetch_candidates(session, base_url)
                 if len(candidates) == 1:
                     resolved_uuid = candidates[0]["uuid"]
                     transponder = candidates[0].get("multiplex", "")
@@ -252,40 +482,21 @@ class ProxyArgs(CommonArgs):
                         self.dvb_mux,
                     )
 
-                    async with aiohttp.ClientSession() as session:
-                        network_uuid = await tvh_find_abertpy_network(
-                            session, base_url
-                        )
+                    from abertpy.rescan import rescan_transponder
+
+                    network_uuid = await tvh_find_abertpy_network(session, base_url)
 
                     if network_uuid:
-                        ret = subprocess.run(
-                            [
-                                sys.argv[0],
-                                "setup",
-                                "--mux",
-                                self.dvb_mux,
-                                "--network-uuid",
-                                network_uuid,
-                                "-t",
-                                base_url,
-                                "--no-validate-abertpy",
-                            ],
-                            capture_output=True,
-                            text=True,
-                        )
-                        if ret.returncode != 0:
-                            logger.warning(
-                                "Rescan of {} exited {}: {}",
-                                self.dvb_mux,
-                                ret.returncode,
-                                ret.stderr.strip(),
+                        try:
+                            await rescan_transponder(
+                                session, base_url, network_uuid, self.dvb_mux
                             )
-                        svcs = await fetch_svcs(base_url)
-                        candidates = find_candidates(svcs)
+                        except (aiohttp.ClientError, ValueError) as e:
+                            logger.warning("Rescan of {} failed: {}", self.dvb_mux, e)
+                        candidates = await fetch_candidates(session, base_url)
                     else:
                         logger.warning(
-                            "Could not find the abertpy IPTV network; "
-                            "skipping rescan"
+                            "Could not find the abertpy IPTV network; skipping rescan"
                         )
 
                     if len(candidates) == 1:
@@ -307,15 +518,34 @@ class ProxyArgs(CommonArgs):
 
             if not self.dvb_mux:
                 await migrate_pipe_command(
-                    base_url, service_uuid, resolved_uuid, transponder
+                    session, base_url, service_uuid, resolved_uuid, transponder
                 )
 
             return resolved_uuid
 
-        self.service_uuid = asyncio.run(
-            resolve(self.tvheadend_url, self.service_uuid)
-        )
-        return self
+        try:
+            self.service_uuid = asyncio.run(
+                resolve(self.tvheadend_url, self.service_uuid)
+            )
+        except aiohttp.ClientResponseError as e:
+            raise ValueError(
+                f"TVheadend error {e.status}. Check user credentials and access permissions."
+            ) from e
+        self._resolved = True
+        zaptime.mark("resolve_service")
+
+    def is_resolved(self) -> bool:
+        return self._resolved
+
+    def take_standby(self) -> Standby | None:
+        """The standby attached at start-up, once."""
+        standby, self._standby = self._standby, None
+        return standby
+
+    def pool(self) -> list[tuple[pydantic.HttpUrl, str]]:
+        """This backend and every --backend the pPID resolved on, each with
+        its service uuid there."""
+        return self._pool or [(self.tvheadend_url, self.service_uuid)]
 
     def cli_cmd(self) -> None:
         from abertpy.proxy import proxy
@@ -323,12 +553,225 @@ class ProxyArgs(CommonArgs):
         proxy(self)
 
 
+class MptsArgs(StreamArgs):
+    model_config = pydantic.ConfigDict(validate_default=True)
+
+    transponder_uuid: str = Field(
+        validation_alias=AliasChoices("transponder"),
+        description=(
+            "UUID of the real DVB-S mux (transponder) whose pPIDs to merge. "
+            "Each pPID streams through its override service there, sharing "
+            "one tuner."
+        ),
+    )
+
+    allowed_pids: list[int] = Field(
+        min_length=1,
+        validation_alias=AliasChoices("pids"),
+        description=(
+            "pPIDs to merge into the output MPTS, e.g. --pids 2025,2026. Each "
+            "one's inner programs become programs of the output."
+        ),
+    )
+
+    dvb_mux: str = Field(
+        default="",
+        validation_alias=AliasChoices("dvb-mux"),
+        description="Name of that transponder (e.g. 11222H), for log lines",
+    )
+
+    def cli_cmd(self) -> None:
+        from abertpy.proxy import mpts
+
+        mpts(self)
+
+
+class ReplayArgs(LoggingArgs):
+    model_config = pydantic.ConfigDict(validate_default=True)
+
+    input: pydantic.FilePath = Field(
+        validation_alias=AliasChoices("i", "input"),
+        description=(
+            "Recorded transport stream (e.g. a capture of /stream/service or "
+            "/stream/mux) to demux instead of a live TVheadend stream. It is "
+            "mapped into memory, never read in whole."
+        ),
+    )
+
+    allowed_pids: list[int] = Field(
+        min_length=1,
+        validation_alias=AliasChoices("a", "allowed-pids"),
+        description=(
+            "pPID to decapsulate, as for proxy. Several (e.g. -a 2025,2026) "
+            "merge into one MPTS, as for mpts."
+        ),
+    )
+
+    read_chunk_log2: int = Field(
+        default=16,
+        ge=8,
+        le=24,
+        validation_alias=AliasChoices("read-chunk-log2"),
+        description="log2 of the largest read/write batch size, as for proxy",
+    )
+
+    pace: Literal["max", "pcr", "bitrate"] = Field(
+        default="max",
+        validation_alias=AliasChoices("pace"),
+        description=(
+            "'max' replays as fast as the hot path allows, for throughput "
+            "benchmarks. 'pcr' follows the capture's own PCR clock and "
+            "'bitrate' a constant --bitrate, so batches flush on the same "
+            "latency bound as on a live channel."
+        ),
+    )
+
+    bitrate_mbps: float = Field(
+        default=20.0,
+        gt=0,
+        validation_alias=AliasChoices("bitrate"),
+        description="Replay rate for --pace bitrate, in Mbps",
+    )
+
+    loop: int = Field(
+        default=1,
+        ge=0,
+        validation_alias=AliasChoices("loop"),
+        description="Times to replay the capture; 0 repeats it until killed",
+    )
+
+    def cli_cmd(self) -> None:
+        from abertpy.replay import replay
+
+        replay(self)
+
+
+class LoadtestArgs(LoggingArgs):
+    model_config = pydantic.ConfigDict(validate_default=True)
+
+    channels: list[int] = Field(
+        default=[1, 2, 4, 8, 16, 32],
+        min_length=1,
+        validation_alias=AliasChoices("n", "channels"),
+        description=(
+            "Channel counts to try, one proxy per channel, in increasing order "
+            "until one is not sustained"
+        ),
+    )
+
+    min_kbps: float = Field(
+        default=235,
+        gt=0,
+        validation_alias=AliasChoices("min-kbps"),
+        description="Lowest bitrate a synthetic pPID is drawn at, in kbps",
+    )
+
+    max_kbps: float = Field(
+        default=20_000,
+        gt=0,
+        validation_alias=AliasChoices("max-kbps"),
+        description=(
+            "Highest bitrate a synthetic pPID is drawn at, in kbps. Set it to "
+            "--min-kbps to run every channel at one bitrate."
+        ),
+    )
+
+    seed: int = Field(
+        default=0,
+        validation_alias=AliasChoices("seed"),
+        description="Seed for the bitrates drawn, so runs can be compared",
+    )
+
+    seconds: float = Field(
+        default=20.0,
+        gt=0,
+        validation_alias=AliasChoices("seconds"),
+        description="How long each channel count is measured for",
+    )
+
+    warmup_seconds: float = Field(
+        default=5.0,
+        ge=0,
+        validation_alias=AliasChoices("warmup"),
+        description=(
+            "How long every proxy streams before measuring starts, so their "
+            "batch sizes have settled"
+        ),
+    )
+
+    start_timeout: float = Field(
+        default=30.0,
+        gt=0,
+        validation_alias=AliasChoices("start-timeout"),
+        description="Longest to wait for every proxy's first flush",
+    )
+
+    latency_bound: float = Field(
+        default=1.0,
+        gt=0,
+        validation_alias=AliasChoices("latency-bound"),
+        description=(
+            "Largest p99 gap between one proxy's flushes, in seconds, for a "
+            "channel count to count as sustained"
+        ),
+    )
+
+    cpu_ceiling: float = Field(
+        default=0.9,
+        gt=0,
+        le=1,
+        validation_alias=AliasChoices("cpu-ceiling"),
+        description=(
+            "Share of the host's CPU time, all cores together, past which a "
+            "channel count is not sustained"
+        ),
+    )
+
+    read_chunk_log2: int = Field(
+        default=16,
+        ge=8,
+        le=24,
+        validation_alias=AliasChoices("read-chunk-log2"),
+        description="log2 of the largest read/write batch size, as for proxy",
+    )
+
+    @pydantic.model_validator(mode="after")
+    def validate_bitrates(self):
+        if self.max_kbps < self.min_kbps:
+            raise ValueError("--max-kbps is below --min-kbps")
+        return self
+
+    def cli_cmd(self) -> None:
+        from abertpy.loadtest import loadtest
+
+        loadtest(self)
+
+
 class CleanupArgs(CommonArgs):
     model_config = pydantic.ConfigDict(validate_default=True)
 
     apply: bool = Field(
         default=False,
-        description="Actually delete the stale services. Default only reports them.",
+        description=(
+            "Actually delete the stale services and repoint their muxes. "
+            "Default only prints the plan."
+        ),
+    )
+
+    gc: bool = Field(
+        default=False,
+        description=(
+            "Also delete abertpy IPTV muxes that can no longer play: those "
+            "whose pPID the last two good scans of their transponder in "
+            "--scan-history both missed. A mux whose service alone is gone is "
+            "left for its proxy to self-heal."
+        ),
+    )
+
+    scan_history: Path = Field(
+        default=Path("~/.local/state/abertpy/scan-history.json"),
+        validation_alias=AliasChoices("scan-history"),
+        description="Setup's scan history, which --gc takes the scanned pPIDs from",
     )
 
     def cli_cmd(self) -> None:
@@ -337,7 +780,9 @@ class CleanupArgs(CommonArgs):
         cleanup(self)
 
 
-class SetupArgs(CommonArgs):
+class ScanArgs(CommonArgs):
+    """Which muxes of the DVB-S network to tune, and for how long."""
+
     model_config = pydantic.ConfigDict(validate_default=True)
 
     network_uuid: str | None = Field(
@@ -349,15 +794,6 @@ class SetupArgs(CommonArgs):
         ),
     )
 
-    tsanalyze_path: Path | None = Field(
-        default=None,
-        validation_alias=AliasChoices("path-tsanalyze"),
-        description=(
-            "Path to the tsanalyze binary from TSDuck. Will search for "
-            "'tsanalyze' by default"
-        ),
-    )
-
     mux_buffer_size: ByteSize = Field(
         default="50MB",
         validation_alias=AliasChoices("max-buffer-size"),
@@ -367,7 +803,80 @@ class SetupArgs(CommonArgs):
     mux_buffer_time: timedelta = Field(
         default="PT10S",
         validation_alias=AliasChoices("max-buffer-time"),
-        description="Maximum time to wait for buffering each mux before analyzing",
+        description=(
+            "Maximum time to wait for buffering each mux before analyzing, and "
+            "for its PAT and PMTs, tuner lock included, before a retry"
+        ),
+    )
+
+    fast_scan: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("fast-scan"),
+        description=(
+            "Only scan the muxes known to carry Abertis instead of the whole "
+            "network. Faster, but misses any Abertis mux not in the known "
+            "list. Default scans everything."
+        ),
+    )
+
+    only_muxes: list[str] = Field(
+        default_factory=list,
+        validation_alias=AliasChoices("mux"),
+        description=(
+            "Scan only these mux names (repeatable), e.g. --mux 11675H --mux "
+            "12631V. Names not present as targets are ignored. Overrides "
+            "--fast-scan. Default scans everything."
+        ),
+    )
+
+    @pydantic.model_validator(mode="after")
+    def validate_network_uuid(self, info: pydantic.ValidationInfo) -> Self:
+        if _trusted(info):
+            return self
+
+        async def validate_network():
+            base_url = self.get_base_url()
+
+            async with aiohttp.ClientSession() as session:
+                networks = await tvh_get_networks(session, base_url)
+
+                return {
+                    network["uuid"]: network["networkname"]
+                    for network in networks.get("entries", [])
+                }
+
+        all_networks: dict[str, str] = asyncio.run(validate_network())
+
+        if self.network_uuid in all_networks:
+            return self
+
+        # No (valid) network selected: print the available ones cleanly and exit
+        # instead of surfacing a noisy validation traceback.
+        if self.network_uuid is None:
+            print("Select a network with --network-uuid. Available networks:")
+        else:
+            print(
+                f"Network UUID {self.network_uuid!r} not found. Available networks:",
+                file=sys.stderr,
+            )
+
+        width = max((len(u) for u in all_networks), default=0)
+        for net_uuid, net_name in all_networks.items():
+            print(f"  {net_uuid:<{width}}  {net_name}")
+
+        sys.exit(0 if self.network_uuid is None else 1)
+
+
+class SetupArgs(ScanArgs):
+    model_config = pydantic.ConfigDict(validate_default=True)
+
+    tsanalyze_path: Path | None = Field(
+        default=None,
+        validation_alias=AliasChoices("path-tsanalyze"),
+        description=(
+            "Path to the tsanalyze binary from TSDuck. Will search for "
+            "'tsanalyze' by default"
+        ),
     )
 
     abertpy_path: Path | None = Field(
@@ -385,23 +894,90 @@ class SetupArgs(CommonArgs):
         description="Validate the abertpy binary. Disable if running outside the TVHeadend host",
     )
 
-    fast_scan: bool = Field(
+    from_captures: pydantic.DirectoryPath | None = Field(
+        default=None,
+        validation_alias=AliasChoices("from-captures"),
+        description=(
+            "Analyze the mux captures 'abertpy capture' recorded in this "
+            "directory instead of tuning each mux. No tuner is held; --mux "
+            "and --fast-scan still narrow which captures are used."
+        ),
+    )
+
+    plan: bool = Field(
         default=False,
-        validation_alias=AliasChoices("fast-scan"),
         description=(
-            "Only scan the muxes known to carry Abertis instead of the whole "
-            "network. Faster, but misses any Abertis mux not in the known "
-            "list. Default scans everything."
+            "Scan, then only print the changes setup would make to TVheadend "
+            "instead of applying them."
         ),
     )
 
-    only_muxes: list[str] = Field(
-        default_factory=list,
-        validation_alias=AliasChoices("mux"),
+    scan_history: Path = Field(
+        default=Path("~/.local/state/abertpy/scan-history.json"),
+        validation_alias=AliasChoices("scan-history"),
         description=(
-            "Scan only these mux names (repeatable), e.g. --mux 11675H --mux "
-            "12631V. Names not present as targets are ignored. Overrides "
-            "--fast-scan. Default scans everything."
+            "JSON file recording how many pPIDs each mux yielded and how its "
+            "scans went. Live scans run in order of expected pPIDs per second "
+            "of tuner time, and --fast-scan takes the muxes that last carried "
+            "pPIDs from it."
+        ),
+    )
+
+    tuners: int | None = Field(
+        default=None,
+        ge=0,
+        validation_alias=AliasChoices("tuners"),
+        description=(
+            "Satellite tuners the IPTV network's stream limit is derived from, "
+            "so TVheadend turns away channels no tuner could carry instead of "
+            "spawning proxies that retry in vain. Default counts the DVB-S "
+            "inputs of this server and every --backend; 0 sets no limit."
+        ),
+    )
+
+    usage_db: Path = Field(
+        default=Path("~/.local/state/abertpy/usage.sqlite3"),
+        validation_alias=AliasChoices("usage-db"),
+        description=(
+            "The proxies' SQLite store of per-pPID sessions and bitrates (their "
+            "--usage-db, on the TVheadend host). The most watched pPIDs get the "
+            "highest IPTV mux priority, and scans capture for as long as the "
+            "slowest pPID received on a mux needs. Ignored if missing."
+        ),
+    )
+
+    usage_days: int = Field(
+        default=30,
+        gt=0,
+        validation_alias=AliasChoices("usage-days"),
+        description="How many days of --usage-db sessions to go by",
+    )
+
+    time_budget: timedelta | None = Field(
+        default=None,
+        validation_alias=AliasChoices("time-budget"),
+        description=(
+            "Stop starting live scans once this much time (e.g. PT30M) would "
+            "be exceeded. The most productive muxes go first and the rest "
+            "rotate in over later runs. Default scans every selected mux."
+        ),
+    )
+
+    journal: Path = Field(
+        default=Path("~/.local/state/abertpy/setup-journal.json"),
+        validation_alias=AliasChoices("journal"),
+        description=(
+            "JSON file each finished mux scan is written to, so --resume can "
+            "pick up an interrupted run. Removed once a run applies its plan."
+        ),
+    )
+
+    resume: bool = Field(
+        default=False,
+        description=(
+            "Take the muxes the last, interrupted run already scanned from "
+            "--journal instead of tuning them again, and scan only the rest. "
+            "Changes it already applied are not planned again either way."
         ),
     )
 
@@ -414,10 +990,45 @@ class SetupArgs(CommonArgs):
         ),
     )
 
+    backends: list[pydantic.HttpUrl] = Field(
+        default_factory=list,
+        validation_alias=AliasChoices("backend"),
+        description=(
+            "Other TVheadend servers, set up with this same configuration, "
+            "that each proxy may stream from when this one has no tuner free "
+            "(repeatable). Baked into the proxy pipe command as --backend; "
+            "setup checks each one has an override for every pPID, but does "
+            "not set them up itself."
+        ),
+    )
+
+    standby: int = Field(
+        default=0,
+        ge=0,
+        validation_alias=AliasChoices("standby"),
+        description=(
+            "Baked into the proxy pipe command as --standby: how many sibling "
+            "pPIDs each playing proxy keeps warm for a faster zap. Each costs "
+            "one more TVheadend subscription, though no tuner."
+        ),
+    )
+
+    standby_linger: float = Field(
+        default=0.0,
+        ge=0,
+        le=10,
+        validation_alias=AliasChoices("standby-linger"),
+        description=(
+            "Baked into the proxy pipe command as --standby-linger, with "
+            "--standby: how long a stopped proxy keeps its standbys up for the "
+            "zap that follows, holding the tuner as long"
+        ),
+    )
+
     iptv_pipe_string: str = Field(
         default=(
             "pipe://{abertpy_path} proxy -a {allowed_pid} -t {proxy_url} "
-            "-s {svc_mux_uuid} --dvb-mux {dvb_mux_name}"
+            "-s {svc_mux_uuid} --dvb-mux {dvb_mux_name}{backends}{standby}"
         ),
         validation_alias=AliasChoices("pipe-command"),
         description="""DVB-S Network containing Abertis muxes (usually Hispasat 30W). Empty to list all networks. Allowed variables:
@@ -427,14 +1038,45 @@ class SetupArgs(CommonArgs):
             * svc_mux_uuid: UUID of the service REMUX\n
             * tvheadend_url: Path for tvheadend_url base URL\n
             * proxy_url: URL baked into the proxy command (--proxy-url)\n
-            * dvb_mux_name: Name of the real transponder this pPID lives on (e.g. 11302H)
+            * dvb_mux_name: Name of the real transponder this pPID lives on (e.g. 11302H)\n
+            * backends: One " --backend URL" per --backend, empty without any\n
+            * standby: " --standby N" with --standby, plus " --standby-linger S"
+              with --standby-linger; empty without --standby
+            """,
+    )
+
+    layout: Literal["ppid", "transponder"] = Field(
+        default="ppid",
+        validation_alias=AliasChoices("layout"),
+        description=(
+            "'ppid' installs one IPTV mux (and so one proxy process and one "
+            "TVheadend subscription) per pPID. 'transponder' installs one per "
+            "real transponder instead, whose proxy pulls all of that "
+            "transponder's pPIDs through a single subscription and merges them "
+            "into one multi-program stream."
+        ),
+    )
+
+    mpts_pipe_string: str = Field(
+        default=(
+            "pipe://{abertpy_path} mpts -t {proxy_url} --transponder "
+            "{dvb_mux_uuid} --pids {allowed_pids} --dvb-mux {dvb_mux_name}"
+        ),
+        validation_alias=AliasChoices("mpts-pipe-command"),
+        description="""Pipe command of the per-transponder IPTV mux in --layout transponder. Allowed variables:
+            \n
+            * abertpy_path: Full path to abertpy command\n
+            * allowed_pids: Comma-separated private PIDs carried by the transponder\n
+            * dvb_mux_uuid: UUID of the real transponder's DVB-S mux\n
+            * tvheadend_url: Path for tvheadend_url base URL\n
+            * proxy_url: URL baked into the proxy command (--proxy-url)\n
+            * dvb_mux_name: Name of the real transponder (e.g. 11302H)
             """,
     )
 
     @pydantic.model_validator(mode="after")
     def validate_abertpy_path(self):
         if self.abertpy_validate_binary:
-
             try:
                 full_cmd: list[str] = [str(self.abertpy_path)]
                 full_cmd.append(_REFERENCE_PING)
@@ -451,7 +1093,7 @@ class SetupArgs(CommonArgs):
 
     @pydantic.field_validator("tsanalyze_path")
     @classmethod
-    def validate_tsduck(cls, tsanalyze_path):
+    def validate_tsduck(cls, tsanalyze_path, info: pydantic.ValidationInfo):
         bin_path: str | None = (
             str(tsanalyze_path) if tsanalyze_path else shutil.which("tsanalyze")
         )
@@ -461,6 +1103,9 @@ class SetupArgs(CommonArgs):
                 "tsanalyze binary not found. Please install TSDuck (https://tsduck.io/) or provide the argument path to tsanalyze"
             )
 
+        if _trusted(info):
+            return Path(bin_path)
+
         try:
             ret = subprocess.run(
                 [bin_path, "--version"], capture_output=True, text=True
@@ -472,43 +1117,14 @@ class SetupArgs(CommonArgs):
 
         return Path(bin_path)
 
-    @pydantic.model_validator(mode="after")
-    def validate_network_uuid(self) -> Self:
-        async def validate_network():
-            base_url = self.get_base_url()
-
-            async with aiohttp.ClientSession() as session:
-                networks = await tvh_get_networks(session, base_url)
-
-                return {
-                    network["uuid"]: network["networkname"]
-                    for network in networks.get("entries", [])
-                }
-
-        all_networks: dict[str, str] = asyncio.run(validate_network())
-
-        if self.network_uuid in all_networks:
-            return self
-
-        # No (valid) network selected: print the available ones cleanly and exit
-        # instead of surfacing a noisy validation traceback.
-        if self.network_uuid is None:
-            print("Select a network with --network-uuid. Available networks:")
-        else:
-            print(
-                f"Network UUID {self.network_uuid!r} not found. Available networks:",
-                file=sys.stderr,
-            )
-
-        width = max((len(u) for u in all_networks), default=0)
-        for net_uuid, net_name in all_networks.items():
-            print(f"  {net_uuid:<{width}}  {net_name}")
-
-        sys.exit(0 if self.network_uuid is None else 1)
-
     def get_iptv_pipe(
         self, svc_mux_uuid: str, allowed_pid: int, dvb_mux_name: str
     ) -> str:
+        standby = ""
+        if self.standby:
+            standby = f" --standby {self.standby}"
+            if self.standby_linger:
+                standby += f" --standby-linger {self.standby_linger:g}"
         return self.iptv_pipe_string.format(
             abertpy_path=self.abertpy_path,
             tvheadend_url=self.tvheadend_url,
@@ -516,6 +1132,20 @@ class SetupArgs(CommonArgs):
             svc_mux_uuid=svc_mux_uuid,
             allowed_pid=allowed_pid,
             dvb_mux_name=dvb_mux_name,
+            backends="".join(f" --backend {url}" for url in self.backends),
+            standby=standby,
+        )
+
+    def get_mpts_pipe(
+        self, dvb_mux_uuid: str, allowed_pids: list[int], dvb_mux_name: str
+    ) -> str:
+        return self.mpts_pipe_string.format(
+            abertpy_path=self.abertpy_path,
+            tvheadend_url=self.tvheadend_url,
+            proxy_url=self.proxy_url,
+            dvb_mux_uuid=dvb_mux_uuid,
+            allowed_pids=",".join(str(pid) for pid in sorted(allowed_pids)),
+            dvb_mux_name=dvb_mux_name,
         )
 
     def cli_cmd(self) -> None:
@@ -524,6 +1154,24 @@ class SetupArgs(CommonArgs):
         setup(self)
 
 
+class CaptureArgs(ScanArgs):
+    model_config = pydantic.ConfigDict(validate_default=True)
+
+    output_dir: Path = Field(
+        validation_alias=AliasChoices("o", "output"),
+        description=(
+            "Directory to record one <mux>.ts capture per mux into, each with "
+            "a <mux>.json holding its TVheadend uuid, name and tsid. Feed it "
+            "to setup --from-captures later."
+        ),
+    )
+
+    def cli_cmd(self) -> None:
+        from abertpy.capture import capture
+
+        capture(self)
+
+
 class PingArgs(pydantic.BaseModel):
     def cli_cmd(self) -> None:
         from abertpy.ping import ping
@@ -0,0 +1,355 @@
+import time
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from abertpy.ts import (
+    FRAME_SIZE,
+    MAX_SECTION_LENGTH,
+    MPEG_TS_START_BYTE,
+    PID_CAT,
+    PID_EIT,
+    PID_NIT,
+    PID_NULL,
+    PID_PAT,
+    PID_SDT,
+    PID_TDT,
+    TABLE_EIT_PF_ACTUAL,
+    TABLE_EIT_SCHEDULE_ACTUAL,
+    TABLE_PAT,
+    TABLE_PMT,
+    TABLE_SDT_ACTUAL,
+    SectionAssembler,
+    finish_section,
+    packet_pid,
+    packetize_section,
+    with_pid,
+)
+
+# Each pPID carries a whole terrestrial multiplex as its payload: PAT, PMTs,
+# SDT, EIT and the programs themselves, all numbered independently of the
+# other pPIDs on the same transponder. Merging several into one transport
+# stream therefore means renumbering every PID (and any clashing program
+# number) and regenerating the tables that list them.
+
+# Renumbered elementary/PMT PIDs are handed out from here up, clear of the
+# PIDs reserved for PSI/SI.
+_FIRST_OUT_PID = 0x0100
+
+# ISO 13818-1 wants the PAT and each PMT at least every 100ms; SDT every 2s
+# per EN 300 468.
+_PSI_INTERVAL_S = 0.1
+_SDT_INTERVAL_S = 2.0
+
+# Inner PIDs that never make it out as-is: regenerated (PAT), rewritten (SDT,
+# EIT) or meaningless once merged (CAT, NIT, TDT, stuffing).
+_DROPPED_PIDS = frozenset({PID_CAT, PID_NIT, PID_TDT, PID_NULL})
+
+
+@dataclass
+class _Source:
+    """Everything learnt about one pPID's inner transport stream."""
+
+    ppid: int
+    buf: bytearray = field(default_factory=bytearray)
+    assemblers: dict[int, SectionAssembler] = field(default_factory=dict)
+    # inner program_number -> inner PMT PID, from the inner PAT
+    pmt_pids: dict[int, int] = field(default_factory=dict)
+    # inner PID -> output PID, for PMTs and elementary streams alike
+    pid_map: dict[int, int] = field(default_factory=dict)
+    # inner program_number -> output program_number
+    programs: dict[int, int] = field(default_factory=dict)
+
+
+class MptsMuxer:
+    """Merges the inner transport streams of several pPIDs into one MPTS.
+
+    Every inner program becomes a program of the output, with its PMT, PCR
+    and elementary streams moved onto freshly allocated PIDs. The PAT and SDT
+    are synthesized from what the inner ones announce, and EIT sections are
+    passed through with their service, transport stream and original network
+    ids rewritten, so TVheadend scans names and EPG from the merged stream as
+    it would from a single pPID.
+    """
+
+    def __init__(self, tsid: int, ppids: list[int]) -> None:
+        self.tsid = tsid
+        self._sources: dict[int, _Source] = {ppid: _Source(ppid) for ppid in ppids}
+        self._next_pid = _FIRST_OUT_PID
+        self._used_programs: set[int] = set()
+
+        # output PMT PID -> latest rewritten PMT section
+        self._pmts: dict[int, bytes] = {}
+        # output program_number -> output PMT PID
+        self._pat: dict[int, int] = {}
+        self._pat_version = 0
+        self._pat_dirty = False
+
+        # output service_id -> SDT service loop entry (header + descriptors)
+        self._sdt: dict[int, bytes] = {}
+        self._sdt_version = 0
+        self._sdt_dirty = False
+
+        # Every pPID on a transponder belongs to one terrestrial network, but
+        # should one announce another, the output still names just one: the
+        # first seen, in the SDT and every EIT section alike
+        self._onid: int | None = None
+
+        self._cc: dict[int, int] = {}
+        self._last_psi = 0.0
+        self._last_sdt = 0.0
+
+    def feed(self, ppid: int, payload: bytes | bytearray) -> bytes:
+        """Output frames for the next chunk of one pPID's inner stream.
+
+        payload is the pPID's decapsulated bytes exactly as they arrive, not
+        necessarily frame-aligned; a partial frame is kept for the next call.
+        """
+        source = self._sources[ppid]
+        source.buf += payload
+
+        out = bytearray()
+        for packet in self._frames(source):
+            out += self._remux(source, packet)
+
+        out[:0] = self._due_tables()
+        return bytes(out)
+
+    def _frames(self, source: _Source) -> list[bytes]:
+        buf = source.buf
+        frames: list[bytes] = []
+        offset = 0
+        while len(buf) - offset >= FRAME_SIZE:
+            if buf[offset] != MPEG_TS_START_BYTE or (
+                len(buf) - offset > FRAME_SIZE
+                and buf[offset + FRAME_SIZE] != MPEG_TS_START_BYTE
+            ):
+                # Lost sync (or never had it): slide to the next sync byte
+                offset += 1
+                continue
+            frames.append(bytes(buf[offset : offset + FRAME_SIZE]))
+            offset += FRAME_SIZE
+        del buf[:offset]
+        return frames
+
+    def _alloc_pid(self) -> int:
+        if self._next_pid >= PID_NULL:
+            raise ValueError("MPTS ran out of PIDs to renumber into")
+        pid = self._next_pid
+        self._next_pid += 1
+        return pid
+
+    def _alloc_program(self, wanted: int) -> int:
+        number = wanted
+        while number in self._used_programs or number == 0:
+            number = number % 0xFFFF + 1
+        self._used_programs.add(number)
+        return number
+
+    def _sections(self, source: _Source, pid: int, packet: bytes) -> list[bytes]:
+        assembler = source.assemblers.get(pid)
+        if assembler is None:
+            assembler = source.assemblers[pid] = SectionAssembler()
+        return assembler.push(packet)
+
+    def _remux(self, source: _Source, packet: bytes) -> bytes:
+        pid = packet_pid(packet)
+
+        if pid == PID_PAT:
+            for section in self._sections(source, pid, packet):
+                if section[0] == TABLE_PAT:
+                    self._on_pat(source, section)
+            return b""
+
+        if pid == PID_SDT:
+            for section in self._sections(source, pid, packet):
+                if section[0] == TABLE_SDT_ACTUAL:
+                    self._on_sdt(source, section)
+            return b""
+
+        if pid == PID_EIT:
+            out = bytearray()
+            for section in self._sections(source, pid, packet):
+                rewritten = self._rewrite_eit(source, section)
+                if rewritten:
+                    out += self._packetize(PID_EIT, rewritten)
+            return bytes(out)
+
+        if pid in _DROPPED_PIDS:
+            return b""
+
+        if pid in source.pmt_pids.values():
+            for section in self._sections(source, pid, packet):
+                if section[0] == TABLE_PMT:
+                    self._on_pmt(source, pid, section)
+            return b""
+
+        out_pid = source.pid_map.get(pid)
+        if out_pid is None:
+            # Not (yet) announced by any PMT we have seen
+            return b""
+        return with_pid(packet, out_pid)
+
+    def _on_pat(self, source: _Source, section: bytes) -> None:
+        pmt_pids: dict[int, int] = {}
+        # Program loop runs from after the 8-byte header to before the CRC
+        for offset in range(8, len(section) - 4, 4):
+            number = (section[offset] << 8) | section[offset + 1]
+            pid = ((section[offset + 2] & 0x1F) << 8) | section[offset + 3]
+            if number:  # 0 points at the NIT, which we drop
+                pmt_pids[number] = pid
+
+        if pmt_pids == source.pmt_pids:
+            return
+
+        for number in source.pmt_pids.keys() - pmt_pids.keys():
+            self._pat.pop(source.programs[number], None)
+            self._pmts.pop(source.pid_map[source.pmt_pids[number]], None)
+
+        source.pmt_pids = pmt_pids
+        for number, pid in pmt_pids.items():
+            if number not in source.programs:
+                source.programs[number] = self._alloc_program(number)
+                if source.programs[number] != number:
+                    logger.debug(
+                        "pPID {}: program {} clashes, renumbered to {}",
+                        source.ppid,
+                        number,
+                        source.programs[number],
+                    )
+            if pid not in source.pid_map:
+                source.pid_map[pid] = self._alloc_pid()
+            self._pat[source.programs[number]] = source.pid_map[pid]
+        self._pat_dirty = True
+
+    def _on_pmt(self, source: _Source, inner_pid: int, section: bytes) -> None:
+        number = (section[3] << 8) | section[4]
+        if number not in source.programs:
+            return
+
+        pmt = bytearray(section[:-4])
+        pmt[3:5] = source.programs[number].to_bytes(2, "big")
+
+        def remap(offset: int) -> None:
+            inner = ((pmt[offset] & 0x1F) << 8) | pmt[offset + 1]
+            if inner == PID_NULL:
+                return
+            if inner not in source.pid_map:
+                source.pid_map[inner] = self._alloc_pid()
+            out = source.pid_map[inner]
+            pmt[offset] = (pmt[offset] & 0xE0) | (out >> 8)
+            pmt[offset + 1] = out & 0xFF
+
+        remap(8)  # PCR_PID
+        offset = 12 + (((pmt[10] & 0x0F) << 8) | pmt[11])
+        while offset + 5 <= len(pmt):
+            remap(offset + 1)
+            offset += 5 + (((pmt[offset + 3] & 0x0F) << 8) | pmt[offset + 4])
+
+        rewritten = finish_section(pmt)
+        out_pid = source.pid_map[inner_pid]
+        if self._pmts.get(out_pid) != rewritten:
+            self._pmts[out_pid] = rewritten
+            # Announce a change right away rather than at the next interval
+            self._last_psi = 0.0
+
+    def _on_sdt(self, source: _Source, section: bytes) -> None:
+        if self._onid is None:
+            self._onid = (section[8] << 8) | section[9]
+        offset = 11
+        while offset + 5 <= len(section) - 4:
+            sid = (section[offset] << 8) | section[offset + 1]
+            loop_len = ((section[offset + 3] & 0x0F) << 8) | section[offset + 4]
+            entry = bytearray(section[offset : offset + 5 + loop_len])
+            offset += 5 + loop_len
+
+            out_sid = source.programs.get(sid)
+            if out_sid is None:
+                continue
+            entry[0:2] = out_sid.to_bytes(2, "big")
+            if self._sdt.get(out_sid) != entry:
+                self._sdt[out_sid] = bytes(entry)
+                self._sdt_dirty = True
+
+    def _rewrite_eit(self, source: _Source, section: bytes) -> bytes | None:
+        table_id = section[0]
+        if (
+            table_id != TABLE_EIT_PF_ACTUAL
+            and table_id not in TABLE_EIT_SCHEDULE_ACTUAL
+        ):
+            return None
+
+        out_sid = source.programs.get((section[3] << 8) | section[4])
+        if out_sid is None:
+            return None
+
+        if self._onid is None:
+            self._onid = (section[10] << 8) | section[11]
+
+        eit = bytearray(section[:-4])
+        eit[3:5] = out_sid.to_bytes(2, "big")
+        eit[8:10] = self.tsid.to_bytes(2, "big")
+        eit[10:12] = self._onid.to_bytes(2, "big")
+        return finish_section(eit)
+
+    def _packetize(self, pid: int, section: bytes) -> bytes:
+        frames, self._cc[pid] = packetize_section(pid, section, self._cc.get(pid, 0))
+        return frames
+
+    def _due_tables(self) -> bytes:
+        now = time.monotonic()
+        out = bytearray()
+
+        if self._pat_dirty or now - self._last_psi >= _PSI_INTERVAL_S:
+            if self._pat_dirty:
+                self._pat_version = (self._pat_version + 1) & 0x1F
+                self._pat_dirty = False
+            out += self._packetize(PID_PAT, self._build_pat())
+            for pid, pmt in self._pmts.items():
+                out += self._packetize(pid, pmt)
+            self._last_psi = now
+
+        if self._sdt and (self._sdt_dirty or now - self._last_sdt >= _SDT_INTERVAL_S):
+            if self._sdt_dirty:
+                self._sdt_version = (self._sdt_version + 1) & 0x1F
+                self._sdt_dirty = False
+            for section in self._build_sdt():
+                out += self._packetize(PID_SDT, section)
+            self._last_sdt = now
+
+        return bytes(out)
+
+    def _build_pat(self) -> bytes:
+        body = bytearray((TABLE_PAT, 0xB0, 0, self.tsid >> 8, self.tsid & 0xFF))
+        body += bytes((0xC1 | (self._pat_version << 1), 0, 0))
+        for number, pid in sorted(self._pat.items()):
+            body += number.to_bytes(2, "big")
+            body += bytes((0xE0 | (pid >> 8), pid & 0xFF))
+        return finish_section(body)
+
+    def _build_sdt(self) -> list[bytes]:
+        onid = self._onid or 0
+
+        # Header (8 bytes after the length), onid + reserved (3), CRC (4)
+        room = MAX_SECTION_LENGTH - 5 - 3 - 4
+        chunks: list[list[bytes]] = [[]]
+        used = 0
+        for _, entry in sorted(self._sdt.items()):
+            if used + len(entry) > room and chunks[-1]:
+                chunks.append([])
+                used = 0
+            chunks[-1].append(entry)
+            used += len(entry)
+
+        sections: list[bytes] = []
+        last = len(chunks) - 1
+        for number, entries in enumerate(chunks):
+            body = bytearray(
+                (TABLE_SDT_ACTUAL, 0xF0, 0, self.tsid >> 8, self.tsid & 0xFF)
+            )
+            body += bytes((0xC1 | (self._sdt_version << 1), number, last))
+            body += bytes((onid >> 8, onid & 0xFF, 0xFF))
+            for entry in entries:
+                body += entry
+            sections.append(finish_section(body))
+        return sections
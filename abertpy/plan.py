@@ -0,0 +1,185 @@
+"""Plan/apply for setup and cleanup: one read of TVheadend, then a change list.
+
+Both commands work out the state they want against a single Snapshot and
+record only what differs as a Plan, which is then either shown or applied in
+dependency order. Nothing is rewritten that already matches, and a dry run
+costs no more than the snapshot itself.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Literal
+
+import aiohttp
+from loguru import logger
+
+from abertpy.helpers import (
+    is_abertpy_svc,
+    tvh_delete_svcs,
+    tvh_get_muxes,
+    tvh_get_svc_grid,
+    tvh_set_mux_iptv_url,
+    tvh_update_node,
+)
+
+ChangeKind = Literal[
+    "import_service",
+    "create_mux",
+    "set_iptv_url",
+    "set_epg",
+    "set_priority",
+    "set_max_streams",
+    "delete_mux",
+    "delete_service",
+]
+
+# Applied in this order: a mux may only be created or repointed once the service
+# it streams from is in place, and a service may only go once no mux uses it.
+_KIND_ORDER: tuple[ChangeKind, ...] = (
+    "import_service",
+    "create_mux",
+    "set_iptv_url",
+    "set_epg",
+    "set_priority",
+    "set_max_streams",
+    "delete_mux",
+    "delete_service",
+)
+
+
+def rank_overrides(overrides: list[dict]) -> list[dict]:
+    """Same ranking as tvh_find_overrides: usable first, then newest."""
+    return sorted(
+        overrides,
+        key=lambda svc: (bool(svc.get("enabled")), svc.get("created", 0)),
+        reverse=True,
+    )
+
+
+@dataclass
+class Snapshot:
+    """Services and muxes as TVheadend had them when planning started."""
+
+    services: list[dict]
+    muxes: list[dict]
+
+    @classmethod
+    async def fetch(cls, session: aiohttp.ClientSession, base_url: str) -> "Snapshot":
+        services = await tvh_get_svc_grid(session, base_url)
+        muxes = (await tvh_get_muxes(session, base_url)).get("entries", [])
+        logger.debug("Snapshot: {} service(s), {} mux(es)", len(services), len(muxes))
+        return cls(services=services, muxes=muxes)
+
+    def service(self, uuid: str) -> dict | None:
+        return next((svc for svc in self.services if svc["uuid"] == uuid), None)
+
+    def overrides(self, mux_uuid: str | None = None, sid: int | None = None):
+        """Our override services, optionally for one pPID on one mux, best first."""
+        return rank_overrides(
+            [
+                svc
+                for svc in self.services
+                if is_abertpy_svc(svc)
+                and (mux_uuid is None or svc.get("multiplex_uuid", "") == mux_uuid)
+                and (sid is None or svc.get("sid", -1) == sid)
+            ]
+        )
+
+    def original_service(self, sid: int, mux_uuid: str) -> dict | None:
+        """The TVheadend-owned service carrying this SID on a mux, as tvh_get_svc_SID."""
+        return next(
+            (
+                svc
+                for svc in self.services
+                if svc.get("sid", -1) == sid
+                and not is_abertpy_svc(svc)
+                and svc.get("multiplex_uuid", "") == mux_uuid
+            ),
+            None,
+        )
+
+    def iptv_mux(self, network_uuid: str, muxname: str) -> dict | None:
+        return next(
+            (
+                mux
+                for mux in self.muxes
+                if mux.get("network_uuid", None) == network_uuid
+                and mux.get("iptv_muxname", "") == muxname
+            ),
+            None,
+        )
+
+
+@dataclass(frozen=True)
+class Change:
+    kind: ChangeKind
+    # What the change is about, for display and a stable order within a kind
+    label: str
+    # service uuid for import/delete_service, mux uuid for set_* and
+    # delete_mux, network for create and set_max_streams
+    uuid: str
+    node: dict | None = field(default=None, compare=False)
+    iptv_url: str = ""
+
+
+@dataclass
+class Plan:
+    changes: list[Change] = field(default_factory=list)
+
+    def add(self, change: Change) -> None:
+        self.changes.append(change)
+
+    def touches(self, kind: ChangeKind, uuid: str) -> bool:
+        return any(c.kind == kind and c.uuid == uuid for c in self.changes)
+
+    def ordered(self) -> list[Change]:
+        return sorted(self.changes, key=lambda c: (_KIND_ORDER.index(c.kind), c.label))
+
+    def show(self) -> None:
+        if not self.changes:
+            logger.info("Plan: TVheadend already matches, nothing to change")
+            return
+
+        logger.info("Plan: {} change(s)", len(self.changes))
+        for change in self.ordered():
+            detail = f" -> {change.iptv_url}" if change.iptv_url else ""
+            logger.info("  {} {}{}", change.kind, change.label, detail)
+
+    async def apply(self, session: aiohttp.ClientSession, base_url: str) -> None:
+        mux_deletes: list[str] = []
+        deletes: list[str] = []
+        for change in self.ordered():
+            match change.kind:
+                case "import_service":
+                    async with session.post(
+                        base_url + "/api/raw/import",
+                        data={"node": json.dumps(change.node)},
+                    ):
+                        pass
+                case "create_mux":
+                    async with session.post(
+                        base_url + "/api/mpegts/network/mux_create",
+                        data={"uuid": change.uuid, "conf": json.dumps(change.node)},
+                    ):
+                        pass
+                case "set_iptv_url":
+                    await tvh_set_mux_iptv_url(
+                        session, base_url, change.uuid, change.iptv_url
+                    )
+                case "set_epg" | "set_priority" | "set_max_streams":
+                    await tvh_update_node(session, base_url, change.uuid, change.node)
+                case "delete_mux":
+                    mux_deletes.append(change.uuid)
+                    continue
+                case "delete_service":
+                    deletes.append(change.uuid)
+                    continue
+            logger.info("{} {}", change.kind, change.label)
+
+        # Muxes first, in case one still streams from a service going below
+        if mux_deletes:
+            deleted = await tvh_delete_svcs(session, base_url, mux_deletes)
+            logger.info("Deleted {} orphaned mux(es)", deleted)
+        if deletes:
+            deleted = await tvh_delete_svcs(session, base_url, deletes)
+            logger.info("Deleted {} stale service(s)", deleted)
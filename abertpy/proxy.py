@@ -1,29 +1,54 @@
 import asyncio
 import json
+import os
+import queue
 import re
+import signal
 import sys
+import threading
 import time
-from collections.abc import Iterator, Mapping
-from typing import Any
+from collections import defaultdict
+from collections.abc import Callable, Generator, Iterator, Mapping
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any, Protocol
 
 import aiohttp
 import backoff
+import pydantic
 import requests
 from loguru import logger
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 
-from abertpy import _HARDCODED_KEY
+from abertpy import _HARDCODED_KEY, zaptime
 from abertpy.helpers import (
+    dvbs_tuner_can_serve,
     extract_ppid_from_svcname,
     tvh_delete_svcs,
     tvh_find_overrides,
+    tvh_get_inputs,
     tvh_get_muxes,
+    tvh_get_subscriptions,
     tvh_get_svc_grid,
     tvh_get_svc_raw,
     tvh_get_svc_SID,
+    tvh_load_node,
     tvh_set_mux_iptv_url,
 )
-from abertpy.models import ProxyArgs
+from abertpy.models import MptsArgs, ProxyArgs, StreamArgs
+from abertpy.mpts import MptsMuxer
+from abertpy.rap import RandomAccessGate
+from abertpy.sampler import sampling
 from abertpy.setup import patch_original_SID_svc
+from abertpy.standby import Standby, StandbyHost
+from abertpy.ts import (
+    AFC_ADAPTATION_PAYLOAD,
+    AFC_PAYLOAD_ONLY,
+    FRAME_SIZE,
+    MPEG_TS_START_BYTE,
+    packet_pid,
+)
+from abertpy.usage import SessionRecorder
 
 ######################################
 ######################################
@@ -31,13 +56,6 @@ from abertpy.setup import patch_original_SID_svc
 ######################################
 
 
-FRAME_SIZE = 188
-MPEG_TS_START_BYTE = 0x47
-
-AFC_PAYLOAD_ONLY = 0x10
-AFC_ADAPTATION_PAYLOAD = 0x30
-
-
 def extract_payload(packet: bytes, allowed_pid: int) -> bytes | None:
     """The elementary-stream payload of one 188-byte TS frame, or None if it
     doesn't belong to allowed_pid (or isn't a valid frame)."""
@@ -75,6 +93,9 @@ def extract_payload(packet: bytes, allowed_pid: int) -> bytes | None:
 # in ~2.2s bursts without this, vs ~0.5s with it. The extra iter_content()
 # calls this costs measured as ~12-15% more CPU at 20Mbps than reading the
 # full batch size directly in one call -- worth it for the latency bound.
+# BatchController only starts here: once it has measured the bitrate it grows
+# the reads for fast streams, which gives that CPU back, and shrinks them for
+# slow ones.
 _UNDERLYING_READ_BYTES = 4096
 
 # Upper bound on how long unflushed bytes sit before being written out, even
@@ -84,11 +105,219 @@ _UNDERLYING_READ_BYTES = 4096
 _MAX_BATCH_LATENCY_S = 0.5
 
 
-def iter_batches(response: requests.Response, read_chunk_log2: int) -> Iterator[bytes]:
+# BatchController sizes reads so one blocks for about this long at the measured
+# bitrate, leaving most of _MAX_BATCH_LATENCY_S for the batch to fill.
+_READ_LATENCY_S = _MAX_BATCH_LATENCY_S / 4
+_MIN_READ_BYTES = 1024
+
+# How much traffic each bitrate measurement spans. Resizing restarts
+# iter_content, so it should not happen on every chunk.
+_MEASURE_WINDOW_S = 1.0
+
+
+def _pow2_clamp(value: float, low: int, high: int) -> int:
+    """The largest power of two not above value, kept within [low, high]."""
+    pow2 = 1 << max(int(value).bit_length() - 1, 0)
+    return min(max(pow2, low), high)
+
+
+class BatchController:
+    """Read and flush sizes for iter_batches, following the measured bitrate.
+
+    A 20Mbps stream gets reads as large as the configured batch, so it pays
+    for few iter_content calls. A 235kbps pPID keeps small reads, so a batch
+    still flushes within _MAX_BATCH_LATENCY_S. Nothing has to be tuned per
+    channel by hand.
+    """
+
+    def __init__(self, max_batch_bytes: int) -> None:
+        self.max_batch_bytes = max_batch_bytes
+        self.read_bytes = min(_UNDERLYING_READ_BYTES, max_batch_bytes)
+        self.flush_bytes = max_batch_bytes
+        self.rate = 0.0  # bytes per second
+        self.resizes = 0
+        self._window_start: float | None = None
+        self._window_bytes = 0
+
+    def observe(self, nbytes: int, now: float) -> bool:
+        """Account one read; True when read_bytes changed and reads must restart."""
+        if self._window_start is None:
+            # The first chunk's wait includes connecting and tuning
+            self._window_start = now
+            return False
+
+        self._window_bytes += nbytes
+        elapsed = now - self._window_start
+        if elapsed < _MEASURE_WINDOW_S:
+            return False
+
+        self.rate = self._window_bytes / elapsed
+        self._window_start, self._window_bytes = now, 0
+
+        read_bytes = _pow2_clamp(
+            self.rate * _READ_LATENCY_S, _MIN_READ_BYTES, self.max_batch_bytes
+        )
+        self.flush_bytes = _pow2_clamp(
+            self.rate * _MAX_BATCH_LATENCY_S, read_bytes, self.max_batch_bytes
+        )
+        if read_bytes == self.read_bytes:
+            return False
+
+        logger.debug(
+            "Batching at {:.0f} kbps: read {} -> {} bytes, flush at {} bytes",
+            self.rate * 8 / 1000,
+            self.read_bytes,
+            read_bytes,
+            self.flush_bytes,
+        )
+        self.read_bytes = read_bytes
+        self.resizes += 1
+        return True
+
+
+class ChunkSource(Protocol):
+    """Anything iter_batches can read from: a streaming requests.Response
+    (through _LiveSource), or a recorded capture standing in for one."""
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]: ...
+
+
+class _LiveSource:
+    """A streaming requests.Response, read the way iter_batches wants.
+
+    iter_batches restarts iter_content whenever it resizes its reads, but a
+    requests generator abandoned mid-stream closes the connection once it is
+    finalised if the response is chunked: urllib3 takes the GeneratorExit for
+    a failed read. So this reads the raw response itself, raising what
+    iter_content would have.
+    """
+
+    def __init__(self, response: requests.Response) -> None:
+        self.response = response
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        while True:
+            try:
+                chunk = self.response.raw.read(chunk_size, decode_content=True)
+            except ReadTimeoutError as e:
+                raise requests.exceptions.ConnectionError(e) from e
+            except ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e) from e
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        self.response.close()
+
+
+class _StandbySource:
+    """A sibling's standby taken over: its buffer, then its upstream socket.
+
+    The socket carries the bare TS body of an HTTP/1.0 response, so it is read
+    as it is, raising what _LiveSource would for the same failures.
+    """
+
+    def __init__(self, standby: Standby, read_timeout: float) -> None:
+        self.standby = standby
+        self.standby.sock.settimeout(read_timeout)
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        while self.standby.buffered:
+            chunk = self.standby.buffered[:chunk_size]
+            self.standby.buffered = self.standby.buffered[chunk_size:]
+            yield chunk
+        while True:
+            try:
+                chunk = self.standby.sock.recv(chunk_size)
+            except TimeoutError as e:
+                timeout = ReadTimeoutError(None, "", "read timed out")  # type: ignore
+                raise requests.exceptions.ConnectionError(timeout) from e
+            except OSError as e:
+                raise requests.exceptions.ConnectionError(e) from e
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        self.standby.sock.close()
+
+
+class _MergedSource:
+    """Several service streams read as one, for mpts.
+
+    TVheadend only descrambles a pPID through its override service, so mpts
+    subscribes to each pPID's own and merges them here. A thread per stream
+    queues whole frames as they arrive; frames of different pPIDs interleave
+    freely, so arrival order is all the merge needs. Any one stream ending or
+    failing ends them all, as the retry reconnects every pPID anyway.
+    """
+
+    def __init__(self, responses: list[requests.Response], read_timeout: float) -> None:
+        self.sources = [_LiveSource(response) for response in responses]
+        self.read_timeout = read_timeout
+        self.read_bytes = _UNDERLYING_READ_BYTES
+        self._queue: queue.SimpleQueue[bytes | Exception | None] = queue.SimpleQueue()
+        self._closed = False
+        for source in self.sources:
+            threading.Thread(target=self._read, args=(source,), daemon=True).start()
+
+    def _read(self, source: _LiveSource) -> None:
+        buf = bytearray()
+        try:
+            while not self._closed:
+                read_bytes = self.read_bytes
+                for chunk in source.iter_content(read_bytes):
+                    buf += chunk
+                    aligned_len = (len(buf) // FRAME_SIZE) * FRAME_SIZE
+                    if aligned_len:
+                        self._queue.put(bytes(buf[:aligned_len]))
+                        del buf[:aligned_len]
+                    if self.read_bytes != read_bytes:
+                        break
+                else:
+                    self._queue.put(None)
+                    return
+        except (requests.exceptions.RequestException, OSError) as e:
+            self._queue.put(e)
+        except Exception as e:
+            # A bug, not a stream failure: fail the proxy rather than reconnect
+            self._queue.put(e)
+            raise
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        # Each stream is read in chunk_size reads of its own
+        self.read_bytes = chunk_size
+        while True:
+            try:
+                item = self._queue.get(timeout=self.read_timeout)
+            except queue.Empty as e:
+                timeout = ReadTimeoutError(None, "", "read timed out")  # type: ignore
+                raise requests.exceptions.ConnectionError(timeout) from e
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self) -> None:
+        self._closed = True
+        for source in self.sources:
+            source.close()
+
+
+def iter_batches(
+    response: ChunkSource,
+    read_chunk_log2: int,
+    controller: BatchController | None = None,
+) -> Iterator[bytes]:
     """FRAME_SIZE-aligned chunks of raw bytes from a streaming response,
-    flushed once 2**read_chunk_log2 bytes accumulate or
-    _MAX_BATCH_LATENCY_S has passed since the last flush, whichever comes
-    first.
+    flushed once the controller's flush size (at most 2**read_chunk_log2
+    bytes) accumulates or _MAX_BATCH_LATENCY_S has passed since the last
+    flush, whichever comes first.
+
+    iter_content is restarted whenever the controller resizes reads. Both a
+    _LiveSource and a capture resume where the last read stopped.
 
     Reading and writing one 188-byte TS frame at a time (as this used to do)
     measured ~5x more CPU than batching against a real captured 30s/20Mbps
@@ -98,21 +327,108 @@ def iter_batches(response: requests.Response, read_chunk_log2: int) -> Iterator[
     measurement; returns flatten and then reverse past roughly 22, from
     larger buffer allocation/copy overhead outweighing the saved call count.
     """
-    read_chunk_bytes = 2**read_chunk_log2
-    underlying_read_bytes = min(_UNDERLYING_READ_BYTES, read_chunk_bytes)
+    if controller is None:
+        controller = BatchController(2**read_chunk_log2)
 
     buf = bytearray()
     last_flush = time.monotonic()
-    for chunk in response.iter_content(chunk_size=underlying_read_bytes):
-        buf += chunk
-        now = time.monotonic()
-        if len(buf) >= read_chunk_bytes or now - last_flush >= _MAX_BATCH_LATENCY_S:
-            aligned_len = (len(buf) // FRAME_SIZE) * FRAME_SIZE
-            if aligned_len:
-                batch = bytes(buf[:aligned_len])
-                del buf[:aligned_len]
-                yield batch
-            last_flush = now
+    first = True
+    resized = True
+    while resized:
+        resized = False
+        for chunk in response.iter_content(chunk_size=controller.read_bytes):
+            if first:
+                zaptime.mark("first_byte")
+                first = False
+            buf += chunk
+            now = time.monotonic()
+            if (
+                len(buf) >= controller.flush_bytes
+                or now - last_flush >= _MAX_BATCH_LATENCY_S
+            ):
+                aligned_len = (len(buf) // FRAME_SIZE) * FRAME_SIZE
+                if aligned_len:
+                    batch = bytes(buf[:aligned_len])
+                    del buf[:aligned_len]
+                    yield batch
+                last_flush = now
+
+            if controller.observe(len(chunk), now):
+                resized = True
+                break
+
+
+def ppid_demuxer(allowed_pid: int) -> Callable[[bytes], bytes]:
+    """Batch -> the decapsulated payload of one pPID, which is what proxy writes."""
+
+    def demux(batch: bytes) -> bytes:
+        out = bytearray()
+        for offset in range(0, len(batch), FRAME_SIZE):
+            payload = extract_payload(batch[offset : offset + FRAME_SIZE], allowed_pid)
+            if payload:
+                out += payload
+        return bytes(out)
+
+    return demux
+
+
+def mpts_demuxer(ppids: list[int]) -> Callable[[bytes], bytes]:
+    """Batch -> several pPIDs merged into one MPTS, which is what mpts writes."""
+    # Stable across restarts and distinct per transponder, which is all
+    # TVheadend asks of an IPTV mux's tsid.
+    muxer = MptsMuxer(tsid=min(ppids), ppids=ppids)
+    wanted = frozenset(ppids)
+
+    def demux(batch: bytes) -> bytes:
+        payloads: dict[int, bytearray] = defaultdict(bytearray)
+        for offset in range(0, len(batch), FRAME_SIZE):
+            packet = batch[offset : offset + FRAME_SIZE]
+            pid = packet_pid(packet)
+            if pid not in wanted:
+                continue
+            payload = extract_payload(packet, pid)
+            if payload:
+                payloads[pid] += payload
+
+        out = bytearray()
+        for pid, payload in payloads.items():
+            out += muxer.feed(pid, payload)
+        return bytes(out)
+
+    return demux
+
+
+async def _muxes_to_repoint(
+    session: aiohttp.ClientSession,
+    arg: ProxyArgs,
+    orphaned: set[str],
+    target_muxname: str,
+) -> list[dict]:
+    """Every mux that may still feed off a retired service or drifted by name.
+
+    One filtered grid query per uuid and for the name, so the cost follows this
+    channel rather than the whole install. The full grid is only read if a
+    filtered query fails, e.g. on a TVheadend that rejects the filter.
+    """
+    try:
+        queries = [
+            tvh_get_muxes(session, arg.get_base_url(), iptv_url=uuid)
+            for uuid in sorted(orphaned)
+        ]
+        if target_muxname:
+            queries.append(
+                tvh_get_muxes(session, arg.get_base_url(), iptv_muxname=target_muxname)
+            )
+        results = await asyncio.gather(*queries)
+    except aiohttp.ClientResponseError as e:
+        logger.debug("Filtered mux lookup failed ({}); reading every mux", e.status)
+        return (await tvh_get_muxes(session, arg.get_base_url())).get("entries", [])
+
+    muxes: dict[str, dict] = {}
+    for result in results:
+        for mux in result.get("entries", []):
+            muxes[mux["uuid"]] = mux
+    return list(muxes.values())
 
 
 async def recreate_mux_if_needed(arg: ProxyArgs) -> str | None:
@@ -189,20 +505,15 @@ async def recreate_mux_if_needed(arg: ProxyArgs) -> str | None:
             None,
         )
 
-        # Fetched early (and reused below) so the single summary log line at
-        # the end can name this pPID the same way TVheadend's own UI does,
-        # e.g. "abertpy: MUX 11653H pPID 303".
-        all_muxes: list = (await tvh_get_muxes(session, arg.get_base_url())).get(
-            "entries", []
-        )
-        dvb_mux_name: str = next(
-            (
-                mux.get("name", "")
-                for mux in all_muxes
-                if mux["uuid"] == parent_dvb_mux_uuid
-            ),
-            "",
+        # Resolved early so the single summary log line at the end can name
+        # this pPID the same way TVheadend's own UI does, e.g.
+        # "abertpy: MUX 11653H pPID 303".
+        parent_dvb_mux = (
+            await tvh_load_node(session, arg.get_base_url(), parent_dvb_mux_uuid)
+            if parent_dvb_mux_uuid
+            else None
         )
+        dvb_mux_name: str = (parent_dvb_mux or {}).get("name", "")
         target_muxname = (
             f"{_HARDCODED_KEY}: MUX {dvb_mux_name} pPID {original_ppid}"
             if dvb_mux_name
@@ -278,7 +589,7 @@ async def recreate_mux_if_needed(arg: ProxyArgs) -> str | None:
 
         updated = 0
         touched_mux_uuids: list[str] = []
-        for mux in all_muxes:
+        for mux in await _muxes_to_repoint(session, arg, orphaned, target_muxname):
             iptv_url: str = mux.get("iptv_url", "")
             if not iptv_url or new_mux_uuid in iptv_url:
                 continue
@@ -345,42 +656,622 @@ async def recreate_mux_if_needed(arg: ProxyArgs) -> str | None:
         return new_mux_uuid
 
 
-def _stream(arg: ProxyArgs) -> None:
-    base_url = arg.get_base_url()
+class _ShuttingDown(Exception):
+    """TVheadend is done with us.
+
+    Raised straight from the signal handler, or on writing to the pipe it
+    closed, so that whatever the proxy is doing unwinds at once and closes the
+    upstream response on its way out. That is what hands the subscription,
+    and with it the tuner, back to TVheadend. Deliberately not a
+    ConnectionError: nothing may retry it.
+    """
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.at = time.monotonic()
+
+
+_SHUTDOWN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def _ignore_shutdown_signals() -> None:
+    # Once is enough: another signal must not interrupt the unwinding
+    for sig in _SHUTDOWN_SIGNALS:
+        signal.signal(sig, signal.SIG_IGN)
+
+
+def _raise_shutting_down(signum: int, frame: FrameType | None) -> None:
+    _ignore_shutdown_signals()
+    raise _ShuttingDown(signal.Signals(signum).name)
+
+
+class TunerBusy(ConnectionError):
+    """TVheadend ended the stream before sending a single byte.
+
+    That is what "No input source available" looks like from here: every
+    tuner is taken, and nothing about our service needs re-resolving.
+    """
+
+
+class StreamStalled(ConnectionError):
+    """The upstream connection is still open but has stopped carrying our
+    payload: a descrambler hiccup or tuner re-lock that TVheadend never
+    reports by closing the socket."""
+
+
+# How often to look at TVheadend's tuner status while waiting for one to
+# free up. A retry landing on an exponential backoff could miss a released
+# tuner by up to its whole (capped) interval; polling bounds that to this.
+_TUNER_POLL_S = 0.25
+
+# A stream is only declared dead once it has been silent for longer than its
+# own observed payload rate needs to deliver this much -- so a pPID too
+# low-bitrate to fill a batch within --stall-seconds is not mistaken for a
+# dead one -- and never for longer than _MAX_STALL_FACTOR times that setting.
+_STALL_BYTES = 64 * 1024
+_MAX_STALL_FACTOR = 4
+# Weight of each new sample in the payload rate's moving average
+_RATE_ALPHA = 0.2
+
+
+@dataclass
+class _Backend:
+    """One TVheadend server of the pool, and our service uuid on it."""
+
+    url: pydantic.HttpUrl
+    service_uuid: str = ""
+
+    def base_url(self) -> str:
+        return str(self.url).removesuffix(self.url.path or "/")
+
+
+@dataclass
+class _Upstream:
+    """What one proxy run carries from one stream attempt to the next."""
+
+    transponder: str
+    label: str
+    deadline: float
+    # Every server we may stream from, the one in use included
+    backends: list[_Backend] = field(default_factory=list)
+    endpoint: str = ""
+    # Set until the service has been resolved, and again after any failure
+    # that could mean it changed under us.
+    resolve: bool = True
+    # The last attempt was turned away for want of a tuner
+    tuner_busy: bool = False
+    # When the payload stopped, while recovering from a stall
+    stalled_at: float | None = None
+    stalls: int = 0
+    stalled_seconds: float = 0.0
+    demux: Callable[[bytes], bytes] | None = None
+    usage: SessionRecorder | None = None
+    # mpts: the stream of each pPID's override service, as last resolved
+    endpoints: list[str] = field(default_factory=list)
+
+
+class _Watchdog:
+    """Decides when a connected stream has gone quiet for too long."""
+
+    def __init__(self, stall_seconds: float) -> None:
+        self.stall_seconds = stall_seconds
+        self.rate = 0.0  # payload bytes/s, moving average while flowing
+        self.last_payload = time.monotonic()
+        self.flowed = False
+
+    def allowed_silence(self) -> float:
+        if not self.rate:
+            return self.stall_seconds
+        return min(
+            max(self.stall_seconds, _STALL_BYTES / self.rate),
+            _MAX_STALL_FACTOR * self.stall_seconds,
+        )
+
+    def saw(self, payload_bytes: int) -> None:
+        now = time.monotonic()
+        silence = now - self.last_payload
+        if not payload_bytes:
+            if silence > self.allowed_silence():
+                raise StreamStalled(f"no payload for {silence:.1f}s")
+            return
+
+        # The first batch's wait includes connecting and tuning, which says
+        # nothing about the bitrate
+        if self.flowed and silence > 0:
+            sample = payload_bytes / silence
+            self.rate = (
+                self.rate + _RATE_ALPHA * (sample - self.rate) if self.rate else sample
+            )
+        self.last_payload = now
+        self.flowed = True
+
 
-    new_svc_uuid = asyncio.run(recreate_mux_if_needed(arg))
+def _use_backend(arg: StreamArgs, upstream: _Upstream, backend: _Backend) -> None:
+    """Stream from backend from the next attempt on."""
+    if backend.url == arg.tvheadend_url:
+        return
+
+    for current in upstream.backends:
+        if current.url == arg.tvheadend_url:
+            # Keep what self-heal learnt there, should we ever come back
+            current.service_uuid = getattr(arg, "service_uuid", "")
+
+    logger.info(
+        "{}: switching from backend {} to {}",
+        upstream.label,
+        arg.tvheadend_url.host,
+        backend.url.host,
+    )
+    arg.tvheadend_url = backend.url
+    if isinstance(arg, ProxyArgs):
+        arg.service_uuid = backend.service_uuid
+    upstream.resolve = True
+
+
+async def _tuner_free(
+    session: aiohttp.ClientSession, backend: _Backend, transponder: str
+) -> bool | None:
+    """Whether backend could serve transponder now; None if it won't tell."""
+    try:
+        inputs, subscriptions = await asyncio.gather(
+            tvh_get_inputs(session, backend.base_url()),
+            tvh_get_subscriptions(session, backend.base_url()),
+        )
+    except aiohttp.ClientError as e:
+        # The status API wants admin rights some installs don't grant the
+        # proxy, and a backend of the pool may simply be down
+        logger.debug("Cannot read tuner status of {}: {}", backend.url.host, e)
+        return None
+    return dvbs_tuner_can_serve(inputs, subscriptions, transponder)
+
+
+def _by_preference(arg: StreamArgs, upstream: _Upstream) -> list[_Backend]:
+    """The pool with the backend in use first, so we only move for a reason."""
+    return sorted(upstream.backends, key=lambda b: b.url != arg.tvheadend_url)
+
+
+async def pick_backend(arg: StreamArgs, upstream: _Upstream) -> None:
+    """Start on the first backend with a tuner free for our transponder.
+
+    A single look, never a wait: if none has one, we stay where we are and
+    the usual retry waits for a tuner.
+    """
+    backends = _by_preference(arg, upstream)
+    async with aiohttp.ClientSession(
+        raise_for_status=True, headers={"User-Agent": "curl/aiohttp"}
+    ) as session:
+        free = await asyncio.gather(
+            *(_tuner_free(session, b, upstream.transponder) for b in backends)
+        )
+    backend = next((b for b, ok in zip(backends, free) if ok), None)
+    if backend is not None:
+        _use_backend(arg, upstream, backend)
+
+
+async def wait_for_tuner(arg: StreamArgs, upstream: _Upstream) -> bool:
+    """Block until a satellite tuner could serve our transponder, or the retry
+    budget runs out. Returns whether one was seen.
+
+    Every backend of the pool is watched, and the first to have a tuner free
+    (the one in use preferred) is the one the next attempt streams from.
+    """
+    backends = _by_preference(arg, upstream)
+    async with aiohttp.ClientSession(
+        raise_for_status=True, headers={"User-Agent": "curl/aiohttp"}
+    ) as session:
+        while True:
+            free = await asyncio.gather(
+                *(_tuner_free(session, b, upstream.transponder) for b in backends)
+            )
+            if all(ok is None for ok in free):
+                # Nobody tells us about their tuners; fall back to a blind
+                # wait like the old backoff.
+                remaining = upstream.deadline - time.monotonic()
+                await asyncio.sleep(max(0.0, min(5.0, remaining)))
+                return False
+
+            backend = next((b for b, ok in zip(backends, free) if ok), None)
+            if backend is not None:
+                _use_backend(arg, upstream, backend)
+                return True
+            if time.monotonic() + _TUNER_POLL_S >= upstream.deadline:
+                return False
+            await asyncio.sleep(_TUNER_POLL_S)
+
+
+def _on_stall(upstream: _Upstream, watchdog: _Watchdog, reason: str) -> None:
+    upstream.stalls += 1
+    repeated = upstream.stalled_at is not None
+    if not repeated:
+        upstream.stalled_at = watchdog.last_payload
+
+    # A first stall is almost always the descrambler or the tuner, neither of
+    # which touches our service, so reconnect straight away. Stalling again
+    # before any payload got through is worth re-resolving over.
+    upstream.resolve = repeated
+    upstream.tuner_busy = False
+    logger.warning(
+        "{}: stream stalled ({}), stall #{}; reconnecting",
+        upstream.label,
+        reason,
+        upstream.stalls,
+    )
+
+
+def _on_payload(upstream: _Upstream) -> None:
+    if upstream.stalled_at is None:
+        return
+
+    recovery = time.monotonic() - upstream.stalled_at
+    upstream.stalled_seconds += recovery
+    upstream.stalled_at = None
+    logger.info(
+        "{}: recovered from stall #{} after {:.1f}s ({:.1f}s stalled in total)",
+        upstream.label,
+        upstream.stalls,
+        recovery,
+        upstream.stalled_seconds,
+    )
+
+
+def _open_upstream(arg: StreamArgs, endpoint: str) -> requests.Response:
+    return requests.get(
+        endpoint,
+        stream=True,
+        headers={"User-Agent": "curl/aiohttp"},
+        timeout=arg.read_timeout,
+    )
+
+
+class _SpeculativeOpen:
+    """The stream to a service, opening in the background.
+
+    TVheadend starts the subscription, tunes and warms the descrambler up as
+    soon as the request arrives, while self-heal is still checking whether
+    that service is the right one. Whatever arrives meanwhile waits in the
+    socket's receive buffer.
+    """
+
+    def __init__(self, arg: StreamArgs, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self._lock = threading.Lock()
+        self._opened = threading.Event()
+        self._abandoned = False
+        self._response: requests.Response | None = None
+        threading.Thread(target=self._open, args=(arg,), daemon=True).start()
+
+    def _open(self, arg: StreamArgs) -> None:
+        try:
+            response: requests.Response | None = _open_upstream(arg, self.endpoint)
+        except requests.exceptions.RequestException as e:
+            # The usual connect below will meet this again and deal with it
+            logger.debug("Speculative stream open failed: {}", e)
+            response = None
+
+        with self._lock:
+            if self._abandoned and response is not None:
+                response.close()
+                response = None
+            self._response = response
+            self._opened.set()
+
+    def take(self) -> requests.Response | None:
+        """The open stream, once it is; None if it could not be opened."""
+        self._opened.wait()
+        return self._response
+
+    def abandon(self) -> None:
+        with self._lock:
+            self._abandoned = True
+            if self._response is not None:
+                self._response.close()
+                self._response = None
+
+
+def _heal(arg: ProxyArgs, upstream: _Upstream) -> _LiveSource | None:
+    """Self-heal our service, streaming from it meanwhile on a hunch it holds.
+
+    Returns that stream when self-heal left the service as it was, which is
+    nearly always, so the API calls cost no zap time. When the service moved,
+    the stream is dropped and None left for _pump to connect afresh.
+    """
+    speculative = _SpeculativeOpen(
+        arg, f"{arg.get_base_url()}/stream/service/{arg.service_uuid}"
+    )
+    try:
+        new_svc_uuid = asyncio.run(recreate_mux_if_needed(arg))
+    except BaseException:
+        speculative.abandon()
+        raise
 
     if new_svc_uuid:
         # Was corrected
-        endpoint = f"{base_url}/stream/service/{new_svc_uuid}"
-    else:
-        endpoint = f"{base_url}/stream/service/{arg.service_uuid}"
+        arg.service_uuid = new_svc_uuid
+    upstream.endpoint = f"{arg.get_base_url()}/stream/service/{arg.service_uuid}"
+    upstream.resolve = False
+    zaptime.mark("recreate_mux")
+
+    if speculative.endpoint != upstream.endpoint:
+        logger.debug("Service moved; dropping the speculative stream")
+        speculative.abandon()
+        return None
+    response = speculative.take()
+    return _LiveSource(response) if response is not None else None
+
+
+def _pump(
+    arg: StreamArgs,
+    upstream: _Upstream,
+    tuner_seen: bool,
+    demux: Callable[[bytes], bytes],
+    source: _LiveSource | _StandbySource | _MergedSource | None = None,
+) -> None:
+    """Stream upstream.endpoint, or a source already open on it, through
+    demux to stdout until it fails.
+
+    The stream ending is always a failure here -- TVheadend stops a pipe input
+    by signalling us, never by closing our upstream -- so it raises into the
+    retry below, telling a refusal (no bytes at all) apart from a drop, and
+    both apart from a stall.
+    """
+    if source is None:
+        try:
+            response = _open_upstream(arg, upstream.endpoint)
+        except requests.exceptions.ConnectionError:
+            upstream.resolve = True
+            # With a pool, look for a backend that is up and has a tuner free
+            upstream.tuner_busy = len(upstream.backends) > 1
+            raise
+        source = _LiveSource(response)
+    zaptime.mark("connect")
+
+    watchdog = _Watchdog(arg.stall_seconds)
+    received = False
+    try:
+        for batch in iter_batches(source, arg.read_chunk_log2):
+            received = True
+            out = demux(batch)
+            if out:
+                _on_payload(upstream)
+                try:
+                    sys.stdout.buffer.write(out)
+                except BrokenPipeError as e:
+                    # TVheadend closed its end without signalling us first
+                    raise _ShuttingDown("stdout closed") from e
+                zaptime.report(upstream.label, arg.zap_log)
+                if upstream.usage is not None:
+                    upstream.usage.add(len(out))
+            watchdog.saw(len(out))
+    except StreamStalled as e:
+        _on_stall(upstream, watchdog, str(e))
+        raise
+    except requests.exceptions.ConnectionError as e:
+        # iter_content reports a read timeout -- not one byte for the whole
+        # --read-timeout -- as a ConnectionError wrapping urllib3's error
+        if not (e.args and isinstance(e.args[0], ReadTimeoutError)):
+            raise
+        reason = f"no data for {arg.read_timeout:.0f}s"
+        _on_stall(upstream, watchdog, reason)
+        raise StreamStalled(reason) from e
+    finally:
+        source.close()
+        if watchdog.flowed:
+            # This outage began when our payload stopped, and only gets
+            # --retry-seconds from there, however long it had played before
+            upstream.deadline = watchdog.last_payload + arg.retry_seconds
 
-    response = requests.get(
-        endpoint, stream=True, headers={"User-Agent": "curl/aiohttp"}
+    if received:
+        upstream.resolve = True
+        upstream.tuner_busy = False
+        raise ConnectionError("TVheadend ended the stream")
+
+    if tuner_seen:
+        # A tuner looked free and we were still turned away, so the tuner is
+        # not the problem: re-resolve and back off as for any other failure.
+        upstream.resolve = True
+        upstream.tuner_busy = False
+        raise ConnectionError("TVheadend refused the stream with a tuner free")
+
+    upstream.tuner_busy = True
+    raise TunerBusy("TVheadend refused the stream, no tuner available")
+
+
+def _await_tuner(arg: StreamArgs, upstream: _Upstream) -> bool:
+    if not upstream.tuner_busy:
+        return False
+
+    tuner_seen = asyncio.run(wait_for_tuner(arg, upstream))
+    logger.debug(
+        "Tuner for {} on {} {}",
+        upstream.transponder or "any transponder",
+        arg.tvheadend_url.host,
+        "available" if tuner_seen else "still busy at the end of the retry budget",
     )
-    for batch in iter_batches(response, arg.read_chunk_log2):
-        out = bytearray()
-        for offset in range(0, len(batch), FRAME_SIZE):
-            payload = extract_payload(
-                batch[offset : offset + FRAME_SIZE], arg.allowed_pid
+    return tuner_seen
+
+
+def _stream(arg: ProxyArgs, upstream: _Upstream) -> None:
+    standby = arg.take_standby()
+    if standby is None and not arg.is_resolved():
+        # The standby we started on has failed, and nothing was resolved yet
+        arg.resolve_service()
+        upstream.backends = [_Backend(url, uuid) for url, uuid in arg.pool()]
+
+    # After a plain "no tuner" refusal nothing about the service changed, so
+    # skip the half-dozen API calls of resolving it again and just wait for a
+    # tuner that could take us.
+    tuner_seen = _await_tuner(arg, upstream)
+
+    source: _LiveSource | _StandbySource | None = None
+    if standby is not None:
+        source = _StandbySource(standby, arg.read_timeout)
+    elif upstream.resolve or not upstream.endpoint:
+        # Started on a standby, there is no endpoint of our own to reconnect
+        # to yet, even after a first stall that would not re-resolve
+        source = _heal(arg, upstream)
+
+    demux = ppid_demuxer(arg.allowed_pid)
+    if arg.rap_start:
+        # A fresh gate per connection: a reconnect joins mid-GOP all over again
+        gate = RandomAccessGate(arg.rap_wait_seconds)
+        ppid_demux = demux
+
+        def demux(batch: bytes) -> bytes:
+            return gate.feed(ppid_demux(batch))
+
+    _pump(arg, upstream, tuner_seen, demux, source)
+
+
+async def resolve_mpts_services(arg: MptsArgs) -> dict[int, str]:
+    """pPID -> uuid of its override service on our transponder, for every
+    pPID that has one."""
+    async with aiohttp.ClientSession(
+        raise_for_status=True, headers={"User-Agent": "curl/aiohttp"}
+    ) as session:
+        overrides = await asyncio.gather(
+            *(
+                tvh_find_overrides(
+                    session, arg.get_base_url(), arg.transponder_uuid, ppid
+                )
+                for ppid in arg.allowed_pids
             )
-            if payload:
-                out += payload
-        if out:
-            sys.stdout.buffer.write(out)
+        )
+
+    services: dict[int, str] = {}
+    for ppid, candidates in zip(arg.allowed_pids, overrides):
+        if not candidates:
+            logger.warning(
+                "pPID {} has no override service on {}; left out until setup "
+                "creates one",
+                ppid,
+                arg.dvb_mux or arg.transponder_uuid,
+            )
+            continue
+        if not candidates[0].get("enabled", True):
+            logger.warning(
+                "The override service of pPID {} is disabled; run setup again",
+                ppid,
+            )
+        services[ppid] = candidates[0]["uuid"]
+
+    if not services:
+        raise ValueError(
+            f"No pPID of {arg.dvb_mux or arg.transponder_uuid} has an override "
+            "service to stream it descrambled from. Run setup again."
+        )
+    return services
+
+
+def _open_merged(arg: MptsArgs, upstream: _Upstream) -> _MergedSource:
+    # All subscriptions start together: TVheadend tunes once for the first
+    # and shares that tuner with the rest, so none waits for another
+    opening = [_SpeculativeOpen(arg, endpoint) for endpoint in upstream.endpoints]
+    responses = [speculative.take() for speculative in opening]
+    if None in responses:
+        for response in responses:
+            if response is not None:
+                response.close()
+        upstream.resolve = True
+        raise requests.exceptions.ConnectionError(
+            f"cannot open {responses.count(None)} of {len(responses)} pPID streams"
+        )
+    return _MergedSource(responses, arg.read_timeout)  # type: ignore
+
+
+def _stream_mpts(arg: MptsArgs, upstream: _Upstream) -> None:
+    # A raw mux subscription would be cheaper, but TVheadend descrambles no
+    # such thing: each pPID comes through its override service, which carries
+    # the CA stream and key, as it does for proxy. Self-heal stays proxy's,
+    # and setup's: here a missing or moved override is only looked up again.
+    tuner_seen = _await_tuner(arg, upstream)
+
+    if upstream.resolve or not upstream.endpoints:
+        services = asyncio.run(resolve_mpts_services(arg))
+        upstream.endpoints = [
+            f"{arg.get_base_url()}/stream/service/{uuid}"
+            for _, uuid in sorted(services.items())
+        ]
+        upstream.resolve = False
+        zaptime.mark("resolve_service")
+
+    # One muxer for the whole run, so a reconnect keeps every renumbered PID
+    # and program where TVheadend already saw it
+    if upstream.demux is None:
+        upstream.demux = mpts_demuxer(arg.allowed_pids)
+
+    _pump(arg, upstream, tuner_seen, upstream.demux, _open_merged(arg, upstream))
 
 
 def _log_retry(details: Mapping[str, Any]) -> None:
     logger.debug(
         "Stream attempt {} failed ({}); retrying in {:.1f}s",
         details["tries"],
-        details.get("value") or "connection lost",
+        details.get("exception") or "connection lost",
         details["wait"],
     )
 
 
-def proxy(arg: ProxyArgs):
+def _tuner_aware_expo(
+    max_value: float,
+) -> Generator[float, BaseException | None, None]:
+    """backoff.expo, except a busy tuner or a stall is retried at once: the
+    former by first waiting for a tuner to free up, which beats any blind
+    sleep, and the latter because a stall already cost --stall-seconds."""
+    delays = backoff.expo(max_value=max_value)
+    next(delays)
+    exc = yield 0
+    while True:
+        immediate = isinstance(exc, (TunerBusy, StreamStalled))
+        exc = yield (0 if immediate else next(delays))
+
+
+def _run_retrying(
+    stream_fn: Callable[[Any, _Upstream], None],
+    arg: StreamArgs,
+    transponder: str,
+    label: str,
+    backends: list[_Backend] | None = None,
+    usage: SessionRecorder | None = None,
+) -> None:
+    upstream = _Upstream(
+        transponder=transponder,
+        label=label,
+        deadline=time.monotonic() + arg.retry_seconds,
+        backends=backends or [_Backend(arg.tvheadend_url)],
+        usage=usage,
+    )
+    # Closing the response is all it takes to release the tuner, so do that
+    # the moment TVheadend signals instead of when the interpreter gets to it
+    for sig in _SHUTDOWN_SIGNALS:
+        signal.signal(sig, _raise_shutting_down)
+    try:
+        _retry_forever(arg, upstream, stream_fn)
+    except _ShuttingDown as e:
+        _ignore_shutdown_signals()
+        logger.info(
+            "{}: stopping on {}, upstream released in {:.1f}ms",
+            label,
+            e,
+            (time.monotonic() - e.at) * 1000,
+        )
+        if upstream.usage is not None:
+            upstream.usage.flush()
+        if isinstance(e.__cause__, BrokenPipeError):
+            # Whatever is left in stdout's buffer can never be written; point
+            # it at /dev/null so flushing at exit does not raise all over again
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(0)
+
+
+def _retry_forever(
+    arg: StreamArgs,
+    upstream: _Upstream,
+    stream_fn: Callable[[Any, _Upstream], None],
+) -> None:
+    if len(upstream.backends) > 1:
+        asyncio.run(pick_backend(arg, upstream))
+        zaptime.mark("pick_backend")
+
     # requests raises its own ConnectionError, a sibling of the builtin rather
     # than a subclass, so naming only the builtin would never retry anything.
     #
@@ -396,26 +1287,80 @@ def proxy(arg: ProxyArgs):
     # max_value caps the exponential interval so a long budget still means many
     # attempts rather than a handful of increasingly distant ones.
     stream = backoff.on_exception(
-        backoff.expo,
+        _tuner_aware_expo,
         (ConnectionError, requests.exceptions.ConnectionError),
-        max_time=arg.retry_seconds,
+        max_time=lambda: upstream.deadline - time.monotonic(),
         max_value=5,
         jitter=backoff.full_jitter,
         on_backoff=_log_retry,
-    )(_stream)
+    )(stream_fn)
+
+    while True:
+        try:
+            stream(arg, upstream)
+            return
+        except (ConnectionError, requests.exceptions.ConnectionError) as e:
+            if upstream.usage is not None:
+                upstream.usage.flush()
+            # backoff fixes its budget once, when entered, so a stream that
+            # played for hours before dropping would find it long spent. Every
+            # time our payload flows the deadline moves out instead; still
+            # short of it, this is an outage with budget left, not a give-up.
+            if time.monotonic() < upstream.deadline:
+                continue
+
+            # Getting here means the connection kept failing for the whole
+            # retry window (e.g. TVheadend itself is unavailable, or the
+            # tuners never freed up) -- TVheadend will spawn us again once the
+            # channel is next needed, so there's nothing to do but say why we
+            # stopped, not dump a full traceback for an expected,
+            # already-retried condition.
+            logger.warning(
+                "Giving up on {} after {}s: {}",
+                upstream.label,
+                arg.retry_seconds,
+                e,
+            )
+            sys.exit(1)
+
+
+def proxy(arg: ProxyArgs):
+    standbys = None
+    if arg.standby and arg.dvb_mux:
+        standbys = StandbyHost(
+            arg.get_base_url(),
+            arg.dvb_mux,
+            arg.allowed_pid,
+            arg.standby,
+            arg.usage_db.expanduser(),
+            arg.standby_linger,
+        )
+        standbys.start()
 
     try:
-        stream(arg)
-    except (ConnectionError, requests.exceptions.ConnectionError) as e:
-        # Getting here means the connection kept failing for the whole retry
-        # window (e.g. TVheadend itself is unavailable, or the tuners never
-        # freed up) -- TVheadend will spawn us again once the channel is next
-        # needed, so there's nothing to do but say why we stopped, not dump a
-        # full traceback for an expected, already-retried condition.
-        logger.warning(
-            "Giving up on service {} after {}s: {}",
-            arg.service_uuid,
-            arg.retry_seconds,
-            e,
+        with sampling(arg.profile, f"{arg.dvb_mux or 'proxy'}-pPID{arg.allowed_pid}"):
+            _run_retrying(
+                _stream,
+                arg,
+                arg.dvb_mux,
+                f"service {arg.service_uuid}",
+                [_Backend(url, service_uuid) for url, service_uuid in arg.pool()],
+                SessionRecorder(
+                    arg.usage_db.expanduser(), arg.dvb_mux, arg.allowed_pid
+                ),
+            )
+    finally:
+        if standbys is not None:
+            # Our own upstream is released by now; only the siblings wait, and
+            # only with --standby-linger
+            standbys.linger()
+
+
+def mpts(arg: MptsArgs):
+    with sampling(arg.profile, f"{arg.dvb_mux or arg.transponder_uuid}-mpts"):
+        _run_retrying(
+            _stream_mpts,
+            arg,
+            arg.dvb_mux,
+            f"transponder {arg.dvb_mux or arg.transponder_uuid}",
         )
-        sys.exit(1)
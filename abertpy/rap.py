@@ -0,0 +1,182 @@
+"""Start a demuxed pPID stream on random access points rather than mid-GOP.
+
+The inner transport stream a pPID carries is joined wherever the upstream
+happened to be, so every video PID usually starts inside a GOP that the
+decoder can only throw away. The gate here holds each video PID back until it
+reaches a random access point of its own: the adaptation field's
+random_access_indicator, or failing that, a keyframe or sequence header found
+by sniffing the start of the PES. PSI passes straight through, so TVheadend
+learns the layout at once, and a time bound opens everything regardless.
+"""
+
+import time
+
+from loguru import logger
+
+from abertpy.ts import (
+    FRAME_SIZE,
+    MPEG_TS_START_BYTE,
+    PID_PAT,
+    TABLE_PAT,
+    TABLE_PMT,
+    SectionAssembler,
+    packet_payload,
+    packet_pid,
+    pat_pmt_pids,
+    pmt_elementary_streams,
+)
+
+_STREAM_TYPE_MPEG1_VIDEO = 0x01
+_STREAM_TYPE_MPEG2_VIDEO = 0x02
+_STREAM_TYPE_H264 = 0x1B
+_STREAM_TYPE_HEVC = 0x24
+_VIDEO_STREAM_TYPES = {
+    _STREAM_TYPE_MPEG1_VIDEO,
+    _STREAM_TYPE_MPEG2_VIDEO,
+    _STREAM_TYPE_H264,
+    _STREAM_TYPE_HEVC,
+}
+
+_H264_NAL_IDR = 5
+_H264_NAL_SPS = 7
+_HEVC_NAL_IRAP = range(16, 22)
+_HEVC_NAL_PARAMETER_SETS = range(32, 35)
+_MPEG2_SEQUENCE_HEADER = 0xB3
+_MPEG2_GOP_HEADER = 0xB8
+
+
+def _is_random_access(packet: bytes, stream_type: int) -> bool:
+    """Whether a video packet starts a PES the decoder can begin from."""
+    if not packet[1] & 0x40:
+        return False
+
+    # random_access_indicator, when the muxer bothers to set it
+    if packet[3] & 0x20 and packet[4] and packet[5] & 0x40:
+        return True
+
+    pes = packet_payload(packet)
+    if not pes or len(pes) < 9 or pes[:3] != b"\x00\x00\x01":
+        return False
+    es = pes[9 + pes[8] :]
+
+    start = es.find(b"\x00\x00\x01")
+    while 0 <= start < len(es) - 3:
+        code = es[start + 3]
+        if stream_type == _STREAM_TYPE_H264:
+            if code & 0x1F in (_H264_NAL_IDR, _H264_NAL_SPS):
+                return True
+        elif stream_type == _STREAM_TYPE_HEVC:
+            nal_type = (code >> 1) & 0x3F
+            if nal_type in _HEVC_NAL_IRAP or nal_type in _HEVC_NAL_PARAMETER_SETS:
+                return True
+        elif code in (_MPEG2_SEQUENCE_HEADER, _MPEG2_GOP_HEADER):
+            return True
+        start = es.find(b"\x00\x00\x01", start + 3)
+    return False
+
+
+class RandomAccessGate:
+    """Passes an inner TS on, each video PID from its first random access point.
+
+    Until the PAT and every PMT it lists have been seen nothing but PSI gets
+    through, since nothing else can be told apart or decoded yet. After
+    max_wait_s the gate opens fully, whatever it is still waiting for.
+    """
+
+    def __init__(self, max_wait_s: float) -> None:
+        self.max_wait_s = max_wait_s
+        self.open = False
+        self._started: float | None = None
+        self._buf = bytearray()
+        self._pat = SectionAssembler()
+        # PMT PID -> assembler, for the programs the PAT lists
+        self._pmts: dict[int, SectionAssembler] = {}
+        self._pmts_seen: set[int] = set()
+        # Video PID -> stream type, for those still waiting on a keyframe
+        self._waiting: dict[int, int] = {}
+        self._released: set[int] = set()
+
+    def feed(self, data: bytes) -> bytes:
+        if self.open:
+            return data
+
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+
+        self._buf += data
+        out = bytearray()
+        offset = 0
+        while offset + FRAME_SIZE <= len(self._buf):
+            if self._buf[offset] != MPEG_TS_START_BYTE:
+                # Joined mid-frame, or lost sync: slide to the next candidate
+                offset += 1
+                continue
+            packet = bytes(self._buf[offset : offset + FRAME_SIZE])
+            offset += FRAME_SIZE
+            if self._admit(packet):
+                out += packet
+        del self._buf[:offset]
+
+        psi_complete = bool(self._pmts) and self._pmts_seen >= self._pmts.keys()
+        if psi_complete and not self._waiting:
+            logger.debug(
+                "Video PIDs {} start on random access points after {:.2f}s",
+                ",".join(str(pid) for pid in sorted(self._released)),
+                now - self._started,
+            )
+            self._open(out)
+        elif now - self._started >= self.max_wait_s:
+            logger.warning(
+                "No random access point within {}s on PIDs {}; passing through",
+                self.max_wait_s,
+                ",".join(str(pid) for pid in sorted(self._waiting)) or "(no PMT)",
+            )
+            self._open(out)
+
+        return bytes(out)
+
+    def _open(self, out: bytearray) -> None:
+        self.open = True
+        out += self._buf
+        self._buf.clear()
+
+    def _admit(self, packet: bytes) -> bool:
+        pid = packet_pid(packet)
+        if pid == PID_PAT:
+            for section in self._pat.push(packet):
+                if section[0] == TABLE_PAT:
+                    self._on_pat(section)
+            return True
+
+        if pid in self._pmts:
+            for section in self._pmts[pid].push(packet):
+                if section[0] == TABLE_PMT:
+                    self._on_pmt(pid, section)
+            return True
+
+        if not self._pmts or self._pmts_seen < self._pmts.keys():
+            return False
+
+        stream_type = self._waiting.get(pid)
+        if stream_type is None:
+            return True
+        if not _is_random_access(packet, stream_type):
+            return False
+
+        del self._waiting[pid]
+        self._released.add(pid)
+        return True
+
+    def _on_pat(self, section: bytes) -> None:
+        for pmt_pid in pat_pmt_pids(section).values():
+            self._pmts.setdefault(pmt_pid, SectionAssembler())
+
+    def _on_pmt(self, pmt_pid: int, section: bytes) -> None:
+        if pmt_pid in self._pmts_seen:
+            return
+        self._pmts_seen.add(pmt_pid)
+
+        for stream_type, es_pid in pmt_elementary_streams(section):
+            if stream_type in _VIDEO_STREAM_TYPES and es_pid not in self._released:
+                self._waiting[es_pid] = stream_type
@@ -0,0 +1,223 @@
+import itertools
+import mmap
+import random
+import signal
+import sys
+import time
+from collections.abc import Iterator
+
+from loguru import logger
+
+from abertpy.models import ReplayArgs
+from abertpy.proxy import (
+    _SHUTDOWN_SIGNALS,
+    BatchController,
+    _raise_shutting_down,
+    _ShuttingDown,
+    iter_batches,
+    mpts_demuxer,
+    ppid_demuxer,
+)
+from abertpy.ts import (
+    FRAME_SIZE,
+    MPEG_TS_START_BYTE,
+    PCR_CLOCK_HZ,
+    PCR_WRAP,
+    packet_pcr,
+    packet_pid,
+)
+
+# A PCR this far from where the previous one predicted is a discontinuity (a
+# splice in the capture, or the loop back to its start), not a reason to
+# stall the replay for minutes or to rush through it.
+_PCR_MAX_JUMP_S = 2.0
+
+# Flush intervals kept for the summary's percentiles, so a --loop 0 replay
+# runs in constant memory however long it goes
+_INTERVAL_SAMPLES = 10_000
+
+
+def _first_sync(capture: mmap.mmap) -> int:
+    """Offset of the first frame boundary, confirmed by the one after it."""
+    offset = capture.find(bytes((MPEG_TS_START_BYTE,)))
+    while 0 <= offset < len(capture) - FRAME_SIZE:
+        if capture[offset + FRAME_SIZE] == MPEG_TS_START_BYTE:
+            return offset
+        offset = capture.find(bytes((MPEG_TS_START_BYTE,)), offset + 1)
+    raise ValueError("No MPEG-TS frames found in the capture")
+
+
+class _PcrClock:
+    """Maps the capture's PCR timeline onto wall-clock time.
+
+    Follows whichever PID is first seen carrying a PCR, as a receiver locked
+    to that program would.
+    """
+
+    def __init__(self) -> None:
+        self.pid: int | None = None
+        self.pcr = 0
+        self.due = 0.0
+
+    def due_at(self, pcr: int) -> float:
+        now = time.monotonic()
+        if not self.due:
+            self.pcr, self.due = pcr, now
+            return now
+
+        elapsed = ((pcr - self.pcr) % PCR_WRAP) / PCR_CLOCK_HZ
+        if elapsed > _PCR_MAX_JUMP_S:
+            # Rebase on the new timeline instead of following the jump
+            self.pcr, self.due = pcr, max(self.due, now)
+            return self.due
+
+        self.pcr, self.due = pcr, self.due + elapsed
+        return self.due
+
+
+class _Intervals:
+    """Flush intervals: every one counted, a uniform sample of them kept."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.max = 0.0
+        self._sample: list[float] = []
+
+    def add(self, interval: float) -> None:
+        self.count += 1
+        self.max = max(self.max, interval)
+        if len(self._sample) < _INTERVAL_SAMPLES:
+            self._sample.append(interval)
+        elif (slot := random.randrange(self.count)) < _INTERVAL_SAMPLES:
+            self._sample[slot] = interval
+
+    def percentile(self, percent: int) -> float:
+        if not self._sample:
+            return 0.0
+        ordered = sorted(self._sample)
+        return ordered[len(ordered) * percent // 100]
+
+
+class _CaptureSource:
+    """A memory-mapped capture, read the way iter_batches reads a live stream.
+
+    Only the pages being demuxed are ever resident, so captures far larger
+    than memory replay fine, and many replays of one file share its pages.
+    """
+
+    def __init__(self, capture: mmap.mmap, arg: ReplayArgs) -> None:
+        self.capture = capture
+        self.arg = arg
+        self.start = _first_sync(capture)
+        # Whole frames only, so each loop starts back on a frame boundary
+        self.end = self.start + (len(capture) - self.start) // FRAME_SIZE * FRAME_SIZE
+        self.bytes_read = 0
+
+        # Where the next read resumes, since iter_batches restarts
+        # iter_content whenever it resizes its reads
+        self._passes = itertools.count() if arg.loop == 0 else iter(range(arg.loop))
+        self._clock = _PcrClock()
+        self._pass_started = 0.0
+        self._offset = self.end
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        while True:
+            if self._offset >= self.end:
+                if next(self._passes, None) is None:
+                    return
+                self._offset = self.start
+                self._pass_started = time.monotonic()
+
+            offset = self._offset
+            chunk = self.capture[offset : min(offset + chunk_size, self.end)]
+
+            if self.arg.pace == "bitrate":
+                sent_bits = (offset - self.start) * 8
+                self._sleep_until(
+                    self._pass_started + sent_bits / (self.arg.bitrate_mbps * 1e6)
+                )
+            elif self.arg.pace == "pcr":
+                self._sleep_until(self._pcr_due(self._clock, offset, len(chunk)))
+
+            self._offset += len(chunk)
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def _pcr_due(self, clock: _PcrClock, offset: int, length: int) -> float:
+        """When the last PCR inside this chunk says it should be sent, or now."""
+        due = 0.0
+        first = offset + -(offset - self.start) % FRAME_SIZE
+        for frame in range(first, offset + length - FRAME_SIZE + 1, FRAME_SIZE):
+            packet = self.capture[frame : frame + 12]
+            pcr = packet_pcr(packet)
+            if pcr is None:
+                continue
+            pid = packet_pid(packet)
+            if clock.pid is None:
+                clock.pid = pid
+            if pid == clock.pid:
+                due = clock.due_at(pcr)
+        return due
+
+    @staticmethod
+    def _sleep_until(due: float) -> None:
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def replay(arg: ReplayArgs) -> None:
+    demux = (
+        ppid_demuxer(arg.allowed_pids[0])
+        if len(arg.allowed_pids) == 1
+        else mpts_demuxer(arg.allowed_pids)
+    )
+
+    # Stopped early, a replay still reports what it measured up to then
+    for sig in _SHUTDOWN_SIGNALS:
+        signal.signal(sig, _raise_shutting_down)
+
+    with (
+        open(arg.input, "rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as capture,
+    ):
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            capture.madvise(mmap.MADV_SEQUENTIAL)
+
+        source = _CaptureSource(capture, arg)
+        controller = BatchController(2**arg.read_chunk_log2)
+        written = 0
+        intervals = _Intervals()
+        started = last = time.monotonic()
+        try:
+            for batch in iter_batches(source, arg.read_chunk_log2, controller):
+                now = time.monotonic()
+                intervals.add(now - last)
+                last = now
+
+                out = demux(batch)
+                if out:
+                    sys.stdout.buffer.write(out)
+                    written += len(out)
+        except _ShuttingDown as e:
+            logger.info("Replay stopped on {}", e)
+        finally:
+            elapsed = max(time.monotonic() - started, 1e-9)
+            logger.info(
+                "Replayed {:.1f}MB ({} pace) in {:.2f}s: {:.1f} Mbps in, {:.1f} "
+                "Mbps payload out; {} batches, flush interval p50 {:.3f}s p99 "
+                "{:.3f}s max {:.3f}s; reads settled at {} bytes, flush at {} "
+                "bytes after {} resize(s)",
+                source.bytes_read / 1e6,
+                arg.pace,
+                elapsed,
+                source.bytes_read * 8 / elapsed / 1e6,
+                written * 8 / elapsed / 1e6,
+                intervals.count,
+                intervals.percentile(50),
+                intervals.percentile(99),
+                intervals.max,
+                controller.read_bytes,
+                controller.flush_bytes,
+                controller.resizes,
+            )
@@ -0,0 +1,89 @@
+"""Targeted in-process rescan of one transponder, shared between proxies.
+
+When several proxies of the same transponder lose their override at once,
+each would otherwise launch its own rescan and fight the others for the tuner.
+A per-transponder flock lets one of them rescan while the rest wait, and a
+waiter that got the lock after a rescan finished takes that result as its own.
+"""
+
+import asyncio
+import fcntl
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from loguru import logger
+
+from abertpy.models import TRUSTED, SetupArgs
+from abertpy.setup import setup_async
+
+
+def _lock_path(network_uuid: str, mux_name: str) -> Path:
+    return (
+        Path(tempfile.gettempdir()) / f"abertpy-rescan-{network_uuid}-{mux_name}.lock"
+    )
+
+
+# How often a waiting proxy tries the lock again
+_LOCK_POLL_S = 0.25
+
+
+async def _lock(path: Path) -> int:
+    """The flock on path, polled so that a cancelled waiter gives up its fd.
+
+    A blocking flock in a thread could not be interrupted, and would take
+    the lock, and keep it, after its caller was long gone.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                await asyncio.sleep(_LOCK_POLL_S)
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+async def rescan_transponder(
+    session: aiohttp.ClientSession, base_url: str, network_uuid: str, mux_name: str
+) -> None:
+    """setup --mux mux_name as a rescan, in this process and on the caller's
+    session: the transponder's overrides are reconciled and the pPID muxes
+    repointed at them, and nothing else is touched.
+
+    Returns once a rescan that started no earlier than this call has finished,
+    whether this caller ran it or waited on another process that did.
+    """
+    requested_at = time.time()
+
+    path = _lock_path(network_uuid, mux_name)
+    # The OS drops the lock if its holder dies
+    fd = await _lock(path)
+    try:
+        # The lock file holds when its last rescan finished
+        last_done = float(os.pread(fd, 32, 0) or 0)
+        if last_done >= requested_at:
+            logger.info("{} was rescanned while we waited; reusing it", mux_name)
+            return
+
+        arg = SetupArgs.model_validate(
+            {
+                "t": base_url,
+                "n": network_uuid,
+                "mux": [mux_name],
+                "validate-abertpy": False,
+            },
+            context=TRUSTED,
+        )
+        await setup_async(arg, session=session, rescan=True)
+
+        done = str(time.time()).encode()
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, done, 0)
+    finally:
+        os.close(fd)
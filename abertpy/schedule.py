@@ -0,0 +1,171 @@
+"""Which muxes a setup scans first, from what earlier scans of them yielded.
+
+Every live scan records, per mux, which pPIDs it found, whether the tuner
+locked onto it and how long it took. Muxes are then scanned in order of
+expected pPIDs per second of tuner time. A mux's expectation also grows the
+longer it goes unscanned, so under a --time-budget the productive transponders
+come first each run and the rest rotate through over several runs.
+"""
+
+import json
+import os
+import tempfile
+import time
+from collections.abc import Collection
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+# Weight of each new scan in the pPID and duration moving averages
+_HISTORY_ALPHA = 0.5
+
+# How many pPIDs a mux is worth per day since it was last scanned. A mux that
+# has carried nothing catches up with one just scanned at N pPIDs after N / this
+# days, which is what rotates the unproductive ones back in.
+_STALENESS_PPIDS_PER_DAY = 0.1
+
+# A mux never scanned counts as unscanned for this long, so it is tried soon
+_NEVER_SCANNED_DAYS = 30
+
+# What a never-scanned mux known to carry Abertis is expected to yield
+_KNOWN_MUX_PPIDS = 1.0
+
+# Good scans in a row that must all miss a pPID before it counts as gone. A
+# PSI-first scan is short enough to miss a low-bitrate pPID now and then.
+GONE_AFTER_SCANS = 2
+
+
+@dataclass
+class MuxHistory:
+    """What scanning one mux has been like so far."""
+
+    scans: int = 0
+    # Scans where the tuner never locked onto the right transponder
+    failures: int = 0
+    # Moving average of the pPIDs found, and the count at the last good scan
+    ppids: float = 0.0
+    last_ppids: int = 0
+    # Moving average of the seconds one scan held the tuner
+    seconds: float = 0.0
+    # Epoch seconds of the last scan, good or not; 0 if never scanned
+    last_scanned: float = 0.0
+    # The pPIDs the last good scan found; None until one recorded them
+    found: list[int] | None = None
+    # The pPIDs of each of the last GONE_AFTER_SCANS good scans, oldest first
+    recent: list[list[int]] = field(default_factory=list)
+
+
+class ScanHistory:
+    """Per-mux scan history of one network, kept in a JSON file."""
+
+    def __init__(self, path: Path, network_uuid: str) -> None:
+        self.path = path
+        self.network_uuid = network_uuid
+        # network uuid -> mux name -> history; other networks are kept as-is
+        self._networks: dict[str, dict[str, dict]] = {}
+        try:
+            self._networks = json.loads(path.read_text())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable scan history {}: {}", path, e)
+
+        self.muxes: dict[str, MuxHistory] = {
+            name: MuxHistory(**entry)
+            for name, entry in self._networks.get(network_uuid, {}).items()
+        }
+
+    def get(self, mux_name: str) -> MuxHistory:
+        return self.muxes.get(mux_name, MuxHistory())
+
+    def priority(
+        self, mux_name: str, known: Collection[str], default_seconds: float, now: float
+    ) -> float:
+        """Expected pPIDs per second of tuner time for scanning mux_name now."""
+        entry = self.get(mux_name)
+        if entry.scans:
+            expected = entry.ppids
+            age_days = (now - entry.last_scanned) / 86400
+        else:
+            expected = _KNOWN_MUX_PPIDS if mux_name in known else 0.0
+            age_days = _NEVER_SCANNED_DAYS
+        expected += _STALENESS_PPIDS_PER_DAY * max(age_days, 0.0)
+
+        # Laplace-smoothed odds the tuner locks, so one bad night is no verdict
+        health = (entry.scans - entry.failures + 1) / (entry.scans + 2)
+        seconds = self.expected_seconds(mux_name, default_seconds)
+        return expected * health / max(seconds, 1.0)
+
+    def order(
+        self, muxes: list[dict], known: Collection[str], default_seconds: float
+    ) -> list[dict]:
+        """muxes, most worthwhile scan first; ties keep the grid order."""
+        now = time.time()
+        return sorted(
+            muxes,
+            key=lambda mux: (
+                -self.priority(mux.get("name", ""), known, default_seconds, now)
+            ),
+        )
+
+    def productive(self, known: Collection[str]) -> set[str]:
+        """Muxes whose last good scan found pPIDs, plus known ones never scanned."""
+        return {
+            name
+            for name, entry in self.muxes.items()
+            if entry.scans > entry.failures and entry.last_ppids
+        } | {name for name in known if not self.get(name).scans}
+
+    def expected_seconds(self, mux_name: str, default: float) -> float:
+        entry = self.get(mux_name)
+        return entry.seconds if entry.scans else default
+
+    def gone(self, mux_name: str, ppid: int) -> bool:
+        """Whether the last GONE_AFTER_SCANS good scans of mux_name all missed
+        ppid. False while fewer good scans than that are recorded."""
+        recent = self.get(mux_name).recent
+        return len(recent) >= GONE_AFTER_SCANS and not any(
+            ppid in found for found in recent
+        )
+
+    def record(
+        self, mux_name: str, ppids: Collection[int] | None, seconds: float
+    ) -> None:
+        """One scan of mux_name: the pPIDs it found, None if it never locked."""
+        entry = self.muxes.setdefault(mux_name, MuxHistory())
+        first = not entry.scans
+        entry.scans += 1
+        entry.last_scanned = time.time()
+        entry.seconds = (
+            seconds
+            if first
+            else entry.seconds + _HISTORY_ALPHA * (seconds - entry.seconds)
+        )
+        if ppids is None:
+            entry.failures += 1
+            return
+
+        good_before = entry.scans - 1 - entry.failures
+        entry.ppids = (
+            len(ppids)
+            if not good_before
+            else entry.ppids + _HISTORY_ALPHA * (len(ppids) - entry.ppids)
+        )
+        entry.last_ppids = len(ppids)
+        entry.found = sorted(ppids)
+        entry.recent = [*entry.recent, entry.found][-GONE_AFTER_SCANS:]
+
+    def save(self) -> None:
+        """Write the history out, atomically so a killed run leaves it intact."""
+        self._networks[self.network_uuid] = {
+            name: asdict(entry) for name, entry in sorted(self.muxes.items())
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._networks, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Cannot save scan history {}: {}", self.path, e)
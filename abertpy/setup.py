@@ -1,22 +1,41 @@
 import asyncio
+import contextlib
 import json
+import re
 import subprocess
+import time
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable
+from pathlib import Path
 
 import aiohttp
 from loguru import logger
 
 from abertpy import _HARDCODED_KEY
 from abertpy.helpers import (
+    extract_ppid_from_svcname,
+    is_abertpy_svc,
     patch_original_SID_svc,
-    tvh_delete_svcs,
     tvh_find_abertpy_network,
-    tvh_find_overrides,
+    tvh_get_inputs,
     tvh_get_muxes,
-    tvh_get_svc_SID,
-    tvh_set_mux_iptv_url,
-    tvh_svc_mux_name,
+    tvh_get_svc_grid,
+    tvh_get_svc_raw,
+    tvh_load_node,
 )
-from abertpy.models import SetupArgs
+from abertpy.journal import SetupJournal
+from abertpy.models import ScanArgs, SetupArgs
+from abertpy.plan import Change, Plan, Snapshot
+from abertpy.schedule import ScanHistory
+from abertpy.ts import (
+    PID_PAT,
+    TABLE_PAT,
+    TABLE_PMT,
+    iter_sections,
+    pat_pmt_pids,
+    pmt_elementary_streams,
+)
+from abertpy.usage import PpidUsage, load_usage
 
 _MAP_PPID_CA: dict[int, int] = {}
 
@@ -118,7 +137,7 @@ async def create_default_abertis_muxes(
         logger.info("All default Abertis muxes already present")
 
 
-async def get_muxes(session: aiohttp.ClientSession, arg: SetupArgs) -> list[dict]:
+async def get_muxes(session: aiohttp.ClientSession, arg: ScanArgs) -> list[dict]:
 
     muxes = await tvh_get_muxes(session, arg.get_base_url())
 
@@ -133,8 +152,15 @@ async def get_muxes(session: aiohttp.ClientSession, arg: SetupArgs) -> list[dict
     return target_muxes
 
 
-def select_muxes_to_scan(arg: SetupArgs, muxes: list[dict]) -> list[dict]:
-    """Restrict which muxes to scan: --mux names, else --fast-scan, else all."""
+def select_muxes_to_scan(
+    arg: ScanArgs, muxes: list[dict], history: ScanHistory | None = None
+) -> list[dict]:
+    """Restrict which muxes to scan: --mux names, else --fast-scan, else all.
+
+    With a scan history, --fast-scan takes the muxes that carried pPIDs when
+    last scanned, and only falls back to ABERTIS_SCAN_MUXES for the ones
+    never scanned.
+    """
     if arg.only_muxes:
         wanted = set(arg.only_muxes)
         present = {mux.get("name", "") for mux in muxes}
@@ -147,7 +173,12 @@ def select_muxes_to_scan(arg: SetupArgs, muxes: list[dict]) -> list[dict]:
         return selected
 
     if arg.fast_scan:
-        selected = [mux for mux in muxes if mux.get("name", "") in ABERTIS_SCAN_MUXES]
+        known = (
+            history.productive(ABERTIS_SCAN_MUXES)
+            if history is not None
+            else ABERTIS_SCAN_MUXES
+        )
+        selected = [mux for mux in muxes if mux.get("name", "") in known]
         logger.info("Fast scan: {} known Abertis mux(es)", len(selected))
         return selected
 
@@ -155,7 +186,7 @@ def select_muxes_to_scan(arg: SetupArgs, muxes: list[dict]) -> list[dict]:
 
 
 async def wait_dvbs_tuners_idle(
-    session: aiohttp.ClientSession, arg: SetupArgs, timeout: float = 20.0
+    session: aiohttp.ClientSession, arg: ScanArgs, timeout: float = 20.0
 ) -> None:
     """Block until no DVB-S tuner has an active subscription.
 
@@ -167,12 +198,11 @@ async def wait_dvbs_tuners_idle(
     loop = asyncio.get_event_loop()
     deadline = loop.time() + timeout
     while True:
-        async with session.get(arg.get_base_url() + "/api/status/inputs") as response:
-            data = await response.json()
+        inputs = await tvh_get_inputs(session, arg.get_base_url())
 
         busy = any(
             "DVB-S" in entry.get("input", "") and entry.get("subs", 0)
-            for entry in data.get("entries", [])
+            for entry in inputs
         )
         if not busy or loop.time() >= deadline:
             if busy:
@@ -185,7 +215,7 @@ async def wait_dvbs_tuners_idle(
 async def fetch_mux_data(
     session: aiohttp.ClientSession,
     url: str,
-    arg: SetupArgs,
+    arg: ScanArgs,
     buffer: bytearray,
 ):
     async with session.get(url) as response:
@@ -203,34 +233,119 @@ async def fetch_mux_data(
             response.close()
 
 
-async def get_mux_data(
+async def capture_mux_data(
     session: aiohttp.ClientSession,
-    arg: SetupArgs,
+    arg: ScanArgs,
     url: str,
-):
+    wait_idle: bool = True,
+    seconds: float | None = None,
+) -> bytearray:
+    """Raw TS of one mux, bounded by mux_buffer_size and mux_buffer_time (or
+    seconds, when given)."""
     # Make sure the previous mux fully released its tuner before we subscribe,
     # otherwise this scan can read the previously-tuned transponder's stream.
-    await wait_dvbs_tuners_idle(session, arg)
+    if wait_idle:
+        await wait_dvbs_tuners_idle(session, arg)
 
     buffer: bytearray = bytearray()
     try:
         await asyncio.wait_for(
             fetch_mux_data(session, url, arg, buffer),
-            timeout=arg.mux_buffer_time.total_seconds(),
+            timeout=seconds or arg.mux_buffer_time.total_seconds(),
         )
-    except asyncio.TimeoutError:
+    except TimeoutError:
         pass
 
-    process = subprocess.Popen(
-        [str(arg.tsanalyze_path), "--json"],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    stdout, _ = process.communicate(input=bytes(buffer))
-    tsanlyze_output = json.loads(stdout)
+    return buffer
+
+
+def analyze_ts(arg: SetupArgs, data: bytes | Path):
+    """tsanalyze --json over a capture, either in memory or on disk."""
+    command = [str(arg.tsanalyze_path), "--json"]
+    if isinstance(data, Path):
+        # Stream the file straight into tsanalyze instead of loading it first
+        with open(data, "rb") as stdin:
+            result = subprocess.run(
+                command, stdin=stdin, capture_output=True, check=False
+            )
+    else:
+        result = subprocess.run(command, input=data, capture_output=True, check=False)
+
+    return json.loads(result.stdout)
+
+
+# The PSI phase of a scan reads this much at most, and for no longer than a
+# capture (--max-buffer-time), before taking the mux as not locked: its first
+# request waits on the subscription and the tuner lock just the same. Filtered
+# down to PSI PIDs, a locked mux then delivers its PAT and PMTs in well under a
+# second.
+_PSI_MAX_BYTES = 512 * 1024
+
+# Stream types that are audio or video, which tsanalyze never takes for a pPID.
+# Everything else a PMT lists is captured for it to classify.
+_AV_STREAM_TYPES = frozenset(
+    {0x01, 0x02, 0x03, 0x04, 0x0F, 0x10, 0x11, 0x1B, 0x24, 0x42, 0x81, 0x87}
+)
+
+
+def mux_stream_url(arg: ScanArgs, mux: dict, pids: Iterable[int]) -> str:
+    """One mux's raw stream, filtered server-side to just these PIDs."""
+    pid_list = ",".join(str(pid) for pid in sorted(set(pids)))
+    url = f"{arg.get_base_url()}/play/ticket/stream/mux/{mux['uuid']}"
+    return f"{url}?pids={pid_list}"
+
+
+async def read_psi[T](
+    session: aiohttp.ClientSession,
+    url: str,
+    parse: Callable[[bytearray], T | None],
+    timeout: float,
+) -> T | None:
+    """Read url until parse finds what it needs, within the PSI phase bounds."""
+    buffer = bytearray()
+
+    async def read() -> T | None:
+        async with session.get(url) as response:
+            try:
+                async for data in response.content.iter_chunked(1024 * 10):
+                    buffer.extend(data)
+                    if (result := parse(buffer)) is not None:
+                        return result
+                    if len(buffer) >= _PSI_MAX_BYTES:
+                        return None
+            finally:
+                # As in fetch_mux_data: let TVheadend drop the subscription now
+                response.close()
+        return None
+
+    try:
+        return await asyncio.wait_for(read(), timeout=timeout)
+    except TimeoutError:
+        return None
 
-    return tsanlyze_output
+
+def parse_pat(data: bytearray) -> tuple[int, set[int]] | None:
+    """tsid and PMT PIDs of the first PAT in data."""
+    for _, section in iter_sections(data, (PID_PAT,)):
+        if section[0] == TABLE_PAT:
+            return (section[3] << 8) | section[4], set(pat_pmt_pids(section).values())
+    return None
+
+
+def parse_pmts(data: bytearray, pmt_pids: set[int]) -> set[int] | None:
+    """Non-audio/video elementary PIDs, once every one of pmt_pids was seen."""
+    seen: set[int] = set()
+    candidates: set[int] = set()
+    for pid, section in iter_sections(data, pmt_pids):
+        if section[0] != TABLE_PMT or pid in seen:
+            continue
+        seen.add(pid)
+        candidates.update(
+            es_pid
+            for stream_type, es_pid in pmt_elementary_streams(section)
+            if stream_type not in _AV_STREAM_TYPES
+        )
+    return candidates if seen >= pmt_pids else None
 
 
 # The satellite tuner intermittently locks onto the wrong transponder (or fails
@@ -241,20 +356,40 @@ _MAX_SCAN_ATTEMPTS = 3
 
 
 async def scan_mux_verified(
-    session: aiohttp.ClientSession, arg: SetupArgs, mux: dict
+    session: aiohttp.ClientSession,
+    arg: SetupArgs,
+    mux: dict,
+    capture_seconds: float | None = None,
 ) -> dict | None:
     """Scan a mux, returning its tsanalyze output only if it tuned correctly.
 
+    PSI first: the PAT alone, filtered server-side, shows within a second
+    whether the tuner locked onto the requested transponder (verified via TS
+    id), and the PMTs then name the few PIDs that could be pPIDs. Only those
+    are captured for tsanalyze, never the full transponder, and a mis-lock
+    is retried without ever capturing.
+
     Returns None if, after _MAX_SCAN_ATTEMPTS, the tuner never locked onto the
-    requested transponder (verified via TS id) so the caller can skip it.
+    requested transponder so the caller can skip it.
     """
     mux_name = mux.get("name", "")
     expected_tsid = mux.get("tsid")
-    url = f"{arg.get_base_url()}/play/ticket/stream/mux/{mux['uuid']}"
+    psi_timeout = arg.mux_buffer_time.total_seconds()
 
     for attempt in range(1, _MAX_SCAN_ATTEMPTS + 1):
-        tsanalyzer_dict = await get_mux_data(session, arg, url)
-        actual_tsid = tsanalyzer_dict.get("ts", {}).get("id")
+        # Make sure the previous mux fully released its tuner before we
+        # subscribe, otherwise this reads the previously-tuned transponder.
+        await wait_dvbs_tuners_idle(session, arg)
+
+        pat = await read_psi(
+            session, mux_stream_url(arg, mux, [PID_PAT]), parse_pat, psi_timeout
+        )
+        pmt_pids: set[int] = set()
+        candidates: set[int] | None = None
+        if pat is not None:
+            actual_tsid, pmt_pids = pat
+        else:
+            actual_tsid = None
 
         if not actual_tsid:
             logger.warning(
@@ -263,10 +398,7 @@ async def scan_mux_verified(
                 attempt,
                 _MAX_SCAN_ATTEMPTS,
             )
-        elif not expected_tsid or actual_tsid == expected_tsid:
-            # Correct transponder (or nothing to verify against) -> accept
-            return tsanalyzer_dict
-        else:
+        elif expected_tsid and actual_tsid != expected_tsid:
             logger.warning(
                 "MUX {} scan {}/{}: tuned to wrong transponder "
                 "(got tsid {}, expected {}), retrying",
@@ -276,6 +408,38 @@ async def scan_mux_verified(
                 actual_tsid,
                 expected_tsid,
             )
+        else:
+            # Correct transponder (or nothing to verify against): learn the
+            # candidate pids from the PMTs, then capture just those
+            candidates = await read_psi(
+                session,
+                mux_stream_url(arg, mux, [PID_PAT, *pmt_pids]),
+                lambda data, pmt_pids=pmt_pids: parse_pmts(data, pmt_pids),
+                psi_timeout,
+            )
+            if candidates is None:
+                logger.warning(
+                    "MUX {} scan {}/{}: PMTs incomplete, retrying",
+                    mux_name,
+                    attempt,
+                    _MAX_SCAN_ATTEMPTS,
+                )
+
+        if candidates is not None:
+            logger.debug(
+                "MUX {} tsid {}: capturing {} candidate pid(s)",
+                mux_name,
+                actual_tsid,
+                len(candidates),
+            )
+            buffer = await capture_mux_data(
+                session,
+                arg,
+                mux_stream_url(arg, mux, [PID_PAT, *pmt_pids, *candidates]),
+                wait_idle=False,
+                seconds=capture_seconds,
+            )
+            return analyze_ts(arg, bytes(buffer))
 
         # Give the tuner a chance to retune cleanly before the next attempt
         await asyncio.sleep(2)
@@ -284,6 +448,69 @@ async def scan_mux_verified(
     return None
 
 
+def load_captures(arg: SetupArgs, muxes: list[dict]) -> dict[str, Path]:
+    """Capture file per target mux uuid, from what `abertpy capture` recorded.
+
+    Captures are matched by mux uuid, then by name: a mux re-created since the
+    capture keeps its name but not its uuid, and its capture is still valid.
+    """
+    by_uuid = {mux["uuid"]: mux for mux in muxes}
+    by_name = {mux.get("name", ""): mux for mux in muxes}
+
+    captures: dict[str, Path] = {}
+    for meta_path in sorted(arg.from_captures.glob("*.json")):
+        meta = json.loads(meta_path.read_text())
+        ts_path = meta_path.with_suffix(".ts")
+        if not ts_path.is_file():
+            logger.warning("Capture {} has no {}, ignoring", meta_path, ts_path.name)
+            continue
+
+        mux = by_uuid.get(meta.get("uuid"))
+        if mux is None:
+            mux = by_name.get(meta.get("name"))
+            if mux is None:
+                logger.warning(
+                    "Capture of {} matches no target mux, ignoring", meta.get("name")
+                )
+                continue
+            logger.warning(
+                "Capture of {} was taken from mux {}, now {}; matching by name",
+                meta.get("name"),
+                meta.get("uuid"),
+                mux["uuid"],
+            )
+
+        captures[mux["uuid"]] = ts_path
+
+    logger.info("Found {} capture(s) in {}", len(captures), arg.from_captures)
+    return captures
+
+
+def analyze_capture_verified(arg: SetupArgs, mux: dict, path: Path) -> dict | None:
+    """tsanalyze output of a recorded capture, if it holds the right transponder.
+
+    Same check as scan_mux_verified, without retries: a bad capture can only
+    be fixed by recording it again.
+    """
+    tsanalyzer_dict = analyze_ts(arg, path)
+    actual_tsid = tsanalyzer_dict.get("ts", {}).get("id")
+    expected_tsid = mux.get("tsid")
+
+    if not actual_tsid:
+        logger.error("Capture {} holds no transport stream, skipping", path)
+        return None
+    if expected_tsid and actual_tsid != expected_tsid:
+        logger.error(
+            "Capture {} is of tsid {}, but mux {} is tsid {}, skipping",
+            path,
+            actual_tsid,
+            mux.get("name", ""),
+            expected_tsid,
+        )
+        return None
+    return tsanalyzer_dict
+
+
 async def create_iptv_network(session: aiohttp.ClientSession, arg: SetupArgs) -> str:
 
     existing_uuid = await tvh_find_abertpy_network(session, arg.get_base_url())
@@ -329,63 +556,54 @@ async def create_iptv_network(session: aiohttp.ClientSession, arg: SetupArgs) ->
         return net_uuid["uuid"]
 
 
-async def tvh_find_service_uuid(
-    session: aiohttp.ClientSession,
-    arg: SetupArgs,
-    mux_uuid: str,
-    service_sid: int,
-) -> str:
-    service = await tvh_get_svc_SID(
-        session, arg.get_base_url(), service_sid, mux_uuid=mux_uuid
-    )
-    if service is None:
-        raise ValueError(
-            f"Service UUID not found for SID {service_sid} in mux {mux_uuid}"
-        )
-
-    return service["uuid"]
-
-
-async def recreate_tvh_service(
+async def plan_tvh_service(
     session: aiohttp.ClientSession,
     arg: SetupArgs,
+    snapshot: Snapshot,
+    plan: Plan,
     mux_uuid: str,
     private_pid: int,
     service_sid: int,
-) -> str:
+) -> str | None:
+    """Plan the override for one pPID, returning the service uuid it ends up as.
 
-    overrides = await tvh_find_overrides(
-        session, arg.get_base_url(), mux_uuid, private_pid
-    )
+    None when there is neither an override nor a scanned service to hijack.
+    """
+    overrides = snapshot.overrides(mux_uuid, private_pid)
 
     # Reuse an existing override, else hijack the service TVheadend scanned. Both
     # go through raw/export, which preserves the uuid on re-import, so the node we
     # read here is the node the mux ends up streaming from.
-    svc_uuid: str = (
-        overrides[0]["uuid"]
-        if overrides
-        else await tvh_find_service_uuid(session, arg, mux_uuid, service_sid)
-    )
-
-    async with session.get(
-        arg.get_base_url() + "/api/raw/export",
-        params={
-            "uuid": svc_uuid,
-        },
-    ) as response:
-        res = await response.json()
+    if overrides:
+        svc_uuid: str = overrides[0]["uuid"]
+    else:
+        original = snapshot.original_service(service_sid, mux_uuid)
+        if original is None or plan.touches("import_service", original["uuid"]):
+            # Absent, or already claimed by another pPID sharing this SID
+            logger.error(
+                "pPID {}: no service with SID {} left to hijack on mux {}, skipping",
+                private_pid,
+                service_sid,
+                mux_uuid,
+            )
+            return None
+        svc_uuid = original["uuid"]
 
-    sid_original = (res)[0]
+    sid_original = await tvh_get_svc_raw(session, arg.get_base_url(), svc_uuid)
 
     if pcr := sid_original.get("pcr", None):
         _MAP_PPID_CA[private_pid] = pcr
 
     # Avoid duplicates
     if overrides:
-        stale = [svc["uuid"] for svc in overrides[1:]]
-        if stale:
-            deleted = await tvh_delete_svcs(session, arg.get_base_url(), stale)
-            logger.info("pPID {}: reaped {} stale override(s)", private_pid, deleted)
+        for svc in overrides[1:]:
+            plan.add(
+                Change(
+                    "delete_service",
+                    f"pPID {private_pid} stale override {svc['uuid']}",
+                    svc["uuid"],
+                )
+            )
 
         # tsanalyze just confirmed this pPID is live in the current broadcast,
         # so a disabled override here is stale state (TVheadend disables a
@@ -393,72 +611,54 @@ async def recreate_tvh_service(
         # leave the channel dead until someone notices and fixes it by hand.
         if not sid_original.get("enabled"):
             sid_original["enabled"] = True
-            async with session.post(
-                arg.get_base_url() + "/api/raw/import",
-                data={"node": json.dumps(sid_original)},
-            ):
-                pass
-            logger.info("pPID {}: re-enabled disabled override", private_pid)
+            plan.add(
+                Change(
+                    "import_service",
+                    f"pPID {private_pid} re-enable override {svc_uuid}",
+                    svc_uuid,
+                    node=sid_original,
+                )
+            )
 
         return svc_uuid
 
     patch_original_SID_svc(sid_original, private_pid, str(service_sid))
-
-    async with session.post(
-        arg.get_base_url() + "/api/raw/import",
-        data={
-            "node": json.dumps(sid_original),
-        },
-    ):
-        pass
+    plan.add(
+        Change(
+            "import_service",
+            f"pPID {private_pid} hijack SID {service_sid} service {svc_uuid}",
+            svc_uuid,
+            node=sid_original,
+        )
+    )
 
     return svc_uuid
 
 
-async def recreate_tvh_iptv_mux(
-    session: aiohttp.ClientSession,
-    arg: SetupArgs,
+def plan_iptv_mux(
+    snapshot: Snapshot,
+    plan: Plan,
     iptv_network_uuid: str,
-    svc_mux_uuid: str,
-    private_pid: int,
-    mux_freq: str,
-):
-
-    target_muxname = f"{_HARDCODED_KEY}: MUX {mux_freq} pPID {private_pid}"
-    iptv_url = arg.get_iptv_pipe(
-        svc_mux_uuid=svc_mux_uuid, allowed_pid=private_pid, dvb_mux_name=mux_freq
-    )
-
-    muxes = await tvh_get_muxes(session, arg.get_base_url())
-
+    target_muxname: str,
+    iptv_url: str,
+    epg: bool = True,
+    priority: int | None = None,
+) -> None:
+    """Plan creating the named IPTV mux, or fixing its url, EPG flag and
+    priority. A priority of None leaves the mux's own alone."""
     # Match the exact mux name. A loose substring check (e.g. "303" in the name)
     # would treat pPID 303 as already present when an unrelated mux exists for
     # pPID 2303 (or the same pPID on another transponder), skipping creation.
-    for mux in muxes.get("entries", []):
-        if (
-            mux.get("network_uuid", None) == iptv_network_uuid
-            and mux.get("iptv_muxname", "") == target_muxname
-        ):
-            # The mux outlives the service it names, so an existing one can still
-            # point at a service that has since been replaced or reaped, leaving
-            # it streaming from a disabled or dangling uuid.
-            if mux.get("iptv_url", "") != iptv_url:
-                await tvh_set_mux_iptv_url(
-                    session, arg.get_base_url(), mux["uuid"], iptv_url
-                )
-                logger.info(
-                    "pPID {}: repointed mux to service {}", private_pid, svc_mux_uuid
-                )
-            return
-
-    async with session.post(
-        arg.get_base_url() + "/api/mpegts/network/mux_create",
-        data={
-            "uuid": iptv_network_uuid,
-            "conf": json.dumps(
-                {
+    mux = snapshot.iptv_mux(iptv_network_uuid, target_muxname)
+    if mux is None:
+        plan.add(
+            Change(
+                "create_mux",
+                target_muxname,
+                iptv_network_uuid,
+                node={
                     "enabled": 1,
-                    "epg": 1,
+                    "epg": int(epg),
                     "epg_module_id": "",
                     "iptv_url": iptv_url,
                     "use_libav": 0,
@@ -466,11 +666,191 @@ async def recreate_tvh_iptv_mux(
                     "iptv_muxname": target_muxname,
                     "channel_number": "0",
                     "iptv_sname": "",
-                }
-            ),
-        },
-    ):
-        pass
+                    **_priority_node(priority),
+                },
+                iptv_url=iptv_url,
+            )
+        )
+
+    # The mux outlives the service it names, so an existing one can still
+    # point at a service that has since been replaced or reaped, leaving
+    # it streaming from a disabled or dangling uuid.
+    else:
+        if mux.get("iptv_url", "") != iptv_url:
+            plan.add(
+                Change("set_iptv_url", target_muxname, mux["uuid"], iptv_url=iptv_url)
+            )
+        if bool(mux.get("epg", 1)) != epg:
+            plan.add(
+                Change(
+                    "set_epg",
+                    f"{target_muxname} epg={int(epg)}",
+                    mux["uuid"],
+                    node={"epg": int(epg)},
+                )
+            )
+        if priority is not None and (
+            mux.get("priority", 0) != priority or mux.get("spriority", 0) != priority
+        ):
+            plan.add(
+                Change(
+                    "set_priority",
+                    f"{target_muxname} priority={priority}",
+                    mux["uuid"],
+                    node=_priority_node(priority),
+                )
+            )
+
+
+def _priority_node(priority: int | None) -> dict:
+    if priority is None:
+        return {}
+    return {"priority": priority, "spriority": priority}
+
+
+def plan_tvh_iptv_mux(
+    arg: SetupArgs,
+    snapshot: Snapshot,
+    plan: Plan,
+    iptv_network_uuid: str,
+    svc_mux_uuid: str,
+    private_pid: int,
+    mux_freq: str,
+    epg: bool,
+    priority: int | None = None,
+):
+    target_muxname = iptv_muxname(mux_freq, private_pid)
+    iptv_url = arg.get_iptv_pipe(
+        svc_mux_uuid=svc_mux_uuid, allowed_pid=private_pid, dvb_mux_name=mux_freq
+    )
+
+    plan_iptv_mux(
+        snapshot, plan, iptv_network_uuid, target_muxname, iptv_url, epg, priority
+    )
+
+
+def plan_repointed_iptv_mux(
+    snapshot: Snapshot,
+    plan: Plan,
+    iptv_network_uuid: str,
+    mux_freq: str,
+    private_pid: int,
+    svc_mux_uuid: str,
+) -> None:
+    """Point a pPID's existing IPTV mux at svc_mux_uuid, keeping the rest of
+    its pipe command as the setup that wrote it left it."""
+    target_muxname = iptv_muxname(mux_freq, private_pid)
+    mux = snapshot.iptv_mux(iptv_network_uuid, target_muxname)
+    if mux is None:
+        # Or an MPTS mux carries it, which names no service to repoint
+        logger.debug("No IPTV mux {} to repoint", target_muxname)
+        return
+
+    iptv_url: str = mux.get("iptv_url", "")
+    if svc_mux_uuid in iptv_url:
+        return
+    target = re.search(r"[a-fA-F0-9]{32}", iptv_url)
+    if target is None:
+        logger.warning(
+            "{}: no service uuid in its url to repoint; run setup again",
+            target_muxname,
+        )
+        return
+    plan.add(
+        Change(
+            "set_iptv_url",
+            target_muxname,
+            mux["uuid"],
+            iptv_url=iptv_url.replace(target.group(0), svc_mux_uuid),
+        )
+    )
+
+
+# IPTV mux priorities by how much a pPID is watched, top share first. A pPID
+# in the usage store that nobody watched gets 0, which defers to the network's
+# own priority of 1; one the store knows nothing of is left alone.
+_WATCHED_PRIORITIES = ((0.25, 4), (0.5, 3), (1.0, 2))
+
+
+def usage_priorities(
+    usage: dict[tuple[str, int], PpidUsage],
+) -> dict[tuple[str, int], int]:
+    """(transponder, pPID) -> IPTV mux priority, by rank of watched time, for
+    the pPIDs the usage store has an entry for."""
+    watched = sorted(
+        (key for key, entry in usage.items() if entry.watched_seconds > 0),
+        key=lambda key: usage[key].watched_seconds,
+        reverse=True,
+    )
+    priorities = dict.fromkeys(usage, 0)
+    for rank, key in enumerate(watched):
+        share = (rank + 1) / len(watched)
+        priorities[key] = next(p for limit, p in _WATCHED_PRIORITIES if share <= limit)
+    return priorities
+
+
+# A scan captures until the slowest pPID received on its mux could deliver
+# this much, rather than a fixed --max-buffer-time: low-bitrate pPIDs get
+# the time they need to show up, and a mux of fast ones frees the tuner early.
+_SCAN_PPID_BYTES = 256 * 1024
+_MIN_SCAN_SECONDS = 3.0
+_MAX_SCAN_FACTOR = 3
+
+
+def scan_capture_seconds(
+    arg: ScanArgs, usage: dict[tuple[str, int], PpidUsage], mux_freq: str
+) -> float:
+    default = arg.mux_buffer_time.total_seconds()
+    rates = [
+        entry.bitrate_bps
+        for (dvb_mux, _), entry in usage.items()
+        if dvb_mux == mux_freq and entry.bitrate_bps
+    ]
+    if not rates:
+        return default
+
+    needed = _SCAN_PPID_BYTES * 8 / min(rates)
+    return min(max(needed, _MIN_SCAN_SECONDS), _MAX_SCAN_FACTOR * default)
+
+
+def iptv_muxname(mux_freq: str, private_pid: int) -> str:
+    return f"{_HARDCODED_KEY}: MUX {mux_freq} pPID {private_pid}"
+
+
+def plan_epg_ppid(
+    snapshot: Snapshot, iptv_network_uuid: str, mux_freq: str, private_pids: list[int]
+) -> int:
+    """The one pPID mux of a transponder TVheadend should grab EPG from.
+
+    Every pPID mux of a transponder carries the same EIT, yet each one the EPG
+    grabber opens spawns a proxy and takes a tuner. So only one keeps epg on:
+    whichever already has it, to leave a working install alone, else the
+    lowest pPID.
+    """
+    for private_pid in sorted(private_pids):
+        mux = snapshot.iptv_mux(iptv_network_uuid, iptv_muxname(mux_freq, private_pid))
+        if mux is not None and mux.get("epg", 1):
+            return private_pid
+    return min(private_pids)
+
+
+def plan_tvh_mpts_mux(
+    arg: SetupArgs,
+    snapshot: Snapshot,
+    plan: Plan,
+    iptv_network_uuid: str,
+    dvb_mux_uuid: str,
+    private_pids: list[int],
+    mux_freq: str,
+):
+    """The one IPTV mux carrying every pPID of a transponder, for --layout transponder."""
+
+    target_muxname = f"{_HARDCODED_KEY}: MPTS {mux_freq}"
+    iptv_url = arg.get_mpts_pipe(
+        dvb_mux_uuid=dvb_mux_uuid, allowed_pids=private_pids, dvb_mux_name=mux_freq
+    )
+
+    plan_iptv_mux(snapshot, plan, iptv_network_uuid, target_muxname, iptv_url)
 
 
 ######################################
@@ -479,42 +859,359 @@ async def recreate_tvh_iptv_mux(
 ######################################
 
 
-async def setup_async(arg: SetupArgs):
+# pPIDs of one mux planned at once. Each needs its service exported, so against
+# a remote TVheadend the mux's API phase shrinks by about this factor, while
+# TVheadend itself is never asked for more than this in parallel.
+_PPID_CONCURRENCY = 4
+
+
+async def plan_ppid(
+    session: aiohttp.ClientSession,
+    arg: SetupArgs,
+    snapshot: Snapshot,
+    plan: Plan,
+    iptv_network_uuid: str,
+    mux_uuid: str,
+    mux_freq: str,
+    private_pid: int,
+    service_sid: int,
+) -> tuple[str, str] | None:
+    """Plan the override of one pPID found on a mux.
+
+    Returns the name of the transponder the override actually lives on and
+    the override's uuid, or None if the pPID could not be planned.
+    """
+    svc_mux_uuid = await plan_tvh_service(
+        session,
+        arg,
+        snapshot,
+        plan,
+        mux_uuid,
+        private_pid=private_pid,
+        service_sid=service_sid,
+    )
+    if svc_mux_uuid is None:
+        return None
+
+    # Name the mux after the transponder the service actually sits
+    # on, never the one we meant to tune. The two only diverge when
+    # something went wrong -- a mis-locked tuner, or an override that
+    # has since moved to where its SID really lives -- and taking the
+    # intended name would bake that mistake into the label forever,
+    # leaving a mux that streams one transponder while claiming
+    # another. proxy resolves the same name from the service too, so
+    # both agree on where a mux belongs.
+    svc_mux_freq = (snapshot.service(svc_mux_uuid) or {}).get("multiplex") or mux_freq
+    if svc_mux_freq != mux_freq:
+        logger.warning(
+            "pPID {} was scanned on {} but its service lives on {}; "
+            "naming the mux after {}",
+            private_pid,
+            mux_freq,
+            svc_mux_freq,
+            svc_mux_freq,
+        )
+
+    return svc_mux_freq, svc_mux_uuid
+
+
+async def plan_mux_ppids(
+    session: aiohttp.ClientSession,
+    arg: SetupArgs,
+    snapshot: Snapshot,
+    plan: Plan,
+    iptv_network_uuid: str,
+    mux_uuid: str,
+    mux_freq: str,
+    ppid_sids: dict[int, int],
+) -> dict[int, tuple[str, str]]:
+    """plan_ppid for every pPID of a mux, _PPID_CONCURRENCY at a time.
+
+    pPIDs sharing a SID stay sequential in pPID order: the first one claims
+    the scanned service, and the next must see that claim.
+    """
+    semaphore = asyncio.Semaphore(_PPID_CONCURRENCY)
+
+    by_sid: dict[int, list[int]] = defaultdict(list)
+    for private_pid, service_sid in sorted(ppid_sids.items()):
+        by_sid[service_sid].append(private_pid)
+
+    async def plan_sid(service_sid: int, private_pids: list[int]):
+        names: dict[int, tuple[str, str]] = {}
+        for private_pid in private_pids:
+            async with semaphore:
+                name = await plan_ppid(
+                    session,
+                    arg,
+                    snapshot,
+                    plan,
+                    iptv_network_uuid,
+                    mux_uuid,
+                    mux_freq,
+                    private_pid,
+                    service_sid,
+                )
+            if name is not None:
+                names[private_pid] = name
+        return names
+
+    svc_mux_freqs: dict[int, tuple[str, str]] = {}
+    for names in await asyncio.gather(
+        *(plan_sid(sid, pids) for sid, pids in by_sid.items())
+    ):
+        svc_mux_freqs.update(names)
+    return svc_mux_freqs
+
+
+# The IPTV muxes setup installs, by the transponder each one needs a tuner on
+_IPTV_MUXNAME_RE = re.compile(rf"^{_HARDCODED_KEY}: (?:MUX (\S+) pPID \d+|MPTS (\S+))$")
+
+
+async def count_dvbs_tuners(session: aiohttp.ClientSession, arg: SetupArgs) -> int:
+    """Satellite tuners of this server and every --backend, as --tuners."""
+    if arg.tuners is not None:
+        return arg.tuners
+
+    base_urls = [arg.get_base_url()] + [
+        str(url).removesuffix(url.path or "/") for url in arg.backends
+    ]
+    total = 0
+    for base_url in base_urls:
+        inputs = await tvh_get_inputs(session, base_url)
+        total += sum("DVB-S" in entry.get("input", "") for entry in inputs)
+    return total
+
+
+def iptv_stream_limit(muxnames: Iterable[str], tuners: int) -> int:
+    """Most of these IPTV muxes that tuners could stream at once.
+
+    A tuner carries every pipe of the transponder it is on, so that is the
+    pipe count of the tuners-many transponders with the most pipes: exact for
+    --layout transponder, the tightest bound TVheadend can enforce for ppid.
+    """
+    pipes: Counter[str] = Counter()
+    for muxname in muxnames:
+        if match := _IPTV_MUXNAME_RE.match(muxname):
+            pipes[match[1] or match[2]] += 1
+    return sum(count for _, count in pipes.most_common(tuners))
+
+
+async def plan_stream_limit(
+    session: aiohttp.ClientSession,
+    arg: SetupArgs,
+    snapshot: Snapshot,
+    plan: Plan,
+    iptv_network_uuid: str,
+) -> None:
+    """Plan the IPTV network's max_streams from the tuners there really are."""
+    try:
+        tuners = await count_dvbs_tuners(session, arg)
+    except aiohttp.ClientError as e:
+        logger.warning("Cannot count satellite tuners ({}); stream limit left as is", e)
+        return
+    if not tuners and arg.tuners is None:
+        logger.warning("No DVB-S tuner found; stream limit left as is")
+        return
+
+    # The network's muxes once the plan is applied
+    muxnames = [
+        mux.get("iptv_muxname", "")
+        for mux in snapshot.muxes
+        if mux.get("network_uuid", None) == iptv_network_uuid
+        and mux.get("enabled", True)
+    ] + [change.label for change in plan.changes if change.kind == "create_mux"]
+    limit = iptv_stream_limit(muxnames, tuners) if tuners else 0
+
+    network = (
+        await tvh_load_node(session, arg.get_base_url(), iptv_network_uuid)
+        if iptv_network_uuid
+        else None
+    )
+    if network is not None and network.get("max_streams", 0) == limit:
+        return
+    plan.add(
+        Change(
+            "set_max_streams",
+            f"IPTV network max_streams={limit} ({tuners} tuner(s))",
+            iptv_network_uuid,
+            node={"max_streams": limit},
+        )
+    )
+
+
+async def check_backend_pool(
+    session: aiohttp.ClientSession,
+    arg: SetupArgs,
+    transponder_ppids: dict[str, dict[int, str]],
+) -> None:
+    """Warn about the pPIDs a --backend has no override for.
+
+    The proxy resolves its pPID on every backend by transponder and pPID, the
+    way it recovers a stale uuid. A backend missing one is left out of that
+    proxy's pool, so the channel cannot fail over to it.
+    """
+    for url in arg.backends:
+        base_url = str(url).removesuffix(url.path or "/")
+        try:
+            services = await tvh_get_svc_grid(session, base_url)
+        except aiohttp.ClientError as e:
+            logger.warning("Backend {} cannot be checked: {}", url.host, e)
+            continue
+
+        available = {
+            (svc.get("multiplex", ""), extract_ppid_from_svcname(svc["svcname"]))
+            for svc in services
+            if svc.get("enabled") and is_abertpy_svc(svc)
+        }
+        missing = [
+            f"{mux_freq}/{private_pid}"
+            for mux_freq, private_pids in sorted(transponder_ppids.items())
+            for private_pid in sorted(private_pids)
+            if (mux_freq, private_pid) not in available
+        ]
+        if missing:
+            logger.warning(
+                "Backend {} has no override for {} pPID(s): {}. Run setup "
+                "against it too, or those channels cannot fail over to it",
+                url.host,
+                len(missing),
+                ", ".join(missing),
+            )
+        else:
+            logger.info("Backend {} can stream every pPID", url.host)
+
+
+async def setup_async(
+    arg: SetupArgs, session: aiohttp.ClientSession | None = None, rescan: bool = False
+):
+    """Scan and reconcile; reuses `session` (left open) when a caller has one.
+
+    A caller's session must send the curl User-Agent and raise for status
+    like the one opened here does.
+
+    A rescan, run by a proxy whose override went missing, only reconciles the
+    overrides of what it scans and repoints the pPID muxes already there. It
+    knows nothing of the options the last full setup ran with, which those
+    muxes' pipe commands carry, and leaves the IPTV network, the default
+    transponders, the stream limit and any interrupted setup's journal to the
+    next full setup.
+    """
     failed_muxes: list[str] = []
 
     async with (
-        aiohttp.ClientSession(
+        contextlib.nullcontext(session)
+        if session is not None
+        else aiohttp.ClientSession(
             raise_for_status=True,
             headers={
                 "User-Agent": "curl/aiohttp"
             },  # https://docs.tvheadend.org/documentation/development/json-api/other-functions#play
-        ) as session
-    ):
-        # First thing, create a IPTV Network if not existing
-        abertis_net_uuid = await create_iptv_network(session, arg)
+        )
+    ) as tvh_session:
+        if arg.plan or rescan:
+            # A dry run writes nothing, so a network that does not exist yet
+            # simply has every mux to create. A rescan only repoints the muxes
+            # a full setup created, leaving the network and its transponders
+            # as they are.
+            abertis_net_uuid = (
+                await tvh_find_abertpy_network(tvh_session, arg.get_base_url()) or ""
+            )
+        else:
+            # First thing, create a IPTV Network if not existing
+            abertis_net_uuid = await create_iptv_network(tvh_session, arg)
 
-        # Ensure the default Abertis transponders exist to scan against
-        await create_default_abertis_muxes(session, arg)
+            # Ensure the default Abertis transponders exist to scan against
+            await create_default_abertis_muxes(tvh_session, arg)
 
         # Get enabled muxes from tvheadend, restricted by --mux / --fast-scan
-        list_muxes = await get_muxes(session, arg)
-        list_muxes = select_muxes_to_scan(arg, list_muxes)
+        target_muxes = await get_muxes(tvh_session, arg)
+
+        # --from-captures: analyse what `abertpy capture` recorded instead of
+        # tuning; only the muxes that were captured are candidates
+        captures: dict[str, Path] = {}
+        history: ScanHistory | None = None
+        usage = load_usage(arg.usage_db.expanduser(), arg.usage_days)
+        if usage:
+            logger.info(
+                "Usage store: {} pPID(s) received in the last {} days",
+                len(usage),
+                arg.usage_days,
+            )
+        # What a mux never scanned before is assumed to cost
+        default_scan_seconds = 2 * arg.mux_buffer_time.total_seconds()
+        if arg.from_captures:
+            captures = load_captures(arg, target_muxes)
+            list_muxes = select_muxes_to_scan(
+                arg, [mux for mux in target_muxes if mux["uuid"] in captures]
+            )
+        else:
+            # Live scans are what costs tuner time, so only they are scheduled
+            history = ScanHistory(arg.scan_history.expanduser(), arg.network_uuid or "")
+            list_muxes = select_muxes_to_scan(arg, target_muxes, history)
+            if not arg.only_muxes:
+                list_muxes = history.order(
+                    list_muxes, ABERTIS_SCAN_MUXES, default_scan_seconds
+                )
 
-        map_dataPID_SID: dict[int, int] = {}
+        # mux -> (pPID -> SID of every private data pid tsanalyze found)
+        scanned: list[tuple[dict, dict[int, int]]] = []
+
+        journal = (
+            None
+            if rescan
+            else SetupJournal(
+                arg.journal.expanduser(),
+                arg.network_uuid or "",
+                str(arg.from_captures or "live"),
+            )
+        )
+        if journal is not None and arg.resume:
+            journal.load()
+            resumed = [mux for mux in target_muxes if mux["uuid"] in journal.scanned]
+            scanned = [(mux, journal.scanned[mux["uuid"]][1]) for mux in resumed]
+            list_muxes = [
+                mux for mux in list_muxes if mux["uuid"] not in journal.scanned
+            ]
+            if resumed:
+                logger.info(
+                    "Resuming: {} mux(es) already scanned: {}",
+                    len(resumed),
+                    ", ".join(mux.get("name", "") for mux in resumed),
+                )
+
+        scans_started = time.monotonic()
+        deferred_muxes: list[str] = []
 
         for mux in list_muxes:
             mux_uuid = mux["uuid"]
             mux_freq: str = mux.get("name", "")
 
-            logger.debug(f"Scanning mux: {mux_uuid} - {mux_freq}")
-            tsanalyzer_dict = await scan_mux_verified(session, arg, mux)
+            if history is not None and arg.time_budget is not None:
+                spent = time.monotonic() - scans_started
+                expected = history.expected_seconds(mux_freq, default_scan_seconds)
+                if spent + expected > arg.time_budget.total_seconds():
+                    deferred_muxes.append(mux_freq)
+                    continue
+
+            scan_started = time.monotonic()
+            if arg.from_captures:
+                logger.debug(f"Analyzing capture of mux: {mux_uuid} - {mux_freq}")
+                tsanalyzer_dict = analyze_capture_verified(arg, mux, captures[mux_uuid])
+            else:
+                logger.debug(f"Scanning mux: {mux_uuid} - {mux_freq}")
+                tsanalyzer_dict = await scan_mux_verified(
+                    tvh_session, arg, mux, scan_capture_seconds(arg, usage, mux_freq)
+                )
             if tsanalyzer_dict is None:
                 # Tuner never locked onto this mux reliably; skip it rather than
                 # create overrides from another transponder's stream.
                 failed_muxes.append(mux_freq)
+                if history is not None:
+                    history.record(mux_freq, None, time.monotonic() - scan_started)
+                    history.save()
                 continue
 
-            found_p_pid = []
+            found_p_pid: dict[int, int] = {}
 
             for pid in tsanalyzer_dict.get("pids", []):
                 # Skip PMT
@@ -540,59 +1237,129 @@ async def setup_async(arg: SetupArgs):
                 logger.debug(f"PID: {pid}")
 
                 # Associate Private data PID to SID
-                abertis_data_pid = pid["id"]
-                service_sid = pid["services"][0]
+                found_p_pid[pid["id"]] = pid["services"][0]
 
-                found_p_pid.append(abertis_data_pid)
+            logger.info(
+                "MUX {} private pids: {}",
+                mux_freq,
+                ",".join(str(_) for _ in sorted(found_p_pid)),
+            )
+            scanned.append((mux, found_p_pid))
+            if journal is not None:
+                journal.record(mux, found_p_pid)
+            if history is not None:
+                history.record(mux_freq, found_p_pid, time.monotonic() - scan_started)
+                history.save()
+
+        if deferred_muxes:
+            logger.info(
+                "Time budget of {} spent: deferred {} mux(es) to a later run: {}",
+                arg.time_budget,
+                len(deferred_muxes),
+                ", ".join(deferred_muxes),
+            )
 
-                svc_mux_uuid = await recreate_tvh_service(
-                    session,
-                    arg,
-                    mux_uuid,
-                    private_pid=abertis_data_pid,
-                    service_sid=service_sid,
-                )
+        # Scans done: plan every change against one fresh read of TVheadend
+        snapshot = await Snapshot.fetch(tvh_session, arg.get_base_url())
+        plan = Plan()
 
-                # Name the mux after the transponder the service actually sits
-                # on, never the one we meant to tune. The two only diverge when
-                # something went wrong -- a mis-locked tuner, or an override that
-                # has since moved to where its SID really lives -- and taking the
-                # intended name would bake that mistake into the label forever,
-                # leaving a mux that streams one transponder while claiming
-                # another. proxy resolves the same name from the service too, so
-                # both agree on where a mux belongs.
-                svc_mux_freq = (
-                    await tvh_svc_mux_name(
-                        session, arg.get_base_url(), svc_mux_uuid, abertis_data_pid
+        map_dataPID_SID: dict[int, int] = {}
+
+        # pPID -> override uuid per transponder the override lives on: one
+        # IPTV mux each (--layout ppid), or one MPTS mux per transponder
+        transponder_ppids: dict[str, dict[int, str]] = defaultdict(dict)
+        dvb_uuid_by_name: dict[str, str] = {
+            mux.get("name", ""): mux["uuid"] for mux in target_muxes
+        }
+
+        for mux, found_p_pid in scanned:
+            svc_mux_freqs = await plan_mux_ppids(
+                tvh_session,
+                arg,
+                snapshot,
+                plan,
+                abertis_net_uuid,
+                mux["uuid"],
+                mux.get("name", ""),
+                found_p_pid,
+            )
+
+            # Merged back in pPID order, whatever order the API calls finished in
+            for abertis_data_pid, (svc_mux_freq, svc_mux_uuid) in sorted(
+                svc_mux_freqs.items()
+            ):
+                transponder_ppids[svc_mux_freq][abertis_data_pid] = svc_mux_uuid
+                map_dataPID_SID[abertis_data_pid] = found_p_pid[abertis_data_pid]
+
+        # Only pPIDs with usage to go by get a priority; the others keep theirs
+        priorities = usage_priorities(usage)
+
+        for mux_freq, private_pids in sorted(transponder_ppids.items()):
+            if rescan:
+                for private_pid, svc_mux_uuid in sorted(private_pids.items()):
+                    plan_repointed_iptv_mux(
+                        snapshot,
+                        plan,
+                        abertis_net_uuid,
+                        mux_freq,
+                        private_pid,
+                        svc_mux_uuid,
                     )
-                    or mux_freq
+                continue
+
+            if arg.layout != "transponder":
+                epg_ppid = plan_epg_ppid(
+                    snapshot, abertis_net_uuid, mux_freq, list(private_pids)
                 )
-                if svc_mux_freq != mux_freq:
-                    logger.warning(
-                        "pPID {} was scanned on {} but its service lives on {}; "
-                        "naming the mux after {}",
-                        abertis_data_pid,
-                        mux_freq,
-                        svc_mux_freq,
-                        svc_mux_freq,
+                for private_pid, svc_mux_uuid in sorted(private_pids.items()):
+                    plan_tvh_iptv_mux(
+                        arg,
+                        snapshot,
+                        plan,
+                        iptv_network_uuid=abertis_net_uuid,
+                        svc_mux_uuid=svc_mux_uuid,
+                        private_pid=private_pid,
+                        mux_freq=mux_freq,
+                        epg=private_pid == epg_ppid,
+                        priority=priorities.get((mux_freq, private_pid)),
                     )
+                continue
 
-                await recreate_tvh_iptv_mux(
-                    session,
-                    arg,
-                    iptv_network_uuid=abertis_net_uuid,
-                    svc_mux_uuid=svc_mux_uuid,
-                    private_pid=abertis_data_pid,
-                    mux_freq=svc_mux_freq,
+            dvb_mux_uuid = dvb_uuid_by_name.get(mux_freq)
+            if dvb_mux_uuid is None:
+                logger.warning(
+                    "pPIDs {} live on {}, which is not a target mux of this "
+                    "network; no MPTS mux for them",
+                    ",".join(str(pid) for pid in sorted(private_pids)),
+                    mux_freq,
                 )
+                continue
 
-                map_dataPID_SID[abertis_data_pid] = service_sid
+            plan_tvh_mpts_mux(
+                arg,
+                snapshot,
+                plan,
+                iptv_network_uuid=abertis_net_uuid,
+                dvb_mux_uuid=dvb_mux_uuid,
+                private_pids=sorted(private_pids),
+                mux_freq=mux_freq,
+            )
 
-            logger.info(
-                "MUX {} private pids: {}",
-                mux_freq,
-                ",".join(str(_) for _ in sorted(found_p_pid)),
+        if not rescan:
+            await plan_stream_limit(tvh_session, arg, snapshot, plan, abertis_net_uuid)
+
+        plan.show()
+        if arg.plan:
+            logger.warning(
+                "Plan only: nothing changed. Re-run without --plan to apply."
             )
+        else:
+            await plan.apply(tvh_session, arg.get_base_url())
+            if journal is not None:
+                journal.clear()
+
+        if not rescan and arg.backends and arg.layout != "transponder":
+            await check_backend_pool(tvh_session, arg, transponder_ppids)
 
     for p_pid, pid_ca in sorted(_MAP_PPID_CA.items()):
         logger.info(
@@ -601,6 +1368,8 @@ async def setup_async(arg: SetupArgs):
 
     if failed_muxes:
         retry = " ".join(f"--mux {name}" for name in failed_muxes)
+        if arg.from_captures:
+            retry = f"abertpy capture -o {arg.from_captures} {retry}"
         logger.warning(
             "{} mux(es) could not be scanned reliably: {}. Retry only these with: {}",
             len(failed_muxes),
@@ -612,4 +1381,15 @@ async def setup_async(arg: SetupArgs):
 def setup(arg: SetupArgs):
     logger.info("Setup arguments:\n{}", arg.model_dump_json(indent=2))
 
-    return asyncio.run(setup_async(arg))
+    try:
+        return asyncio.run(setup_async(arg))
+    except (KeyboardInterrupt, aiohttp.ClientError) as e:
+        journal = arg.journal.expanduser()
+        if journal.exists():
+            logger.warning(
+                "Setup interrupted ({}). Re-run with --resume to skip the muxes "
+                "already scanned, as recorded in {}",
+                type(e).__name__,
+                journal,
+            )
+        raise
@@ -0,0 +1,391 @@
+"""Warm standbys of sibling pPIDs, handed over to the proxy that zaps to one.
+
+TVheadend serves every subscription on a transponder from the one tuner, so a
+playing proxy can keep a few siblings of its pPID streaming at no tuner cost:
+the last one watched on that transponder and the most watched ones, going by
+the usage store. Each standby keeps a rolling buffer of its last couple of
+seconds and listens on an abstract Unix socket named after its transponder and
+pPID. Such a socket has no permissions, so both ends check that the other runs
+as the same user: the upstream handed over is authenticated to TVheadend, and
+a zapping proxy must not play whatever some other user's socket feeds it.
+
+A proxy started for one of those pPIDs connects there before resolving
+anything. It is sent the buffer and, over SCM_RIGHTS, the standby's upstream
+socket itself, so it goes on reading the very same TVheadend subscription:
+no resolution, no connect and no tuning, and a buffer that already holds a
+keyframe. Should the handover fail, the proxy starts the long way as usual.
+"""
+
+import asyncio
+import base64
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+import urllib.parse
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+import aiohttp
+from loguru import logger
+
+from abertpy.helpers import (
+    extract_ppid_from_svcname,
+    is_abertpy_svc,
+    tvh_get_svc_grid,
+)
+from abertpy.ts import FRAME_SIZE
+from abertpy.usage import PpidUsage, load_usage
+
+# How long a new proxy runs on its own before warming siblings, so that its
+# own zap does not compete with theirs
+_WARM_DELAY_S = 5.0
+
+# How much of each standby is handed over: enough for a keyframe and the PSI
+# in front of it, little enough that the viewer does not start far behind live
+_BUFFER_S = 2.0
+
+# How many days of usage decide which siblings are worth a standby
+_USAGE_DAYS = 30
+
+# A standby whose upstream stays silent this long is reopened
+_SILENCE_S = 10.0
+_REOPEN_S = 5.0
+_CONNECT_TIMEOUT_S = 5.0
+
+# How long a zapping proxy waits on a standby before starting the long way
+_ATTACH_TIMEOUT_S = 1.0
+
+# Sent with the upstream socket: how many buffered bytes follow
+_HEADER = struct.Struct("!Q")
+
+# struct ucred, as SO_PEERCRED returns it
+_PEERCRED = struct.Struct("3i")
+
+
+def _address(dvb_mux: str, ppid: int) -> str:
+    # Abstract namespace: nothing on disk to go stale when a proxy is killed
+    return f"\0abertpy-standby-{dvb_mux}-{ppid}"
+
+
+def _same_user(conn: socket.socket) -> bool:
+    """Whether the other end of conn runs as the user we run as."""
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _PEERCRED.size)
+    _, uid, _ = _PEERCRED.unpack(creds)
+    return uid == os.getuid()
+
+
+@dataclass
+class Standby:
+    """A sibling's warm stream, taken over: its upstream and what it buffered."""
+
+    sock: socket.socket
+    buffered: bytes
+
+
+def _recv_exactly(sock: socket.socket, nbytes: int) -> bytes:
+    data = bytearray()
+    while len(data) < nbytes:
+        chunk = sock.recv(nbytes - len(data))
+        if not chunk:
+            raise ConnectionError("standby closed mid-handover")
+        data += chunk
+    return bytes(data)
+
+
+def attach_standby(dvb_mux: str, ppid: int) -> Standby | None:
+    """Take over the warm stream some sibling's proxy keeps of this pPID."""
+    upstream: socket.socket | None = None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(_ATTACH_TIMEOUT_S)
+            conn.connect(_address(dvb_mux, ppid))
+            if not _same_user(conn):
+                logger.warning(
+                    "Standby socket of pPID {} on {} belongs to another user; ignored",
+                    ppid,
+                    dvb_mux,
+                )
+                return None
+            header, fds, _, _ = socket.recv_fds(conn, _HEADER.size, 1)
+            if not fds:
+                raise ConnectionError("no upstream in the handover")
+            upstream = socket.socket(fileno=fds[0])
+            header += _recv_exactly(conn, _HEADER.size - len(header))
+            (length,) = _HEADER.unpack(header)
+            buffered = _recv_exactly(conn, length)
+    except OSError as e:
+        if upstream is not None:
+            upstream.close()
+        if not isinstance(e, (FileNotFoundError, ConnectionRefusedError)):
+            logger.warning("Standby of pPID {} not taken over: {}", ppid, e)
+        return None
+
+    logger.info(
+        "Took over the standby of pPID {} on {} with {} bytes buffered",
+        ppid,
+        dvb_mux,
+        len(buffered),
+    )
+    return Standby(sock=upstream, buffered=buffered)
+
+
+def pick_siblings(
+    usage: dict[tuple[str, int], PpidUsage], dvb_mux: str, ppid: int, count: int
+) -> list[int]:
+    """The siblings of ppid most worth a standby: the one watched last, which
+    is usually where the viewer zapped from, then the most watched."""
+    siblings = {
+        other: entry
+        for (mux, other), entry in usage.items()
+        if mux == dvb_mux and other != ppid
+    }
+    if not siblings or count <= 0:
+        return []
+
+    last = max(siblings, key=lambda other: siblings[other].last_watched)
+    rest = sorted(
+        (other for other in siblings if other != last),
+        key=lambda other: (siblings[other].sessions, siblings[other].watched_seconds),
+        reverse=True,
+    )
+    return [last, *rest][:count]
+
+
+async def _resolve_siblings(
+    base_url: str, dvb_mux: str, ppids: list[int]
+) -> dict[int, str]:
+    """pPID -> uuid of its one enabled override on dvb_mux, where there is one."""
+    async with aiohttp.ClientSession(
+        raise_for_status=True, headers={"User-Agent": "curl/aiohttp"}
+    ) as session:
+        grids = await asyncio.gather(
+            *(tvh_get_svc_grid(session, base_url, sid=ppid) for ppid in ppids),
+            return_exceptions=True,
+        )
+
+    resolved: dict[int, str] = {}
+    for ppid, svcs in zip(ppids, grids):
+        if isinstance(svcs, BaseException):
+            logger.debug("Cannot look up pPID {} for a standby: {}", ppid, svcs)
+            continue
+        overrides = [
+            svc
+            for svc in svcs
+            if svc.get("enabled")
+            and is_abertpy_svc(svc)
+            and extract_ppid_from_svcname(svc.get("svcname", "")) == ppid
+            and svc.get("multiplex", "") == dvb_mux
+        ]
+        # Anything else needs the self-heal a proxy of its own will do
+        if len(overrides) == 1:
+            resolved[ppid] = overrides[0]["uuid"]
+    return resolved
+
+
+def _open_stream(url: str) -> tuple[socket.socket, bytes]:
+    """GET url over a bare socket: the connection and the body read so far.
+
+    HTTP/1.0, so TVheadend sends the stream as-is rather than chunked, and
+    whoever the socket is handed to can read the TS straight off it.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme != "http":
+        raise ConnectionError(f"standbys need plain http, not {parts.scheme}")
+    port = parts.port or 80
+    sock = socket.create_connection((parts.hostname, port), _CONNECT_TIMEOUT_S)
+    try:
+        request = [
+            f"GET {parts.path} HTTP/1.0",
+            f"Host: {parts.hostname}:{port}",
+            "User-Agent: curl/aiohttp",
+        ]
+        if parts.username:
+            credentials = ":".join(
+                urllib.parse.unquote(part or "")
+                for part in (parts.username, parts.password)
+            )
+            token = base64.b64encode(credentials.encode()).decode()
+            request.append(f"Authorization: Basic {token}")
+        sock.sendall(("\r\n".join(request) + "\r\n\r\n").encode())
+
+        received = b""
+        while b"\r\n\r\n" not in received:
+            chunk = sock.recv(4096)
+            if not chunk or len(received) > 65536:
+                raise ConnectionError("no HTTP response header")
+            received += chunk
+        head, body = received.split(b"\r\n\r\n", 1)
+        status, *headers = head.decode("latin-1").split("\r\n")
+        if status.split()[1:2] != ["200"]:
+            raise ConnectionError(f"TVheadend answered {status!r}")
+        if any(h.lower().startswith("transfer-encoding:") for h in headers):
+            raise ConnectionError("TVheadend sent the stream chunked")
+    except BaseException:
+        sock.close()
+        raise
+
+    sock.settimeout(None)
+    return sock, body
+
+
+class _RollingBuffer:
+    """The last _BUFFER_S of a stream, trimmed on TS frame boundaries."""
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        # Stream offset of data[0]; the body starts on a frame boundary
+        self._start = 0
+        # (arrival, stream offset just past the chunk) per chunk still held
+        self._chunks: deque[tuple[float, int]] = deque()
+
+    def add(self, chunk: bytes, now: float) -> None:
+        self.data += chunk
+        self._chunks.append((now, self._start + len(self.data)))
+
+        end = self._start
+        while self._chunks and self._chunks[0][0] < now - _BUFFER_S:
+            end = self._chunks.popleft()[1]
+        end -= end % FRAME_SIZE
+        if end > self._start:
+            del self.data[: end - self._start]
+            self._start = end
+
+
+class StandbyHost:
+    """The standbys one proxy run keeps warm for its siblings."""
+
+    def __init__(
+        self,
+        base_url: str,
+        dvb_mux: str,
+        ppid: int,
+        count: int,
+        usage_db: Path,
+        linger_s: float = 0.0,
+    ) -> None:
+        self.base_url = base_url
+        self.dvb_mux = dvb_mux
+        self.ppid = ppid
+        self.count = count
+        self.usage_db = usage_db
+        self.linger_s = linger_s
+        self.handed_over = threading.Event()
+        # pPIDs whose standby is listening
+        self._warm: set[int] = set()
+
+    def start(self) -> None:
+        threading.Thread(target=self._warm_siblings, daemon=True).start()
+
+    def linger(self) -> None:
+        """Keep the standbys up for linger_s after we stopped, for the zap that
+        may follow: TVheadend stops the old channel before it starts the new.
+
+        That holds the tuner as long, which delays a zap to another
+        transponder when no tuner is spare, hence off unless asked for.
+        """
+        if self.linger_s and self._warm and self.handed_over.wait(self.linger_s):
+            # Give the handover a moment to reach the new proxy in full
+            time.sleep(0.1)
+
+    def _warm_siblings(self) -> None:
+        time.sleep(_WARM_DELAY_S)
+        siblings = pick_siblings(
+            load_usage(self.usage_db, _USAGE_DAYS), self.dvb_mux, self.ppid, self.count
+        )
+        if not siblings:
+            logger.debug("No sibling of pPID {} watched lately to warm", self.ppid)
+            return
+
+        services = asyncio.run(_resolve_siblings(self.base_url, self.dvb_mux, siblings))
+        for ppid in siblings:
+            if ppid in services:
+                threading.Thread(
+                    target=self._keep, args=(ppid, services[ppid]), daemon=True
+                ).start()
+            else:
+                logger.debug("pPID {} has no single override to warm", ppid)
+
+    def _keep(self, ppid: int, service_uuid: str) -> None:
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(_address(self.dvb_mux, ppid))
+        except OSError:
+            logger.debug("pPID {} is kept warm by another proxy already", ppid)
+            listener.close()
+            return
+        listener.listen(1)
+        self._warm.add(ppid)
+        logger.info("Keeping pPID {} on {} warm for a zap", ppid, self.dvb_mux)
+
+        url = f"{self.base_url}/stream/service/{service_uuid}"
+        with listener:
+            while True:
+                try:
+                    upstream, body = _open_stream(url)
+                except OSError as e:
+                    logger.debug("Standby of pPID {} not streaming: {}", ppid, e)
+                else:
+                    if self._serve(ppid, listener, upstream, body):
+                        self._warm.discard(ppid)
+                        self.handed_over.set()
+                        return
+                time.sleep(_REOPEN_S)
+
+    def _serve(
+        self,
+        ppid: int,
+        listener: socket.socket,
+        upstream: socket.socket,
+        body: bytes,
+    ) -> bool:
+        """Buffer upstream until a proxy takes it over (True) or it fails."""
+        buffer = _RollingBuffer()
+        buffer.add(body, time.monotonic())
+        with upstream, selectors.DefaultSelector() as selector:
+            selector.register(upstream, selectors.EVENT_READ)
+            selector.register(listener, selectors.EVENT_READ)
+            while True:
+                ready = selector.select(_SILENCE_S)
+                if not ready:
+                    logger.debug("Standby of pPID {} went silent", ppid)
+                    return False
+                for key, _ in ready:
+                    if key.fileobj is listener:
+                        conn, _ = listener.accept()
+                        with conn:
+                            if _same_user(conn):
+                                return self._hand_over(ppid, conn, upstream, buffer)
+                        logger.warning(
+                            "Refused the standby of pPID {} to another user", ppid
+                        )
+                        continue
+                    chunk = upstream.recv(65536)
+                    if not chunk:
+                        logger.debug("TVheadend ended the standby of pPID {}", ppid)
+                        return False
+                    buffer.add(chunk, time.monotonic())
+
+    def _hand_over(
+        self,
+        ppid: int,
+        conn: socket.socket,
+        upstream: socket.socket,
+        buffer: _RollingBuffer,
+    ) -> bool:
+        try:
+            socket.send_fds(conn, [_HEADER.pack(len(buffer.data))], [upstream.fileno()])
+        except OSError as e:
+            logger.debug("Standby of pPID {} not handed over: {}", ppid, e)
+            return False
+
+        # The upstream is theirs now, whether or not the buffer makes it
+        try:
+            conn.sendall(buffer.data)
+        except OSError as e:
+            logger.debug("Buffer of pPID {} not handed over: {}", ppid, e)
+        logger.info("Handed the standby of pPID {} over to its proxy", ppid)
+        return True
@@ -0,0 +1,222 @@
+"""MPEG-TS framing and PSI section primitives shared by the proxy paths."""
+
+import zlib
+from collections.abc import Container, Iterator
+
+FRAME_SIZE = 188
+MPEG_TS_START_BYTE = 0x47
+
+AFC_PAYLOAD_ONLY = 0x10
+AFC_ADAPTATION_PAYLOAD = 0x30
+
+PID_PAT = 0x0000
+PID_CAT = 0x0001
+PID_NIT = 0x0010
+PID_SDT = 0x0011
+PID_EIT = 0x0012
+PID_TDT = 0x0014
+PID_NULL = 0x1FFF
+
+TABLE_PAT = 0x00
+TABLE_PMT = 0x02
+TABLE_SDT_ACTUAL = 0x42
+TABLE_EIT_PF_ACTUAL = 0x4E
+TABLE_EIT_SCHEDULE_ACTUAL = range(0x50, 0x60)
+
+# Bytes of a section after its 3-byte header may not exceed this (ISO 13818-1
+# for PSI, EN 300 468 for the DVB SI tables we rebuild here).
+MAX_SECTION_LENGTH = 1021
+
+_TS_PAYLOAD_SIZE = FRAME_SIZE - 4
+
+
+# CRC-32/MPEG-2 is zlib's CRC-32 run over bit-reversed bytes, bit-reversed
+# back: zlib does the per-byte work in C. mpts checks and re-signs every EIT
+# section it passes on, and a Python loop over each byte was most of its time.
+_REVERSED_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def crc32_mpeg2(data: bytes | bytearray) -> int:
+    """CRC-32/MPEG-2 as used by PSI/SI sections: 0 over a section with its CRC."""
+    reflected = zlib.crc32(data.translate(_REVERSED_BITS)) ^ 0xFFFFFFFF
+    return int(f"{reflected:032b}"[::-1], 2)
+
+
+def packet_pid(packet: bytes | bytearray | memoryview) -> int:
+    return ((packet[1] & 0x1F) << 8) | packet[2]
+
+
+def packet_payload(packet: bytes | bytearray) -> bytes | None:
+    """The payload of one TS frame, skipping any adaptation field."""
+    afc = packet[3] & 0x30
+    if afc == AFC_PAYLOAD_ONLY:
+        return bytes(packet[4:])
+    if afc == AFC_ADAPTATION_PAYLOAD:
+        return bytes(packet[packet[4] + 5 :])
+    return None
+
+
+# PCRs count a 27MHz clock and wrap at 2**33 of its 90kHz base
+PCR_CLOCK_HZ = 27_000_000
+PCR_WRAP = (1 << 33) * 300
+
+
+def packet_pcr(packet: bytes | bytearray | memoryview) -> int | None:
+    """The PCR one TS frame carries, in 27MHz ticks, or None."""
+    if not packet[3] & 0x20 or packet[4] < 7 or not packet[5] & 0x10:
+        return None
+    base = (
+        (packet[6] << 25)
+        | (packet[7] << 17)
+        | (packet[8] << 9)
+        | (packet[9] << 1)
+        | (packet[10] >> 7)
+    )
+    return base * 300 + (((packet[10] & 0x01) << 8) | packet[11])
+
+
+def with_pid(packet: bytes | bytearray, pid: int) -> bytes:
+    """The same frame relabelled onto another PID, every other header bit kept."""
+    return bytes((packet[0], (packet[1] & 0xE0) | (pid >> 8), pid & 0xFF)) + packet[3:]
+
+
+def finish_section(body: bytes | bytearray) -> bytes:
+    """Fill in section_length and append the CRC of a long-form section.
+
+    body is the whole section minus its CRC, with placeholder length bits.
+    """
+    section = bytearray(body)
+    length = len(section) - 3 + 4
+    section[1] = (section[1] & 0xF0) | (length >> 8)
+    section[2] = length & 0xFF
+    section += crc32_mpeg2(section).to_bytes(4, "big")
+    return bytes(section)
+
+
+def packetize_section(pid: int, section: bytes, cc: int) -> tuple[bytes, int]:
+    """One section spread over as many stuffed TS frames as it needs.
+
+    Returns the frames and the continuity counter to carry into the next call,
+    since every frame on a PID has to advance it.
+    """
+    data = b"\x00" + section  # pointer_field: section starts right away
+    frames = bytearray()
+    for offset in range(0, len(data), _TS_PAYLOAD_SIZE):
+        chunk = data[offset : offset + _TS_PAYLOAD_SIZE]
+        pusi = 0x40 if offset == 0 else 0
+        frames += bytes(
+            (MPEG_TS_START_BYTE, pusi | (pid >> 8), pid & 0xFF, AFC_PAYLOAD_ONLY | cc)
+        )
+        frames += chunk
+        frames += b"\xff" * (_TS_PAYLOAD_SIZE - len(chunk))
+        cc = (cc + 1) & 0x0F
+    return bytes(frames), cc
+
+
+class SectionAssembler:
+    """Reassembles the PSI/SI sections carried on one PID.
+
+    Frames are pushed in arrival order; each push returns whatever sections
+    it completed. Sections failing their CRC are dropped, since a corrupt PMT
+    or SDT rewritten with a fresh CRC would be taken as valid downstream.
+    """
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._synced = False
+
+    def push(self, packet: bytes | bytearray) -> list[bytes]:
+        payload = packet_payload(packet)
+        if not payload:
+            return []
+
+        sections: list[bytes] = []
+        if packet[1] & 0x40:
+            pointer = payload[0]
+            if self._synced:
+                self._buf += payload[1 : 1 + pointer]
+                sections += self._drain()
+            self._buf = bytearray(payload[1 + pointer :])
+            self._synced = True
+        elif self._synced:
+            self._buf += payload
+        else:
+            return []
+
+        sections += self._drain()
+        return sections
+
+    def _drain(self) -> list[bytes]:
+        sections: list[bytes] = []
+        while len(self._buf) >= 3:
+            if self._buf[0] == 0xFF:
+                # Stuffing runs to the end of the frame
+                self._buf.clear()
+                break
+
+            total = 3 + (((self._buf[1] & 0x0F) << 8) | self._buf[2])
+            if len(self._buf) < total:
+                break
+
+            section = bytes(self._buf[:total])
+            del self._buf[:total]
+            if section[1] & 0x80 and crc32_mpeg2(section):
+                continue
+            sections.append(section)
+        return sections
+
+
+def iter_sections(
+    data: bytes | bytearray | memoryview, pids: Container[int]
+) -> Iterator[tuple[int, bytes]]:
+    """(pid, section) for every valid section on the given PIDs of raw TS."""
+    assemblers: dict[int, SectionAssembler] = {}
+    offset = bytes(data[: FRAME_SIZE * 2]).find(bytes((MPEG_TS_START_BYTE,)))
+    if offset < 0:
+        return
+
+    for start in range(offset, len(data) - FRAME_SIZE + 1, FRAME_SIZE):
+        packet = data[start : start + FRAME_SIZE]
+        if packet[0] != MPEG_TS_START_BYTE:
+            continue
+        pid = packet_pid(packet)
+        if pid not in pids:
+            continue
+        assembler = assemblers.setdefault(pid, SectionAssembler())
+        for section in assembler.push(bytes(packet)):
+            yield pid, section
+
+
+def pat_pmt_pids(section: bytes) -> dict[int, int]:
+    """program_number -> PMT PID of a PAT section, leaving out the NIT entry."""
+    programs: dict[int, int] = {}
+    for entry in range(8, len(section) - 4, 4):
+        program_number = (section[entry] << 8) | section[entry + 1]
+        if program_number:
+            programs[program_number] = ((section[entry + 2] & 0x1F) << 8) | section[
+                entry + 3
+            ]
+    return programs
+
+
+def pmt_elementary_streams(section: bytes) -> list[tuple[int, int]]:
+    """(stream_type, PID) of every elementary stream a PMT section lists."""
+    streams: list[tuple[int, int]] = []
+    entry = 12 + (((section[10] & 0x0F) << 8) | section[11])
+    while entry + 5 <= len(section) - 4:
+        streams.append(
+            (section[entry], ((section[entry + 1] & 0x1F) << 8) | section[entry + 2])
+        )
+        entry += 5 + (((section[entry + 3] & 0x0F) << 8) | section[entry + 4])
+    return streams
+
+
+def pat_tsid(data: bytes | bytearray | memoryview) -> int | None:
+    """transport_stream_id from the first valid PAT in a chunk of raw TS.
+
+    Cheap enough to run on a capture as it arrives: only PID 0 is parsed.
+    """
+    for _, section in iter_sections(data, (PID_PAT,)):
+        if section[0] == TABLE_PAT:
+            return (section[3] << 8) | section[4]
+    return None
@@ -0,0 +1,202 @@
+"""Per-pPID bitrate and viewing history, recorded by the proxy for setup.
+
+Each proxy run is one session row in a small SQLite store: which pPID on which
+transponder, when it started, how long it has played and how much payload it
+delivered. The row is rewritten every _FLUSH_S, since TVheadend stops a pipe
+by killing it and a session must survive that, and always from a thread of
+its own: the stream never waits on the store. Setup reads the store back to
+rank muxes by how much they are watched and to size scan captures by the
+bitrates actually received.
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+# How often a running session's row is brought up to date
+_FLUSH_S = 30.0
+
+# How long a write waits on other proxies writing the store. Every proxy
+# shares it, and a sample lost to contention matters less than a late one.
+_BUSY_TIMEOUT_S = 1.0
+
+# Sessions shorter than this say little about a pPID's bitrate, since
+# connecting and tuning dominate them; they still count as viewing
+_MIN_RATE_SESSION_S = 5.0
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY,
+        dvb_mux TEXT NOT NULL,
+        ppid INTEGER NOT NULL,
+        started REAL NOT NULL,
+        seconds REAL NOT NULL,
+        payload_bytes INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS sessions_ppid ON sessions (dvb_mux, ppid, started)",
+)
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written from whichever thread flushes, one at a time
+    conn = sqlite3.connect(path, timeout=_BUSY_TIMEOUT_S, check_same_thread=False)
+    # Every proxy appends to the same store; WAL keeps them off each other
+    conn.execute("PRAGMA journal_mode=WAL")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+class SessionRecorder:
+    """Accounts one proxy run's payload and keeps its session row current.
+
+    Any failure to write disables recording for the run with one warning:
+    the stream matters more than its statistics. For the same reason add()
+    never touches the store itself: a due row is written by a thread of its
+    own, and skipped while the last one is still being written.
+    """
+
+    def __init__(self, path: Path, dvb_mux: str, ppid: int) -> None:
+        self.path = path
+        self.dvb_mux = dvb_mux
+        self.ppid = ppid
+        self.payload_bytes = 0
+        self._conn: sqlite3.Connection | None = None
+        self._row: int | None = None
+        self._started: float | None = None
+        self._started_at = 0.0
+        self._flushed = 0.0
+        self._failed = False
+        # Held while a row is being written
+        self._writing = threading.Lock()
+
+    def add(self, nbytes: int) -> None:
+        now = time.monotonic()
+        if self._started is None:
+            self._started, self._started_at = now, time.time()
+            # The first row waits a whole interval, well clear of the zap
+            self._flushed = now
+        self.payload_bytes += nbytes
+        if now - self._flushed < _FLUSH_S or self._failed:
+            return
+
+        self._flushed = now
+        if self._writing.acquire(blocking=False):
+            threading.Thread(
+                target=self._write_locked,
+                args=(now - self._started, self.payload_bytes),
+                daemon=True,
+            ).start()
+
+    def flush(self, now: float | None = None) -> None:
+        """Bring the row up to date right away, for when the stream has
+        stopped; waits only briefly on a write already under way."""
+        if self._failed or self._started is None:
+            return
+        now = time.monotonic() if now is None else now
+        self._flushed = now
+        if self._writing.acquire(timeout=_BUSY_TIMEOUT_S):
+            self._write_locked(now - self._started, self.payload_bytes)
+
+    def _write_locked(self, seconds: float, payload_bytes: int) -> None:
+        try:
+            self._write(seconds, payload_bytes)
+        finally:
+            self._writing.release()
+
+    def _write(self, seconds: float, payload_bytes: int) -> None:
+        try:
+            if self._conn is None:
+                self._conn = _connect(self.path)
+            if self._row is None:
+                cursor = self._conn.execute(
+                    "INSERT INTO sessions (dvb_mux, ppid, started, seconds, "
+                    "payload_bytes) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.dvb_mux,
+                        self.ppid,
+                        self._started_at,
+                        seconds,
+                        payload_bytes,
+                    ),
+                )
+                self._row = cursor.lastrowid
+            else:
+                self._conn.execute(
+                    "UPDATE sessions SET seconds = ?, payload_bytes = ? WHERE id = ?",
+                    (seconds, payload_bytes, self._row),
+                )
+            self._conn.commit()
+        except sqlite3.OperationalError as e:
+            if e.sqlite_errorcode & 0xFF not in (
+                sqlite3.SQLITE_BUSY,
+                sqlite3.SQLITE_LOCKED,
+            ):
+                logger.warning("Not recording usage to {}: {}", self.path, e)
+                self._failed = True
+                return
+            # Other proxies kept the store busy: lose this sample, not the rest
+            logger.debug("Usage store {} busy; sample skipped", self.path)
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.rollback()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Not recording usage to {}: {}", self.path, e)
+            self._failed = True
+
+
+@dataclass(frozen=True)
+class PpidUsage:
+    """How one pPID has been watched and received lately."""
+
+    sessions: int
+    watched_seconds: float
+    # Average payload bitrate, 0 when no session was long enough to tell
+    bitrate_bps: float
+    # Epoch seconds the latest session started
+    last_watched: float = 0.0
+
+
+def load_usage(path: Path, days: int) -> dict[tuple[str, int], PpidUsage]:
+    """(transponder, pPID) -> usage over the last days, empty without a store."""
+    if not path.exists():
+        return {}
+
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5.0)
+        try:
+            rows = conn.execute(
+                """
+                SELECT dvb_mux, ppid, COUNT(*), SUM(seconds),
+                    SUM(CASE WHEN seconds >= ? THEN payload_bytes ELSE 0 END),
+                    SUM(CASE WHEN seconds >= ? THEN seconds ELSE 0 END),
+                    MAX(started)
+                FROM sessions WHERE started >= ? GROUP BY dvb_mux, ppid
+                """,
+                (
+                    _MIN_RATE_SESSION_S,
+                    _MIN_RATE_SESSION_S,
+                    time.time() - days * 86400,
+                ),
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning("Ignoring unreadable usage store {}: {}", path, e)
+        return {}
+
+    return {
+        (dvb_mux, ppid): PpidUsage(
+            sessions=sessions,
+            watched_seconds=watched,
+            bitrate_bps=8 * rate_bytes / rate_seconds if rate_seconds else 0.0,
+            last_watched=last,
+        )
+        for dvb_mux, ppid, sessions, watched, rate_bytes, rate_seconds, last in rows
+    }
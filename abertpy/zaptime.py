@@ -0,0 +1,75 @@
+"""Zap time: how long a proxy takes from being spawned to its first payload.
+
+Each start-up phase marks when it finished, on the monotonic clock. The first
+payload written reports them all once, as one log line and optionally one
+JSON line, so the slow phase of a slow channel is plain to see.
+"""
+
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+
+def _process_started() -> float | None:
+    """When the kernel started this process, on the time.monotonic() clock."""
+    try:
+        stat = Path("/proc/self/stat").read_text()
+        # starttime is field 22; fields restart at 3 after the ")" of comm
+        ticks = int(stat.rsplit(")", 1)[1].split()[19])
+        since_boot = ticks / os.sysconf("SC_CLK_TCK")
+        now_since_boot = time.clock_gettime(time.CLOCK_BOOTTIME)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return time.monotonic() - (now_since_boot - since_boot)
+
+
+# Phase -> when it finished, in the order phases happen
+_MARKS: dict[str, float] = {"spawn": _process_started() or time.monotonic()}
+_reported = False
+
+
+def mark(phase: str) -> None:
+    """Record that phase just finished. Only its first completion counts."""
+    _MARKS.setdefault(phase, time.monotonic())
+
+
+def report(label: str, jsonl_path: Path | None = None) -> None:
+    """Log the phases once, on the first payload, and append them to jsonl_path."""
+    global _reported
+    if _reported:
+        return
+    _reported = True
+
+    mark("first_payload")
+    marks = sorted(_MARKS.items(), key=lambda item: item[1])
+    phases = {
+        phase: round(at - previous, 4)
+        for (_, previous), (phase, at) in itertools.pairwise(marks)
+    }
+    total = round(marks[-1][1] - marks[0][1], 4)
+
+    logger.info(
+        "Zap {}: {:.3f}s to first payload ({})",
+        label,
+        total,
+        " ".join(f"{phase}={seconds:.3f}" for phase, seconds in phases.items()),
+    )
+
+    if jsonl_path is None:
+        return
+    record = {
+        "at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "label": label,
+        "total": total,
+        "phases": phases,
+    }
+    try:
+        with open(jsonl_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logger.warning("Cannot append zap time to {}: {}", jsonl_path, e)
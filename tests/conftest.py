@@ -0,0 +1,17 @@
+from pathlib import Path
+
+import pytest
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def ppid_a() -> bytes:
+    """pPID A's inner TS: programs 1 (H.264) and 2 (MPEG-2) on tsid 0x0401."""
+    return (FIXTURES / "ppid_a.ts").read_bytes()
+
+
+@pytest.fixture
+def ppid_b() -> bytes:
+    """pPID B's inner TS: program 1 (H.264) on tsid 0x0402."""
+    return (FIXTURES / "ppid_b.ts").read_bytes()
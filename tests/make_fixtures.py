@@ -0,0 +1,198 @@
+"""Writes the TS fixtures the tests read: the inner transport streams of two
+pPIDs on one transponder, as the proxy decapsulates them.
+
+Both are small terrestrial multiplexes of the kind Abertis carries: PAT,
+PMTs, SDT, EIT present/following and a handful of PES packets, video
+joined mid-GOP before its first keyframe. pPID A has two programs (H.264 and
+MPEG-2 video) and pPID B one, numbered 1 like A's first so that merging them
+has a program number to resolve. The output is deterministic; rerun this
+only to change the fixtures, from the repository root:
+
+    python tests/make_fixtures.py
+"""
+
+from pathlib import Path
+
+from abertpy.ts import (
+    AFC_ADAPTATION_PAYLOAD,
+    AFC_PAYLOAD_ONLY,
+    FRAME_SIZE,
+    MPEG_TS_START_BYTE,
+    PID_EIT,
+    PID_NULL,
+    PID_PAT,
+    PID_SDT,
+    PID_TDT,
+    TABLE_EIT_PF_ACTUAL,
+    TABLE_PAT,
+    TABLE_PMT,
+    TABLE_SDT_ACTUAL,
+    finish_section,
+    packetize_section,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+STREAM_TYPE_MPEG2_VIDEO = 0x02
+STREAM_TYPE_MPEG1_AUDIO = 0x03
+STREAM_TYPE_H264 = 0x1B
+
+# Never contains a start code prefix
+_FILLER = 0x5A
+
+
+def pat(tsid: int, programs: dict[int, int]) -> bytes:
+    body = bytearray((TABLE_PAT, 0xB0, 0, tsid >> 8, tsid & 0xFF, 0xC1, 0, 0))
+    for number, pid in programs.items():
+        body += bytes((number >> 8, number & 0xFF, 0xE0 | (pid >> 8), pid & 0xFF))
+    return finish_section(body)
+
+
+def pmt(number: int, pcr_pid: int, streams: list[tuple[int, int]]) -> bytes:
+    body = bytearray((TABLE_PMT, 0xB0, 0, number >> 8, number & 0xFF, 0xC1, 0, 0))
+    body += bytes((0xE0 | (pcr_pid >> 8), pcr_pid & 0xFF, 0xF0, 0))
+    for stream_type, pid in streams:
+        body += bytes((stream_type, 0xE0 | (pid >> 8), pid & 0xFF, 0xF0, 0))
+    return finish_section(body)
+
+
+def sdt(tsid: int, onid: int, services: dict[int, str]) -> bytes:
+    body = bytearray((TABLE_SDT_ACTUAL, 0xF0, 0, tsid >> 8, tsid & 0xFF, 0xC1, 0, 0))
+    body += bytes((onid >> 8, onid & 0xFF, 0xFF))
+    for sid, name in services.items():
+        provider, service = b"RTVE", name.encode()
+        descriptor = bytes((0x48, 3 + len(provider) + len(service), 0x01))
+        descriptor += bytes((len(provider),)) + provider
+        descriptor += bytes((len(service),)) + service
+        body += bytes((sid >> 8, sid & 0xFF, 0xFC))
+        body += bytes((0x80 | (len(descriptor) >> 8), len(descriptor) & 0xFF))
+        body += descriptor
+    return finish_section(body)
+
+
+def eit_pf(sid: int, tsid: int, onid: int, title: str) -> bytes:
+    """Present/following for sid, one event with a text long enough that the
+    section spans two TS frames."""
+    body = bytearray((TABLE_EIT_PF_ACTUAL, 0xF0, 0, sid >> 8, sid & 0xFF, 0xC1))
+    body += bytes((0, 0, tsid >> 8, tsid & 0xFF, onid >> 8, onid & 0xFF, 0, 0x4E))
+    name, text = title.encode(), (title + ". ").encode() * 12
+    descriptor = b"spa" + bytes((len(name),)) + name + bytes((len(text),)) + text
+    descriptor = bytes((0x4D, len(descriptor))) + descriptor
+    # event_id, start (MJD + BCD time), duration (BCD)
+    body += bytes((0x00, 0x01, 0xEA, 0x60, 0x20, 0x00, 0x00, 0x01, 0x30, 0x00))
+    body += bytes((0x80 | (len(descriptor) >> 8), len(descriptor) & 0xFF))
+    body += descriptor
+    return finish_section(body)
+
+
+class _Writer:
+    """TS frames in order, each PID keeping its own continuity counter."""
+
+    def __init__(self) -> None:
+        self.frames = bytearray()
+        self._cc: dict[int, int] = {}
+
+    def section(self, pid: int, section: bytes) -> None:
+        frames, self._cc[pid] = packetize_section(pid, section, self._cc.get(pid, 0))
+        self.frames += frames
+
+    def frame(
+        self, pid: int, payload: bytes, pusi: bool, pcr: int | None = None
+    ) -> None:
+        cc = self._cc.get(pid, 0)
+        self._cc[pid] = (cc + 1) & 0x0F
+        header = bytes(
+            (
+                MPEG_TS_START_BYTE,
+                (0x40 if pusi else 0) | (pid >> 8),
+                pid & 0xFF,
+                (AFC_PAYLOAD_ONLY if pcr is None else AFC_ADAPTATION_PAYLOAD) | cc,
+            )
+        )
+        if pcr is not None:
+            base, extension = divmod(pcr, 300)
+            header += bytes((7, 0x10)) + bytes(
+                (
+                    (base >> 25) & 0xFF,
+                    (base >> 17) & 0xFF,
+                    (base >> 9) & 0xFF,
+                    (base >> 1) & 0xFF,
+                    ((base & 1) << 7) | 0x7E | (extension >> 8),
+                    extension & 0xFF,
+                )
+            )
+        room = FRAME_SIZE - len(header)
+        self.frames += header + payload[:room].ljust(room, bytes((_FILLER,)))
+
+    def pes(self, pid: int, stream_id: int, es: bytes, pcr: int | None = None) -> None:
+        """A PES packet's first frame, then one continuation frame."""
+        header = b"\x00\x00\x01" + bytes((stream_id, 0, 0, 0x80, 0x80, 5))
+        header += bytes((0x21, 0x00, 0x01, 0x00, 0x01))  # PTS
+        self.frame(pid, header + es, pusi=True, pcr=pcr)
+        self.frame(pid, b"", pusi=False)
+
+
+# H.264 access units: a non-IDR slice, and an SPS ahead of an IDR slice
+_H264_P = b"\x00\x00\x00\x01\x41\x9a"
+_H264_IDR = b"\x00\x00\x00\x01\x67\x42\x00\x1e\x00\x00\x00\x01\x65\x88"
+# MPEG-2 video: a picture start, and a sequence header
+_MPEG2_P = b"\x00\x00\x01\x00\x00\x0f"
+_MPEG2_I = b"\x00\x00\x01\xb3\x2d\x02"
+_AUDIO = b"\xff\xfd\x90\x00"
+
+
+def ppid_a() -> bytes:
+    tsid, onid = 0x0401, 0x22D4
+    out = _Writer()
+    out.section(PID_PAT, pat(tsid, {1: 0x100, 2: 0x200}))
+    out.section(
+        0x100,
+        pmt(1, 0x101, [(STREAM_TYPE_H264, 0x101), (STREAM_TYPE_MPEG1_AUDIO, 0x102)]),
+    )
+    out.section(
+        0x200,
+        pmt(
+            2,
+            0x201,
+            [(STREAM_TYPE_MPEG2_VIDEO, 0x201), (STREAM_TYPE_MPEG1_AUDIO, 0x202)],
+        ),
+    )
+    out.section(PID_SDT, sdt(tsid, onid, {1: "La 1", 2: "La 2"}))
+    out.section(PID_EIT, eit_pf(1, tsid, onid, "Telediario"))
+    out.section(PID_EIT, eit_pf(2, tsid, onid, "Documentos"))
+    # Joined mid-GOP: the first video PES of each program is no keyframe
+    out.pes(0x101, 0xE0, _H264_P, pcr=27_000_000)
+    out.pes(0x201, 0xE0, _MPEG2_P, pcr=27_000_000)
+    out.pes(0x102, 0xC0, _AUDIO)
+    out.pes(0x202, 0xC0, _AUDIO)
+    out.frame(PID_NULL, b"", pusi=False)
+    out.frame(PID_TDT, b"", pusi=False)
+    out.pes(0x101, 0xE0, _H264_IDR, pcr=29_700_000)
+    out.pes(0x102, 0xC0, _AUDIO)
+    out.pes(0x201, 0xE0, _MPEG2_I, pcr=29_700_000)
+    out.pes(0x202, 0xC0, _AUDIO)
+    out.pes(0x101, 0xE0, _H264_P, pcr=32_400_000)
+    out.section(PID_PAT, pat(tsid, {1: 0x100, 2: 0x200}))
+    return bytes(out.frames)
+
+
+def ppid_b() -> bytes:
+    tsid, onid = 0x0402, 0x22D5
+    out = _Writer()
+    out.section(PID_PAT, pat(tsid, {1: 0x100}))
+    out.section(
+        0x100,
+        pmt(1, 0x101, [(STREAM_TYPE_H264, 0x101), (STREAM_TYPE_MPEG1_AUDIO, 0x102)]),
+    )
+    out.section(PID_SDT, sdt(tsid, onid, {1: "Canal Sur"}))
+    out.section(PID_EIT, eit_pf(1, tsid, onid, "Noticias"))
+    out.pes(0x101, 0xE0, _H264_IDR, pcr=54_000_000)
+    out.pes(0x102, 0xC0, _AUDIO)
+    out.pes(0x101, 0xE0, _H264_P, pcr=56_700_000)
+    return bytes(out.frames)
+
+
+if __name__ == "__main__":
+    FIXTURES.mkdir(exist_ok=True)
+    (FIXTURES / "ppid_a.ts").write_bytes(ppid_a())
+    (FIXTURES / "ppid_b.ts").write_bytes(ppid_b())
@@ -0,0 +1,56 @@
+import json
+
+from abertpy.journal import SetupJournal
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "journal.json"
+    journal = SetupJournal(path, "net-1", "live")
+    journal.record({"uuid": "mux-a", "name": "11302H"}, {1001: 101, 1002: 102})
+    journal.record({"uuid": "mux-b", "name": "11714V"}, {})
+
+    resumed = SetupJournal(path, "net-1", "live")
+    resumed.load()
+    assert resumed.scanned == {
+        "mux-a": ("11302H", {1001: 101, 1002: 102}),
+        "mux-b": ("11714V", {}),
+    }
+
+
+def test_other_network_or_source_starts_over(tmp_path):
+    path = tmp_path / "journal.json"
+    SetupJournal(path, "net-1", "live").record({"uuid": "mux-a"}, {1001: 101})
+
+    for network_uuid, source in (("net-2", "live"), ("net-1", "/captures")):
+        journal = SetupJournal(path, network_uuid, source)
+        journal.load()
+        assert journal.scanned == {}
+
+
+def test_missing_or_unreadable_journal(tmp_path):
+    journal = SetupJournal(tmp_path / "missing.json", "net-1", "live")
+    journal.load()
+    assert journal.scanned == {}
+
+    path = tmp_path / "journal.json"
+    path.write_text("{not json")
+    journal = SetupJournal(path, "net-1", "live")
+    journal.load()
+    assert journal.scanned == {}
+
+
+def test_save_is_atomic(tmp_path):
+    path = tmp_path / "journal.json"
+    SetupJournal(path, "net-1", "live").record({"uuid": "mux-a"}, {1001: 101})
+    assert json.loads(path.read_text())["scanned"]["mux-a"]["ppids"] == {"1001": 101}
+    assert [p.name for p in tmp_path.iterdir()] == ["journal.json"]
+
+
+def test_clear(tmp_path):
+    path = tmp_path / "journal.json"
+    journal = SetupJournal(path, "net-1", "live")
+    journal.record({"uuid": "mux-a"}, {1001: 101})
+    journal.clear()
+    assert not path.exists()
+    # Clearing twice, or a journal never written, is fine
+    journal.clear()
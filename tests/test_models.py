@@ -0,0 +1,17 @@
+import io
+
+from loguru import logger
+
+from abertpy.models import TRUSTED, LoggingArgs
+
+
+def test_trusted_args_leave_logging_alone():
+    sink = io.StringIO()
+    handler = logger.add(sink, level="DEBUG")
+    try:
+        # As a rescan inside a --debug proxy validates its setup args
+        LoggingArgs.model_validate({"d": False}, context=TRUSTED)
+        logger.debug("still here")
+        assert "still here" in sink.getvalue()
+    finally:
+        logger.remove(handler)
@@ -0,0 +1,106 @@
+from abertpy.mpts import MptsMuxer
+from abertpy.ts import (
+    FRAME_SIZE,
+    PID_EIT,
+    PID_NULL,
+    PID_PAT,
+    PID_SDT,
+    PID_TDT,
+    TABLE_PMT,
+    iter_sections,
+    packet_pid,
+    pat_pmt_pids,
+    pmt_elementary_streams,
+)
+
+TSID = 0x1234
+
+
+def _mux(ppid_a: bytes, ppid_b: bytes, chunk: int = 4096) -> bytes:
+    muxer = MptsMuxer(TSID, [100, 200])
+    out = bytearray()
+    for ppid, data in ((100, ppid_a), (200, ppid_b)):
+        for offset in range(0, len(data), chunk):
+            out += muxer.feed(ppid, data[offset : offset + chunk])
+    return bytes(out)
+
+
+def _frames(data: bytes) -> list[bytes]:
+    return [data[i : i + FRAME_SIZE] for i in range(0, len(data), FRAME_SIZE)]
+
+
+def _programs(out: bytes) -> dict[int, list[tuple[int, int]]]:
+    """program_number -> elementary streams of the output's last PAT and PMTs."""
+    pats = [section for _, section in iter_sections(out, (PID_PAT,))]
+    pmt_pids = pat_pmt_pids(pats[-1])
+    pmts = {
+        pid: section
+        for pid, section in iter_sections(out, set(pmt_pids.values()))
+        if section[0] == TABLE_PMT
+    }
+    return {
+        number: pmt_elementary_streams(pmts[pid]) for number, pid in pmt_pids.items()
+    }
+
+
+def test_programs_renumbered_apart(ppid_a, ppid_b):
+    out = _mux(ppid_a, ppid_b)
+    pat = [section for _, section in iter_sections(out, (PID_PAT,))][-1]
+    assert (pat[3] << 8) | pat[4] == TSID
+
+    programs = _programs(out)
+    # B's program 1 clashes with A's and moves to the next free number
+    assert sorted(programs) == [1, 2, 3]
+    assert [stream_type for stream_type, _ in programs[3]] == [0x1B, 0x03]
+
+    pids = [pid for streams in programs.values() for _, pid in streams]
+    pmt_pids = set(pat_pmt_pids(pat).values())
+    assert len(set(pids)) == len(pids) == 6
+    assert not pmt_pids & set(pids)
+    assert min(pids + list(pmt_pids)) >= 0x100
+
+
+def test_payload_moves_with_its_pid(ppid_a, ppid_b):
+    out = _mux(ppid_a, ppid_b)
+    video_b = _programs(out)[3][0][1]
+
+    inner = [frame for frame in _frames(ppid_b) if packet_pid(frame) == 0x101]
+    moved = [frame for frame in _frames(out) if packet_pid(frame) == video_b]
+    assert len(moved) == len(inner)
+    for before, after in zip(inner, moved, strict=True):
+        # Only the PID changes: flags, continuity and payload are kept
+        assert after[1] & 0xE0 == before[1] & 0xE0
+        assert after[3:] == before[3:]
+
+
+def test_dropped_pids(ppid_a, ppid_b):
+    pids = {packet_pid(frame) for frame in _frames(_mux(ppid_a, ppid_b))}
+    assert PID_NULL not in pids
+    assert PID_TDT not in pids
+
+
+def test_sdt_and_eit_share_one_network(ppid_a, ppid_b):
+    out = _mux(ppid_a, ppid_b)
+
+    sdts = [section for _, section in iter_sections(out, (PID_SDT,))]
+    sdt = sdts[-1]
+    assert (sdt[3] << 8) | sdt[4] == TSID
+    # The first pPID seen names the network, though B announces another
+    assert (sdt[8] << 8) | sdt[9] == 0x22D4
+    # Service loop entries are 5 bytes and their descriptors
+    sids, offset = [], 11
+    while offset < len(sdt) - 4:
+        sids.append((sdt[offset] << 8) | sdt[offset + 1])
+        offset += 5 + (((sdt[offset + 3] & 0x0F) << 8) | sdt[offset + 4])
+    assert sids == [1, 2, 3]
+
+    eits = [section for _, section in iter_sections(out, (PID_EIT,))]
+    assert sorted((section[3] << 8) | section[4] for section in eits) == [1, 2, 3]
+    for section in eits:
+        assert (section[8] << 8) | section[9] == TSID
+        assert (section[10] << 8) | section[11] == 0x22D4
+
+
+def test_partial_frames_carried_over(ppid_a, ppid_b):
+    whole = _programs(_mux(ppid_a, ppid_b, chunk=len(ppid_a)))
+    assert _programs(_mux(ppid_a, ppid_b, chunk=FRAME_SIZE - 1)) == whole
@@ -0,0 +1,69 @@
+import io
+import threading
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from abertpy.proxy import _MergedSource
+from abertpy.ts import FRAME_SIZE
+
+
+class _Raw:
+    """A response body: data, then whatever ends it."""
+
+    def __init__(self, data: bytes, error: BaseException | None = None) -> None:
+        self.data = io.BytesIO(data)
+        self.error = error
+
+    def read(self, size: int, decode_content: bool = True) -> bytes:
+        chunk = self.data.read(size)
+        if not chunk and self.error is not None:
+            raise self.error
+        return chunk
+
+
+def _response(data: bytes, error: BaseException | None = None):
+    return SimpleNamespace(raw=_Raw(data, error), close=lambda: None)
+
+
+def test_merged_source_interleaves_whole_frames():
+    a, b = b"\x47" + bytes(FRAME_SIZE - 1), b"\x47" + b"\x01" * (FRAME_SIZE - 1)
+    source = _MergedSource([_response(a * 3), _response(b * 2)], read_timeout=1)
+    data = b"".join(source.iter_content(100))
+    frames = [data[i : i + FRAME_SIZE] for i in range(0, len(data), FRAME_SIZE)]
+    # Ends when the first stream does, which may be before the other is done
+    assert frames and set(frames) <= {a, b}
+
+
+def test_merged_source_passes_stream_failures_on():
+    error = OSError("connection reset")
+    source = _MergedSource([_response(b"", error)], read_timeout=1)
+    with pytest.raises(OSError, match="connection reset"):
+        list(source.iter_content(100))
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_merged_source_surfaces_bugs():
+    before = set(threading.enumerate())
+    source = _MergedSource([_response(b"", KeyError("bug"))], read_timeout=1)
+    with pytest.raises(KeyError):
+        list(source.iter_content(100))
+    # Let its reader thread die here, and be reported to this test only
+    for thread in set(threading.enumerate()) - before:
+        thread.join(1)
+
+
+def test_merged_source_read_timeout():
+    closed = threading.Event()
+
+    class Silent(_Raw):
+        def read(self, size: int, decode_content: bool = True) -> bytes:
+            closed.wait()
+            return b""
+
+    response = SimpleNamespace(raw=Silent(b""), close=closed.set)
+    source = _MergedSource([response], read_timeout=0.1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        list(source.iter_content(100))
+    source.close()
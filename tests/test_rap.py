@@ -0,0 +1,60 @@
+from abertpy.rap import RandomAccessGate, _is_random_access
+from abertpy.ts import FRAME_SIZE, PID_PAT, packet_pid
+
+
+def _frames(data: bytes) -> list[bytes]:
+    return [data[i : i + FRAME_SIZE] for i in range(0, len(data), FRAME_SIZE)]
+
+
+def _on(pid: int, data: bytes) -> list[bytes]:
+    return [frame for frame in _frames(data) if packet_pid(frame) == pid]
+
+
+def test_video_starts_on_random_access_points(ppid_a):
+    gate = RandomAccessGate(max_wait_s=60)
+    out = gate.feed(ppid_a)
+    assert gate.open
+
+    # The PES each video PID was joined in is dropped, frames and all
+    for pid in (0x101, 0x201):
+        inner, passed = _on(pid, ppid_a), _on(pid, out)
+        assert passed == inner[2:]
+        assert passed[0][1] & 0x40
+
+    # PSI and audio are held back by nothing but the PMTs
+    for pid in (PID_PAT, 0x100, 0x200, 0x102, 0x202):
+        assert _on(pid, out) == _on(pid, ppid_a)
+
+
+def test_frame_by_frame_matches_one_chunk(ppid_a):
+    whole = RandomAccessGate(max_wait_s=60).feed(ppid_a)
+
+    gate = RandomAccessGate(max_wait_s=60)
+    out = b"".join(gate.feed(ppid_a[i : i + 100]) for i in range(0, len(ppid_a), 100))
+    assert out == whole
+
+
+def test_nothing_but_psi_before_the_pmts(ppid_a):
+    gate = RandomAccessGate(max_wait_s=60)
+    # The PAT and program 1's PMT, but not yet program 2's
+    pat, pmt_1 = _frames(ppid_a)[:2]
+    out = gate.feed(pat + pmt_1 + _on(0x102, ppid_a)[0])
+    assert out == pat + pmt_1
+    assert not gate.open
+
+
+def test_time_bound_opens_the_gate(ppid_a):
+    gate = RandomAccessGate(max_wait_s=0)
+    gate.feed(ppid_a[:FRAME_SIZE])
+    assert gate.open
+    assert gate.feed(ppid_a) == ppid_a
+
+
+def test_random_access_indicator():
+    packet = bytearray(FRAME_SIZE)
+    packet[0:4] = bytes((0x47, 0x41, 0x01, 0x30))
+    packet[4:6] = bytes((1, 0x40))
+    assert _is_random_access(bytes(packet), 0x1B)
+
+    packet[5] = 0
+    assert not _is_random_access(bytes(packet), 0x1B)
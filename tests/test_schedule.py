@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from abertpy.schedule import ScanHistory
+
+
+def test_record_and_reload(tmp_path):
+    path = tmp_path / "history.json"
+    history = ScanHistory(path, "net-1")
+    history.record("11302H", [1001, 1002], seconds=10)
+    history.record("11302H", [1001], seconds=20)
+    history.record("11302H", None, seconds=30)
+    history.save()
+
+    entry = ScanHistory(path, "net-1").get("11302H")
+    assert (entry.scans, entry.failures) == (3, 1)
+    assert entry.ppids == pytest.approx(1.5)
+    assert entry.last_ppids == 1
+    assert entry.seconds == pytest.approx(22.5)
+    assert entry.found == [1001]
+
+
+def test_other_networks_kept(tmp_path):
+    path = tmp_path / "history.json"
+    other = ScanHistory(path, "net-2")
+    other.record("10847V", [2001], seconds=10)
+    other.save()
+
+    history = ScanHistory(path, "net-1")
+    assert not history.muxes
+    history.record("11302H", [1001], seconds=10)
+    history.save()
+    assert ScanHistory(path, "net-2").get("10847V").found == [2001]
+
+
+def test_unreadable_history(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text("[")
+    assert not ScanHistory(path, "net-1").muxes
+
+
+def test_order_by_yield_per_second(tmp_path):
+    history = ScanHistory(tmp_path / "history.json", "net-1")
+    history.record("rich", [1, 2, 3, 4], seconds=10)
+    history.record("slow", [1, 2, 3, 4], seconds=40)
+    history.record("empty", [], seconds=10)
+    muxes = [{"name": name} for name in ("empty", "slow", "unknown", "rich")]
+
+    ordered = [mux["name"] for mux in history.order(muxes, {"unknown"}, 10)]
+    assert ordered[0] == "rich"
+    assert ordered.index("slow") < ordered.index("empty")
+
+
+def test_staleness_rotates_muxes_back_in(tmp_path):
+    history = ScanHistory(tmp_path / "history.json", "net-1")
+    history.record("empty", [], seconds=10)
+    now = time.time()
+    fresh = history.priority("empty", (), 10, now)
+    assert history.priority("empty", (), 10, now + 30 * 86400) > fresh
+
+
+def test_productive(tmp_path):
+    history = ScanHistory(tmp_path / "history.json", "net-1")
+    history.record("rich", [1], seconds=10)
+    history.record("empty", [], seconds=10)
+    history.record("failed", None, seconds=10)
+    assert history.productive({"known", "rich"}) == {"rich", "known"}
+
+
+def test_gone_needs_every_recent_good_scan_to_miss(tmp_path):
+    path = tmp_path / "history.json"
+    history = ScanHistory(path, "net-1")
+    history.record("11302H", [1001, 1002], seconds=10)
+    # One scan missing it is no verdict
+    history.record("11302H", [1001], seconds=10)
+    assert not history.gone("11302H", 1002)
+
+    # Nor does a scan that never locked count towards one
+    history.record("11302H", None, seconds=10)
+    assert not history.gone("11302H", 1002)
+
+    history.record("11302H", [1001], seconds=10)
+    assert history.gone("11302H", 1002)
+    assert not history.gone("11302H", 1001)
+
+    history.save()
+    assert ScanHistory(path, "net-1").gone("11302H", 1002)
+
+
+def test_gone_needs_history(tmp_path):
+    history = ScanHistory(tmp_path / "history.json", "net-1")
+    assert not history.gone("11302H", 1001)
+    history.record("11302H", [], seconds=10)
+    assert not history.gone("11302H", 1001)
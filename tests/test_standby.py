@@ -0,0 +1,56 @@
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+from abertpy import proxy
+from abertpy.proxy import StreamStalled, _pump, _StandbySource, _stream, _Upstream
+from abertpy.standby import Standby
+
+
+def _arg(**kwargs) -> SimpleNamespace:
+    return SimpleNamespace(
+        read_timeout=0.2,
+        stall_seconds=10.0,
+        read_chunk_log2=16,
+        retry_seconds=30.0,
+        zap_log=None,
+        **kwargs,
+    )
+
+
+def test_stalled_standby_heals_before_reconnecting(monkeypatch):
+    upstream = _Upstream(transponder="11302H", label="test", deadline=0.0)
+    upstream.resolve = False  # as after the start-up resolve
+
+    # A standby whose upstream goes silent once its buffer is played out
+    ours, theirs = socket.socketpair()
+    standby = Standby(sock=ours, buffered=b"\x47" + bytes(187))
+    with theirs, pytest.raises(StreamStalled):
+        _pump(_arg(), upstream, False, bytes, _StandbySource(standby, 0.2))
+
+    # A first stall reconnects without re-resolving, yet there is nothing of
+    # our own to reconnect to: the next attempt must heal onto an endpoint
+    assert not upstream.resolve
+    assert not upstream.endpoint
+
+    healed, pumped = [], []
+
+    def heal(arg, upstream):
+        healed.append(arg)
+        upstream.endpoint = "http://tvheadend:9981/stream/service/abc"
+        upstream.resolve = False
+
+    monkeypatch.setattr(proxy, "_heal", heal)
+    monkeypatch.setattr(
+        proxy, "_pump", lambda arg, upstream, *_: pumped.append(upstream.endpoint)
+    )
+    arg = _arg(
+        take_standby=lambda: None,
+        is_resolved=lambda: True,
+        allowed_pid=1001,
+        rap_start=False,
+    )
+    _stream(arg, upstream)
+    assert healed == [arg]
+    assert pumped == ["http://tvheadend:9981/stream/service/abc"]
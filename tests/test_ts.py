@@ -0,0 +1,89 @@
+import random
+
+from abertpy.ts import (
+    FRAME_SIZE,
+    PID_EIT,
+    PID_PAT,
+    PID_SDT,
+    TABLE_EIT_PF_ACTUAL,
+    TABLE_PMT,
+    SectionAssembler,
+    crc32_mpeg2,
+    finish_section,
+    iter_sections,
+    packet_pcr,
+    packet_pid,
+    pat_pmt_pids,
+    pat_tsid,
+    pmt_elementary_streams,
+)
+
+
+def _crc32_mpeg2_bitwise(data: bytes) -> int:
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def test_crc32_mpeg2_check_value():
+    assert crc32_mpeg2(b"123456789") == 0x0376E6E7
+
+
+def test_crc32_mpeg2_matches_bitwise_reference():
+    rng = random.Random(0)
+    for size in (0, 1, 3, 184, 1021):
+        data = rng.randbytes(size)
+        assert crc32_mpeg2(data) == _crc32_mpeg2_bitwise(data)
+        assert crc32_mpeg2(bytearray(data)) == _crc32_mpeg2_bitwise(data)
+
+
+def test_finish_section_signs_and_sizes():
+    section = finish_section(bytes((0x00, 0xB0, 0, 0x12, 0x34, 0xC1, 0, 0)))
+    assert ((section[1] & 0x0F) << 8) | section[2] == len(section) - 3
+    assert crc32_mpeg2(section) == 0
+
+
+def test_fixture_psi(ppid_a):
+    assert pat_tsid(ppid_a) == 0x0401
+
+    sections = list(iter_sections(ppid_a, (PID_PAT, 0x100, 0x200)))
+    pats = [section for pid, section in sections if pid == PID_PAT]
+    # The PAT is repeated at the end of the fixture
+    assert len(pats) == 2
+    assert pat_pmt_pids(pats[0]) == {1: 0x100, 2: 0x200}
+
+    pmts = {pid: section for pid, section in sections if section[0] == TABLE_PMT}
+    assert pmt_elementary_streams(pmts[0x100]) == [(0x1B, 0x101), (0x03, 0x102)]
+    assert pmt_elementary_streams(pmts[0x200]) == [(0x02, 0x201), (0x03, 0x202)]
+
+
+def test_section_spanning_frames(ppid_a):
+    eits = [section for _, section in iter_sections(ppid_a, (PID_EIT,))]
+    assert [section[0] for section in eits] == [TABLE_EIT_PF_ACTUAL] * 2
+    assert all(len(section) > FRAME_SIZE for section in eits)
+    assert all(crc32_mpeg2(section) == 0 for section in eits)
+
+
+def test_iter_sections_joined_mid_frame(ppid_a):
+    sections = list(iter_sections(ppid_a[100:], (PID_SDT,)))
+    assert [pid for pid, _ in sections] == [PID_SDT]
+
+
+def test_assembler_drops_corrupt_section(ppid_a):
+    frames = [ppid_a[i : i + FRAME_SIZE] for i in range(0, len(ppid_a), FRAME_SIZE)]
+    pat = next(frame for frame in frames if packet_pid(frame) == PID_PAT)
+
+    assert len(SectionAssembler().push(pat)) == 1
+    corrupt = bytearray(pat)
+    corrupt[10] ^= 0x01
+    assert SectionAssembler().push(bytes(corrupt)) == []
+
+
+def test_packet_pcr(ppid_a):
+    frames = [ppid_a[i : i + FRAME_SIZE] for i in range(0, len(ppid_a), FRAME_SIZE)]
+    pcrs = [pcr for frame in frames if (pcr := packet_pcr(frame)) is not None]
+    assert pcrs == [27_000_000, 27_000_000, 29_700_000, 29_700_000, 32_400_000]
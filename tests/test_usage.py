@@ -0,0 +1,141 @@
+import sqlite3
+import time
+
+import pytest
+
+from abertpy import usage
+from abertpy.setup import usage_priorities
+from abertpy.usage import PpidUsage, SessionRecorder, load_usage
+
+
+def _session(path, dvb_mux, ppid, seconds, payload_bytes):
+    recorder = SessionRecorder(path, dvb_mux, ppid)
+    recorder.add(payload_bytes)
+    recorder.flush(recorder._started + seconds)
+
+
+def test_sessions_add_up(tmp_path):
+    path = tmp_path / "usage.sqlite3"
+    _session(path, "11302H", 1001, 60, 60 * 250_000)
+    _session(path, "11302H", 1001, 30, 30 * 125_000)
+    _session(path, "11302H", 1002, 10, 10 * 500_000)
+
+    usage = load_usage(path, days=30)
+    assert set(usage) == {("11302H", 1001), ("11302H", 1002)}
+
+    entry = usage[("11302H", 1001)]
+    assert entry.sessions == 2
+    assert entry.watched_seconds == pytest.approx(90)
+    # Weighted by time, not by session
+    assert entry.bitrate_bps == pytest.approx(8 * (15e6 + 3.75e6) / 90)
+    assert entry.last_watched == pytest.approx(time.time(), abs=60)
+
+
+def test_short_sessions_count_as_viewing_only(tmp_path):
+    path = tmp_path / "usage.sqlite3"
+    _session(path, "11302H", 1001, 2, 1_000_000)
+
+    entry = load_usage(path, days=30)[("11302H", 1001)]
+    assert entry.watched_seconds == pytest.approx(2)
+    assert entry.bitrate_bps == 0
+
+
+def test_rewritten_row_not_duplicated(tmp_path):
+    path = tmp_path / "usage.sqlite3"
+    recorder = SessionRecorder(path, "11302H", 1001)
+    recorder.add(1000)
+    recorder.flush(recorder._started + 10)
+    recorder.add(1000)
+    recorder.flush(recorder._started + 20)
+
+    entry = load_usage(path, days=30)[("11302H", 1001)]
+    assert entry.sessions == 1
+    assert entry.watched_seconds == pytest.approx(20)
+
+
+def test_old_sessions_left_out(tmp_path):
+    path = tmp_path / "usage.sqlite3"
+    _session(path, "11302H", 1001, 60, 1000)
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE sessions SET started = started - 40 * 86400")
+
+    assert load_usage(path, days=30) == {}
+    assert ("11302H", 1001) in load_usage(path, days=60)
+
+
+def test_missing_or_unreadable_store(tmp_path):
+    assert load_usage(tmp_path / "missing.sqlite3", days=30) == {}
+
+    garbage = tmp_path / "garbage.sqlite3"
+    garbage.write_bytes(b"not a database" * 100)
+    assert load_usage(garbage, days=30) == {}
+
+
+def test_unwritable_store_disables_recording(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    recorder = SessionRecorder(blocker / "usage.sqlite3", "11302H", 1001)
+    recorder.add(1000)
+    recorder.flush()
+    assert recorder._failed
+    # Still accounts payload, just stops trying to write it
+    recorder.add(1000)
+    assert recorder.payload_bytes == 2000
+
+
+def test_priorities_only_for_ppids_with_usage():
+    usage = {
+        ("11302H", 1001): PpidUsage(sessions=3, watched_seconds=3600, bitrate_bps=1),
+        ("11302H", 1002): PpidUsage(sessions=1, watched_seconds=60, bitrate_bps=1),
+        ("11302H", 1003): PpidUsage(sessions=1, watched_seconds=0, bitrate_bps=1),
+    }
+    priorities = usage_priorities(usage)
+    assert priorities == {("11302H", 1001): 3, ("11302H", 1002): 2, ("11302H", 1003): 0}
+    assert ("11302H", 1004) not in priorities
+    assert usage_priorities({}) == {}
+
+
+def test_add_never_writes_inline(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage, "_FLUSH_S", 0.05)
+    path = tmp_path / "usage.sqlite3"
+    recorder = SessionRecorder(path, "11302H", 1001)
+
+    # The first payload is the zap: nothing may be written then
+    recorder.add(1000)
+    assert not path.exists()
+
+    time.sleep(0.06)
+    recorder.add(1000)
+    # Written from a thread of its own, which holds the lock meanwhile
+    assert recorder._writing.acquire(timeout=5)
+    recorder._writing.release()
+    assert load_usage(path, days=30)[("11302H", 1001)].sessions == 1
+
+
+def test_add_skips_a_sample_while_one_is_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage, "_FLUSH_S", 0.01)
+    path = tmp_path / "usage.sqlite3"
+    recorder = SessionRecorder(path, "11302H", 1001)
+    recorder.add(1000)
+
+    time.sleep(0.02)
+    with recorder._writing:
+        recorder.add(1000)
+    assert not path.exists()
+    assert recorder.payload_bytes == 2000
+
+
+def test_busy_store_loses_a_sample_only(tmp_path):
+    path = tmp_path / "usage.sqlite3"
+    _session(path, "11302H", 1001, 10, 1000)
+
+    recorder = SessionRecorder(path, "11302H", 1002)
+    recorder.add(1000)
+    with sqlite3.connect(path) as other:
+        other.execute("BEGIN EXCLUSIVE")
+        recorder.flush(recorder._started + 10)
+        other.rollback()
+    assert not recorder._failed
+
+    recorder.flush(recorder._started + 20)
+    assert load_usage(path, days=30)[("11302H", 1002)].watched_seconds == 20